@@ -0,0 +1,50 @@
+"""Benchmark reading chart statistics from the neighborhood by year cube.
+
+Compare building the charts of every neighborhood from the street
+segments selected with the inverted index with reading their statistics
+from the cube from build_aggregates, and report the time to build and
+check the cube and its size. To use, run
+`python benchmarks/bench_aggregates.py` from the repository root.
+"""
+import time
+
+import pandas as pd
+
+from neighborhoodtrafficflow.data.aggregates import \
+    build_aggregates, check_aggregates
+from neighborhoodtrafficflow.data.neighborhood_index import build_nbhd_index
+from neighborhoodtrafficflow.data.street_data import CWD
+from neighborhoodtrafficflow.figures.charts import \
+    traffic_flow_counts, speed_limits, road_types
+
+# Number of neighborhoods
+NUM_NBHDS = 103
+
+
+def time_per_nbhd(func, data_frame, **kwargs):
+    """Call chart function for every neighborhood and time one call."""
+    start = time.perf_counter()
+    for neighborhood in range(NUM_NBHDS):
+        func(data_frame, neighborhood, **kwargs)
+    return (time.perf_counter() - start) / NUM_NBHDS
+
+
+if __name__ == '__main__':
+    STREET_DATA = pd.read_pickle(CWD / 'cleaned/street_data.pkl')
+    NBHD_INDEX = build_nbhd_index(STREET_DATA['nbhd'], NUM_NBHDS)
+    print('Segments: %d' % len(STREET_DATA))
+
+    START = time.perf_counter()
+    AGGREGATES = build_aggregates(STREET_DATA, NBHD_INDEX, NUM_NBHDS)
+    print('Build cube: %.2f s' % (time.perf_counter() - START))
+    START = time.perf_counter()
+    check_aggregates(AGGREGATES, STREET_DATA)
+    print('Check cube: %.2f s' % (time.perf_counter() - START))
+    print('Cube size: %.1f kB' % (sum(array.nbytes for array
+                                      in AGGREGATES.values()) / 1e3))
+
+    for func in [traffic_flow_counts, speed_limits, road_types]:
+        BEFORE = time_per_nbhd(func, STREET_DATA, nbhd_index=NBHD_INDEX)
+        AFTER = time_per_nbhd(func, STREET_DATA, aggregates=AGGREGATES)
+        print('%-20s %8.2f ms -> %8.2f ms (%.1fx)' %
+              (func.__name__, BEFORE * 1e3, AFTER * 1e3, BEFORE / AFTER))
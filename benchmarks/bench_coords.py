@@ -0,0 +1,62 @@
+"""Benchmark flat coordinate storage of street segments.
+
+Compare the cleaned street DataFrame with per-row lon and lat lists to
+the same DataFrame without them plus flat coordinate arrays from
+pack_coords, and report file size, load time, and memory in use after
+loading. To use, run `python benchmarks/bench_coords.py` from the
+repository root.
+"""
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from neighborhoodtrafficflow.data.geometry import \
+    pack_coords, save_coords, load_coords
+from neighborhoodtrafficflow.data.street_data import CWD
+
+
+def time_load(load, *args):
+    """Load data and report seconds and bytes allocated."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    out = load(*args)
+    seconds = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return out, seconds, memory
+
+
+def load_packed(frame_path, coords_path):
+    """Load DataFrame without coordinate columns and flat coordinates."""
+    return pd.read_pickle(frame_path), load_coords(coords_path)
+
+
+if __name__ == '__main__':
+    STREET_PATH = CWD / 'cleaned/street_data.pkl'
+    TMP_DIR = tempfile.mkdtemp()
+    FRAME_PATH = os.path.join(TMP_DIR, 'street_data.pkl')
+    COORDS_PATH = os.path.join(TMP_DIR, 'street_coords.npz')
+
+    STREET_DATA = pd.read_pickle(STREET_PATH)
+    COORDS = pack_coords(STREET_DATA['lon'], STREET_DATA['lat'])
+    STREET_DATA.drop(columns=['lon', 'lat']).to_pickle(FRAME_PATH)
+    save_coords(COORDS_PATH, COORDS)
+    del STREET_DATA, COORDS
+
+    _, BEFORE_TIME, BEFORE_MEMORY = time_load(pd.read_pickle, STREET_PATH)
+    _, AFTER_TIME, AFTER_MEMORY = time_load(load_packed,
+                                            FRAME_PATH, COORDS_PATH)
+    BEFORE_SIZE = os.path.getsize(STREET_PATH)
+    AFTER_SIZE = os.path.getsize(FRAME_PATH) + os.path.getsize(COORDS_PATH)
+
+    print('Size: %.2f MB -> %.2f MB' % (BEFORE_SIZE / 1e6, AFTER_SIZE / 1e6))
+    print('Load: %.3f s -> %.3f s (%.1fx)' %
+          (BEFORE_TIME, AFTER_TIME, BEFORE_TIME / AFTER_TIME))
+    print('Memory: %.2f MB -> %.2f MB (%.1fx)' %
+          (BEFORE_MEMORY / 1e6, AFTER_MEMORY / 1e6,
+           BEFORE_MEMORY / AFTER_MEMORY))
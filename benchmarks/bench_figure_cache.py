@@ -0,0 +1,77 @@
+"""Benchmark figure cache of the dashboard callbacks.
+
+Replay random dashboard selections, weighted toward a few popular
+neighborhoods, against the road map and chart functions with and
+without a FigureCache, and report mean latency per selection, hit rate,
+and cache size. To use, run `python benchmarks/bench_figure_cache.py`
+from the repository root.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from neighborhoodtrafficflow.data.geometry import pack_coords
+from neighborhoodtrafficflow.data.neighborhood_index import build_nbhd_index
+from neighborhoodtrafficflow.data.street_data import CWD
+from neighborhoodtrafficflow.figures.cache import FigureCache, figure_key
+from neighborhoodtrafficflow.figures.charts import \
+    traffic_flow_counts, speed_limits, road_types
+from neighborhoodtrafficflow.figures.maps import road_map
+
+# Number of selections to replay
+NUM_SELECTIONS = 300
+NUM_NBHDS = 103
+
+
+def figures(street_data, coords, nbhd_index, state, cache=None):
+    """Build all figures of a dashboard state, through cache if given."""
+    neighborhood, map_type, year = state
+    builds = {
+        figure_key('road_map', neighborhood, map_type, year):
+            lambda: road_map(street_data, neighborhood, map_type, year,
+                             coords, nbhd_index, merge=True),
+        figure_key('traffic_flow_counts', neighborhood):
+            lambda: traffic_flow_counts(street_data, neighborhood,
+                                        nbhd_index),
+        figure_key('speed_limits', neighborhood):
+            lambda: speed_limits(street_data, neighborhood, nbhd_index),
+        figure_key('road_types', neighborhood):
+            lambda: road_types(street_data, neighborhood, nbhd_index)
+    }
+    if cache is None:
+        return [build() for build in builds.values()]
+    return [cache.get_or_build(key, build) for key, build in builds.items()]
+
+
+if __name__ == '__main__':
+    STREET_DATA = pd.read_pickle(CWD / 'cleaned/street_data.pkl')
+    COORDS = pack_coords(STREET_DATA['lon'], STREET_DATA['lat'])
+    NBHD_INDEX = build_nbhd_index(STREET_DATA['nbhd'], NUM_NBHDS)
+
+    # Zipf-like popularity of neighborhoods
+    RNG = np.random.default_rng(0)
+    WEIGHTS = 1 / np.arange(1, NUM_NBHDS + 1)
+    STATES = list(zip(
+        RNG.choice(NUM_NBHDS, NUM_SELECTIONS, p=WEIGHTS / WEIGHTS.sum()),
+        RNG.choice(['flow', 'speed', 'road'], NUM_SELECTIONS),
+        RNG.integers(2007, 2019, NUM_SELECTIONS)))
+
+    START = time.perf_counter()
+    for state in STATES:
+        figures(STREET_DATA, COORDS, NBHD_INDEX, state)
+    BEFORE = time.perf_counter() - START
+
+    CACHE = FigureCache()
+    START = time.perf_counter()
+    for state in STATES:
+        figures(STREET_DATA, COORDS, NBHD_INDEX, state, CACHE)
+    AFTER = time.perf_counter() - START
+
+    STATS = CACHE.stats()
+    print('%.1f -> %.1f ms/selection (%.1fx)' %
+          (1e3 * BEFORE / NUM_SELECTIONS, 1e3 * AFTER / NUM_SELECTIONS,
+           BEFORE / AFTER))
+    print('hit rate %.1f%%, %d figures, %.1f MB' %
+          (100 * STATS['hits'] / (STATS['hits'] + STATS['misses']),
+           STATS['entries'], STATS['size'] / 2**20))
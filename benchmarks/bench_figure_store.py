@@ -0,0 +1,59 @@
+"""Benchmark the precomputed figure store.
+
+Render every callback response of the cleaned data into a temporary
+figure store, report render time and store size, and compare the
+latency of reading stored responses with building and serializing
+responses on the fly, as a Dash callback does. To use, run
+`python benchmarks/bench_figure_store.py` from the repository root.
+"""
+import os
+from pathlib import Path
+import pickle
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from neighborhoodtrafficflow.data.geometry import pack_coords
+from neighborhoodtrafficflow.data.neighborhood_index import build_nbhd_index
+from neighborhoodtrafficflow.data.street_data import CWD
+from neighborhoodtrafficflow.figures.store import response_keys, \
+    build_response, write_store, open_store, read_response
+
+# Number of neighborhoods and of figures to time
+NUM_NBHDS = 103
+NUM_SAMPLES = 200
+
+
+if __name__ == '__main__':
+    with open(CWD / 'cleaned/nbhd_data.pkl', 'rb') as pickle_file:
+        NBHD_DATA = pickle.load(pickle_file)
+    STREET_DATA = pd.read_pickle(CWD / 'cleaned/street_data.pkl')
+    COORDS = pack_coords(STREET_DATA['lon'], STREET_DATA['lat'])
+    NBHD_INDEX = build_nbhd_index(STREET_DATA['nbhd'], NUM_NBHDS)
+    KEYS = response_keys(NUM_NBHDS)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        STORE_PATH = Path(tmp_dir) / 'figures'
+        START = time.perf_counter()
+        write_store(STORE_PATH, STREET_DATA, COORDS, NBHD_INDEX, NBHD_DATA,
+                    'bench')
+        RENDER = time.perf_counter() - START
+        SIZE = sum(path.stat().st_size for path in STORE_PATH.iterdir())
+        print('rendered %d responses with %d processes in %.1f s, %.0f MB' %
+              (len(KEYS), os.cpu_count(), RENDER, SIZE / 2**20))
+
+        STORE = open_store(STORE_PATH, 'bench')
+        SAMPLE = [KEYS[idx] for idx in np.random.default_rng(0).choice(
+            len(KEYS), NUM_SAMPLES, replace=False)]
+        START = time.perf_counter()
+        for key in SAMPLE:
+            build_response(STREET_DATA, COORDS, NBHD_INDEX, key)
+        BUILD = (time.perf_counter() - START) / NUM_SAMPLES
+        START = time.perf_counter()
+        for key in SAMPLE:
+            read_response(STORE, key, 'br')
+        READ = (time.perf_counter() - START) / NUM_SAMPLES
+        print('%.2f -> %.2f ms/response (%.1fx)' %
+              (1e3 * BUILD, 1e3 * READ, BUILD / READ))
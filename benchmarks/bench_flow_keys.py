@@ -0,0 +1,91 @@
+"""Benchmark FLOWSEGID and COMPKEY reconciliation.
+
+Compare the row-by-row reconciliation that get_flow_data used to run
+with the columnar reconcile_flow_keys on the bundled 2007-2018 Traffic
+Flow Count datasets, check that both return the same values, and
+report timings. To use, run `python benchmarks/bench_flow_keys.py`
+from the repository root.
+"""
+import time
+
+import numpy as np
+
+from neighborhoodtrafficflow.data.street_data import \
+    FLOW_NAMES, STREET_NAMES, read_flow_data, reconcile_flow_keys
+
+
+def legacy_reconcile_flow_keys(df_list, year_list):
+    """Reconcile keys with the original iterrows implementation."""
+    flow2key = {}
+    key2flow = {}
+    new_compkey = 1e6
+    out_list = []
+    for df, year in zip(df_list, year_list):
+        df = df.copy()
+        for idx, row in df.iterrows():
+            if year in [2017, 2018]:
+                if row['COMPKEY'] is None:
+                    if row['FLOWSEGID'] not in flow2key:
+                        df.at[idx, 'COMPKEY'] = str(new_compkey)
+                        flow2key[row['FLOWSEGID']] = str(new_compkey)
+                        key2flow[str(new_compkey)] = row['FLOWSEGID']
+                        new_compkey += 1
+                    else:
+                        df.at[idx, 'COMPKEY'] = flow2key[row['FLOWSEGID']]
+                else:
+                    for key in row['COMPKEY'].split(','):
+                        if key not in key2flow:
+                            key2flow[key] = row['FLOWSEGID']
+                    if row['FLOWSEGID'] not in flow2key:
+                        flow2key[row['FLOWSEGID']] = row['COMPKEY']
+                    if row['FLOWSEGID'] == 604:
+                        flow2key[row['FLOWSEGID']] = row['COMPKEY']
+            if year in [2015, 2016]:
+                if np.isnan(row['FLOWSEGID']):
+                    df.at[idx, 'FLOWSEGID'] = 1e6
+                    row['FLOWSEGID'] = 1e6
+                if int(row['FLOWSEGID']) not in flow2key:
+                    df.at[idx, 'COMPKEY'] = str(new_compkey)
+                    flow2key[int(row['FLOWSEGID'])] = str(new_compkey)
+                    key2flow[str(new_compkey)] = int(row['FLOWSEGID'])
+                    new_compkey += 1
+                else:
+                    df.at[idx, 'COMPKEY'] = flow2key[int(row['FLOWSEGID'])]
+            if year < 2015:
+                if str(row['COMPKEY']) not in key2flow:
+                    df.at[idx, 'FLOWSEGID'] = -1
+                else:
+                    df.at[idx, 'FLOWSEGID'] = key2flow[str(row['COMPKEY'])]
+        df = df[['COMPKEY', 'FLOWSEGID', 'geometry',
+                 FLOW_NAMES[year], STREET_NAMES[year]]]
+        df = df.astype({'COMPKEY': 'str', 'FLOWSEGID': 'int64',
+                        FLOW_NAMES[year]: 'float'})
+        out_list.append(df)
+    return flow2key, key2flow, out_list, list(year_list)
+
+
+def time_call(func, *args):
+    """Call function and time it."""
+    start = time.perf_counter()
+    out = func(*args)
+    return out, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    YEAR_LIST = list(range(2018, 2006, -1))
+    DF_LIST, READ_TIME = time_call(
+        lambda: [read_flow_data(year) for year in YEAR_LIST])
+    BEFORE, BEFORE_TIME = time_call(legacy_reconcile_flow_keys,
+                                    DF_LIST, YEAR_LIST)
+    AFTER, AFTER_TIME = time_call(reconcile_flow_keys, DF_LIST, YEAR_LIST)
+
+    assert BEFORE[0] == AFTER[0], 'flow2key does not match'
+    assert BEFORE[1] == AFTER[1], 'key2flow does not match'
+    for df_before, df_after in zip(BEFORE[2], AFTER[2]):
+        assert df_before.equals(df_after), 'DataFrames do not match'
+
+    print('Rows: %d' % sum(len(df) for df in DF_LIST))
+    print('Read: %.3f s' % READ_TIME)
+    print('Before: %.3f s' % BEFORE_TIME)
+    print('After: %.3f s' % AFTER_TIME)
+    print('Speedup: %.1fx' % (BEFORE_TIME / AFTER_TIME))
@@ -0,0 +1,35 @@
+"""Benchmark hover text of the neighborhood road map.
+
+Compare building hover text one road at a time with hover_text and for
+all roads at once with hover_texts, on every road in the cleaned street
+data, check that both give the same text, and report roads per second.
+To use, run `python benchmarks/bench_hover_text.py` from the repository
+root.
+"""
+import time
+
+import pandas as pd
+
+from neighborhoodtrafficflow.data.street_data import CWD
+from neighborhoodtrafficflow.figures.maps import hover_text, hover_texts
+
+# Columns of each map type
+COLUMNS = {'flow': '2018', 'speed': 'speed', 'road': 'road'}
+
+
+if __name__ == '__main__':
+    STREET_DATA = pd.read_pickle(CWD / 'cleaned/street_data.pkl')
+    for map_type, column in COLUMNS.items():
+        names = STREET_DATA['name']
+        values = STREET_DATA[column]
+        start = time.perf_counter()
+        before = [hover_text(name, val, map_type)
+                  for name, val in zip(names, values)]
+        before_time = time.perf_counter() - start
+        start = time.perf_counter()
+        after = hover_texts(names, values, map_type).tolist()
+        after_time = time.perf_counter() - start
+        assert before == after, 'Hover text does not match'
+        print('%-6s %10.0f -> %10.0f roads/sec (%.1fx)' %
+              (map_type, len(names) / before_time, len(names) / after_time,
+               before_time / after_time))
@@ -0,0 +1,69 @@
+"""Benchmark requests and server CPU per dashboard interaction.
+
+Replay dropdown, radio, metric, and slider changes against the dashboard
+server, firing every server-side callback with the changed control as
+input as the browser does, and report requests, response bytes, and
+server CPU time per interaction, the best of several runs. Figures are
+built on the fly, without figure store or warm figure cache. To use, run
+`python benchmarks/bench_interactions.py` from the repository root.
+"""
+import time
+
+from neighborhoodtrafficflow import app
+from neighborhoodtrafficflow.figures.cache import FigureCache
+
+# Controls changed by each interaction and the values they take
+INTERACTIONS = {
+    'dropdown': list(range(0, 100, 5)),
+    'radio': ['speed', 'road', 'flow'],
+    'metric': ['density', 'arterial', 'none', 'median'],
+    'slider': list(range(2007, 2018))
+}
+STATE = {'dropdown': 92, 'radio': 'flow', 'metric': 'median', 'slider': 2018,
+         'neighborhoodMapFigure': None, 'roadMapFigure': None,
+         'roadMapLevel': None}
+NUM_RUNS = 5
+
+
+def fire(client, control):
+    """Fire callbacks with control as input, returning requests and bytes."""
+    requests = 0
+    num_bytes = 0
+    for output, callback in app.APP.callback_map.items():
+        if callback.get('clientside_function') or \
+                control not in [item['id'] for item in callback['inputs']]:
+            continue
+        body = {'output': output,
+                'inputs': [dict(item, value=STATE[item['id']])
+                           for item in callback['inputs']],
+                'state': [dict(item, value=STATE[item['id']])
+                          for item in callback['state']],
+                'changedPropIds': ['%s.value' % control]}
+        response = client.post(app.UPDATE_PATH, json=body,
+                               headers={'Accept-Encoding': 'br'})
+        assert response.status_code == 200, output
+        requests += 1
+        num_bytes += len(response.data)
+    return requests, num_bytes
+
+
+if __name__ == '__main__':
+    app.FIGURE_STORE = None
+    CLIENT = app.APP.server.test_client()
+    fire(CLIENT, 'dropdown')
+    for control, values in INTERACTIONS.items():
+        best = None
+        for run in range(NUM_RUNS):
+            app.FIGURE_CACHE = FigureCache()
+            requests = num_bytes = 0
+            start = time.process_time()
+            for value in values:
+                STATE[control] = value
+                counts = fire(CLIENT, control)
+                requests += counts[0]
+                num_bytes += counts[1]
+            seconds = time.process_time() - start
+            best = seconds if best is None else min(best, seconds)
+        print('%-8s %4.1f requests, %7.1f kB, %6.1f ms CPU per interaction' %
+              (control, requests / len(values), num_bytes / 1e3 / len(values),
+               1e3 * best / len(values)))
@@ -0,0 +1,62 @@
+"""Benchmark levels of detail of the neighborhood road map.
+
+Report street vertices of each level of detail from build_lod and the
+time to build them, and compare road maps at full detail with road maps
+at the level road_map_level picks for the whole neighborhood, in points,
+JSON payload size, and build time averaged over all neighborhoods and
+map types. To use, run `python benchmarks/bench_lod.py` from the
+repository root.
+"""
+import json
+import time
+
+import pandas as pd
+import plotly
+
+from neighborhoodtrafficflow.data.geometry import \
+    LOD_TOLERANCES, pack_coords, build_lod
+from neighborhoodtrafficflow.data.neighborhood_index import build_nbhd_index
+from neighborhoodtrafficflow.data.street_data import CWD
+from neighborhoodtrafficflow.figures.maps import road_map
+
+# Number of neighborhoods and map types
+NUM_NBHDS = 103
+MAP_TYPES = ['flow', 'speed', 'road']
+
+
+def measure(street_data, lod, nbhd_index, level):
+    """Build every road map and get mean points, bytes, and seconds."""
+    points = 0
+    size = 0
+    seconds = 0
+    for neighborhood in range(NUM_NBHDS):
+        for map_type in MAP_TYPES:
+            start = time.perf_counter()
+            figure = road_map(street_data, neighborhood, map_type,
+                              nbhd_index=nbhd_index, merge=True, lod=lod,
+                              level=level)
+            seconds += time.perf_counter() - start
+            points += sum(len(trace['x']) for trace in figure['data'])
+            size += len(json.dumps(figure,
+                                   cls=plotly.utils.PlotlyJSONEncoder))
+    count = NUM_NBHDS * len(MAP_TYPES)
+    return points / count, size / count, seconds / count
+
+
+if __name__ == '__main__':
+    STREET_DATA = pd.read_pickle(CWD / 'cleaned/street_data.pkl')
+    COORDS = pack_coords(STREET_DATA['lon'], STREET_DATA['lat'])
+    NBHD_INDEX = build_nbhd_index(STREET_DATA['nbhd'], NUM_NBHDS)
+    STREET_DATA = STREET_DATA.drop(columns=['lon', 'lat'])
+
+    START = time.perf_counter()
+    LOD = build_lod(COORDS)
+    print('Build levels: %.2f s' % (time.perf_counter() - START))
+    for LEVEL, TOLERANCE in enumerate(LOD_TOLERANCES):
+        print('Level %d (%g m): %8d vertices' %
+              (LEVEL, TOLERANCE, len(LOD[LEVEL]['lon'])))
+
+    for label, level in [('Full detail', 0), ('Neighborhood', None)]:
+        POINTS, SIZE, SECONDS = measure(STREET_DATA, LOD, NBHD_INDEX, level)
+        print('%-13s %8.1f points %8.1f kB %7.2f ms' %
+              (label, POINTS, SIZE / 1e3, SECONDS * 1e3))
@@ -0,0 +1,77 @@
+"""Benchmark selecting street segments by neighborhood.
+
+Compare searching the nbhd column of every street segment with looking
+up rows in the inverted index from build_nbhd_index, for the selection
+alone and for each figure function, averaged over all neighborhoods.
+Also compare searching the nbhd column with the bitsets of the index
+for the union and intersection of pairs of neighborhoods. To use, run `python benchmarks/bench_nbhd_index.py` from the repository
+root.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from neighborhoodtrafficflow.data.neighborhood_index import \
+    build_nbhd_index, select_nbhd, in_any_nbhd, in_all_nbhd
+from neighborhoodtrafficflow.data.street_data import CWD
+from neighborhoodtrafficflow.figures.charts import \
+    traffic_flow_counts, speed_limits, road_types
+from neighborhoodtrafficflow.figures.maps import road_map
+
+# Number of neighborhoods
+NUM_NBHDS = 103
+
+
+def time_per_nbhd(func, data_frame, nbhd_index=None):
+    """Call function for every neighborhood and time one call."""
+    start = time.perf_counter()
+    for neighborhood in range(NUM_NBHDS):
+        func(data_frame, neighborhood, nbhd_index=nbhd_index)
+    return (time.perf_counter() - start) / NUM_NBHDS
+
+
+def search_any(data_frame, neighborhoods):
+    """Get mask of segments in any neighborhood from the nbhd column."""
+    return data_frame.nbhd.apply(
+        lambda nbhd_list: any(idx in nbhd_list for idx in neighborhoods)
+    ).to_numpy()
+
+
+def search_all(data_frame, neighborhoods):
+    """Get mask of segments in all neighborhoods from the nbhd column."""
+    return data_frame.nbhd.apply(
+        lambda nbhd_list: all(idx in nbhd_list for idx in neighborhoods)
+    ).to_numpy()
+
+
+def time_pairs(func, data):
+    """Get mask for every pair of adjacent neighborhoods and time one."""
+    start = time.perf_counter()
+    masks = [func(data, [idx, idx + 1]) for idx in range(NUM_NBHDS - 1)]
+    return masks, (time.perf_counter() - start) / (NUM_NBHDS - 1)
+
+
+if __name__ == '__main__':
+    STREET_DATA = pd.read_pickle(CWD / 'cleaned/street_data.pkl')
+    START = time.perf_counter()
+    NBHD_INDEX = build_nbhd_index(STREET_DATA['nbhd'], NUM_NBHDS)
+    print('Segments: %d' % len(STREET_DATA))
+    print('Build index: %.1f ms' % ((time.perf_counter() - START) * 1e3))
+
+    for func in [select_nbhd, traffic_flow_counts, speed_limits,
+                 road_types, road_map]:
+        BEFORE = time_per_nbhd(func, STREET_DATA)
+        AFTER = time_per_nbhd(func, STREET_DATA, NBHD_INDEX)
+        print('%-20s %8.2f ms -> %8.2f ms (%.1fx)' %
+              (func.__name__, BEFORE * 1e3, AFTER * 1e3, BEFORE / AFTER))
+
+    BITS = NBHD_INDEX['bits']
+    for search, bitset in [(search_any, in_any_nbhd),
+                           (search_all, in_all_nbhd)]:
+        BEFORE_MASKS, BEFORE = time_pairs(search, STREET_DATA)
+        AFTER_MASKS, AFTER = time_pairs(bitset, BITS)
+        assert all(np.array_equal(before, after) for before, after
+                   in zip(BEFORE_MASKS, AFTER_MASKS)), 'Masks do not match'
+        print('%-20s %8.2f ms -> %8.2f ms (%.1fx)' %
+              (bitset.__name__, BEFORE * 1e3, AFTER * 1e3, BEFORE / AFTER))
@@ -0,0 +1,60 @@
+"""Benchmark neighborhood assignment of street segments.
+
+Compare the brute-force polygon search in get_neighborhood with the
+bounding-box indexed search and the bulk get_neighborhoods pass, and
+report segments per second. To use, run
+`python benchmarks/bench_neighborhood.py` from the repository root.
+"""
+import time
+
+import geopandas as gpd
+
+from neighborhoodtrafficflow.data.street_data import \
+    CWD, get_polygons, get_polygon_index, get_neighborhood, \
+    get_neighborhoods, get_flow_path
+
+# File paths
+SHP_PATH = CWD / 'raw/zillow-neighborhoods/zillow-neighborhoods.shp'
+
+
+def get_segments(years=range(2007, 2019)):
+    """Get (lon, lat) lists of single-part street segments."""
+    segments = []
+    for year in years:
+        for geo in gpd.read_file(get_flow_path(year))['geometry']:
+            try:
+                segments.append(([x for x, y in geo.coords],
+                                 [y for x, y in geo.coords]))
+            except NotImplementedError:
+                pass
+    return segments
+
+
+def time_assignment(segments, idx2poly, poly_index=None):
+    """Assign neighborhoods to all segments and time it."""
+    start = time.perf_counter()
+    nbhd_list = [get_neighborhood(lon, lat, idx2poly, poly_index)
+                 for lon, lat in segments]
+    return nbhd_list, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    IDX2POLY = get_polygons(SHP_PATH)
+    SEGMENTS = get_segments()
+
+    BEFORE, BEFORE_TIME = time_assignment(SEGMENTS, IDX2POLY)
+    POLY_INDEX = get_polygon_index(IDX2POLY)
+    AFTER, AFTER_TIME = time_assignment(SEGMENTS, IDX2POLY, POLY_INDEX)
+    assert BEFORE == AFTER, 'Indexed assignment does not match'
+    START = time.perf_counter()
+    BULK = get_neighborhoods([lon for lon, _ in SEGMENTS],
+                             [lat for _, lat in SEGMENTS], IDX2POLY)
+    BULK_TIME = time.perf_counter() - START
+    assert BEFORE == BULK, 'Bulk assignment does not match'
+
+    print('Segments: %d' % len(SEGMENTS))
+    print('Before: %.0f segments/sec' % (len(SEGMENTS) / BEFORE_TIME))
+    print('After: %.0f segments/sec' % (len(SEGMENTS) / AFTER_TIME))
+    print('Bulk: %.0f segments/sec' % (len(SEGMENTS) / BULK_TIME))
+    print('Speedup: %.1fx indexed, %.1fx bulk' % (BEFORE_TIME / AFTER_TIME,
+                                                 BEFORE_TIME / BULK_TIME))
@@ -0,0 +1,55 @@
+"""Benchmark road color assignment.
+
+Compare assigning road colors one at a time with a new matplotlib
+colormap and Normalize per call, as road_color used to, with the
+lookup tables in road_colors, check that both give the same colors,
+and report roads per second. To use, run
+`python benchmarks/bench_road_colors.py` from the repository root.
+"""
+import time
+
+import matplotlib.cm as cm
+from matplotlib.colors import Normalize
+import numpy as np
+
+from neighborhoodtrafficflow.figures.maps import road_colors
+
+# Number of roads and value ranges of each map type
+NUM_ROADS = 10000
+VALUES = {'flow': 108179, 'speed': 60, 'road': 5}
+
+
+def legacy_road_color(val, map_type):
+    """Assign road color with the original implementation."""
+    if val is None or val == -1:
+        return 'rgb(192,192,192)'
+    if map_type == 'flow':
+        cmap = cm.get_cmap('viridis')
+        norm = Normalize(vmin=0, vmax=108179)
+    elif map_type == 'speed':
+        cmap = cm.get_cmap('RdYlGn_r')
+        norm = Normalize(vmin=0, vmax=60)
+    else:
+        cmap = cm.get_cmap('tab10')
+        norm = Normalize(vmin=0, vmax=9)
+    if map_type == 'road' and val == 1:
+        rgba = (0, 0, 0, 1)
+    else:
+        rgba = cmap(norm(float(val)))
+    return 'rgb(%f,%f,%f)' % rgba[:-1]
+
+
+if __name__ == '__main__':
+    RNG = np.random.RandomState(0)
+    for map_type, vmax in VALUES.items():
+        values = RNG.randint(-1, vmax + 1, NUM_ROADS)
+        start = time.perf_counter()
+        before = [legacy_road_color(val, map_type) for val in values]
+        before_time = time.perf_counter() - start
+        start = time.perf_counter()
+        after = road_colors(values, map_type).tolist()
+        after_time = time.perf_counter() - start
+        assert before == after, 'Colors do not match'
+        print('%-6s %10.0f -> %12.0f roads/sec (%.0fx)' %
+              (map_type, NUM_ROADS / before_time, NUM_ROADS / after_time,
+               before_time / after_time))
@@ -0,0 +1,53 @@
+"""Benchmark merged traces in the neighborhood road map.
+
+Compare road_map with one trace per road to road_map with one trace
+per color bin, and report traces, JSON payload size, and build time
+averaged over all neighborhoods and map types. To use, run
+`python benchmarks/bench_road_map.py` from the repository root.
+"""
+import json
+import time
+
+import pandas as pd
+import plotly
+
+from neighborhoodtrafficflow.data.geometry import pack_coords
+from neighborhoodtrafficflow.data.neighborhood_index import build_nbhd_index
+from neighborhoodtrafficflow.data.street_data import CWD
+from neighborhoodtrafficflow.figures.maps import road_map
+
+# Number of neighborhoods and map types
+NUM_NBHDS = 103
+MAP_TYPES = ['flow', 'speed', 'road']
+
+
+def measure(street_data, coords, nbhd_index, merge):
+    """Build every road map and get mean traces, bytes, and seconds."""
+    traces = 0
+    size = 0
+    seconds = 0
+    for neighborhood in range(NUM_NBHDS):
+        for map_type in MAP_TYPES:
+            start = time.perf_counter()
+            figure = road_map(street_data, neighborhood, map_type,
+                              coords=coords, nbhd_index=nbhd_index,
+                              merge=merge)
+            seconds += time.perf_counter() - start
+            traces += len(figure['data'])
+            size += len(json.dumps(figure,
+                                   cls=plotly.utils.PlotlyJSONEncoder))
+    count = NUM_NBHDS * len(MAP_TYPES)
+    return traces / count, size / count, seconds / count
+
+
+if __name__ == '__main__':
+    STREET_DATA = pd.read_pickle(CWD / 'cleaned/street_data.pkl')
+    COORDS = pack_coords(STREET_DATA['lon'], STREET_DATA['lat'])
+    NBHD_INDEX = build_nbhd_index(STREET_DATA['nbhd'], NUM_NBHDS)
+    STREET_DATA = STREET_DATA.drop(columns=['lon', 'lat'])
+
+    for label, merge in [('Per road', False), ('Per color bin', True)]:
+        TRACES, SIZE, SECONDS = measure(STREET_DATA, COORDS, NBHD_INDEX,
+                                        merge)
+        print('%-14s %7.1f traces %8.1f kB %7.2f ms' %
+              (label, TRACES, SIZE / 1e3, SECONDS * 1e3))
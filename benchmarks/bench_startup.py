@@ -0,0 +1,65 @@
+"""Benchmark loading cleaned datasets at dashboard startup.
+
+Compare unpickling the cleaned neighborhood and street data and packing
+street coordinates, as app.py does without a bundle, with mapping a
+bundle written by write_bundle. Report load time and private memory
+allocated by each, since memory-mapped pages are shared between server
+processes through the OS page cache. To use, run
+`python benchmarks/bench_startup.py` from the repository root.
+"""
+import gc
+import pickle
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from neighborhoodtrafficflow.data.geometry import pack_coords
+from neighborhoodtrafficflow.data.storage import write_bundle, read_bundle
+from neighborhoodtrafficflow.data.street_data import CWD
+
+# Number of loads to time
+REPEATS = 5
+
+
+def load_pickles(nbhd_path, street_path):
+    """Load cleaned datasets from pickle files."""
+    with open(nbhd_path, 'rb') as pickle_file:
+        nbhd_data = pickle.load(pickle_file)
+    street_data = pd.read_pickle(street_path)
+    coords = pack_coords(street_data['lon'], street_data['lat'])
+    return street_data, coords, nbhd_data
+
+
+def time_load(load, *args):
+    """Load data and report best seconds and bytes allocated."""
+    seconds = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        load(*args)
+        seconds.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    out = load(*args)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del out
+    return min(seconds), memory
+
+
+if __name__ == '__main__':
+    NBHD_PATH = CWD / 'cleaned/nbhd_data.pkl'
+    STREET_PATH = CWD / 'cleaned/street_data.pkl'
+    BUNDLE_PATH = tempfile.mkdtemp() + '/bundle'
+    write_bundle(BUNDLE_PATH, *load_pickles(NBHD_PATH, STREET_PATH))
+
+    BEFORE_TIME, BEFORE_MEMORY = time_load(load_pickles,
+                                           NBHD_PATH, STREET_PATH)
+    AFTER_TIME, AFTER_MEMORY = time_load(read_bundle, BUNDLE_PATH)
+
+    print('Load: %.3f s -> %.3f s (%.1fx)' %
+          (BEFORE_TIME, AFTER_TIME, BEFORE_TIME / AFTER_TIME))
+    print('Private memory: %.2f MB -> %.2f MB (%.1fx)' %
+          (BEFORE_MEMORY / 1e6, AFTER_MEMORY / 1e6,
+           BEFORE_MEMORY / AFTER_MEMORY))
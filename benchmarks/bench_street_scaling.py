@@ -0,0 +1,63 @@
+"""Benchmark street data build time on synthetic datasets.
+
+Build street lists with get_street_data from synthetic Seattle Streets
+style datasets 1x, 10x, and 100x the size of the bundled Traffic Flow
+Count datasets and report segments per second, which should stay flat
+if build time grows linearly. To use, run
+`python benchmarks/bench_street_scaling.py` from the repository root.
+"""
+from contextlib import redirect_stdout
+import os
+import time
+
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import LineString
+
+from neighborhoodtrafficflow.data.street_data import \
+    get_flow_path, get_street_data
+
+# Sizes relative to the bundled datasets
+SCALES = [1, 10, 100]
+
+
+def get_base_size():
+    """Get total number of rows in the Traffic Flow Count datasets."""
+    return sum(len(gpd.read_file(get_flow_path(year)))
+               for year in range(2007, 2019))
+
+
+def synthetic_streets(size, seed=0):
+    """Create synthetic Seattle Streets DataFrame.
+
+    About half of the COMPKEYs are duplicates, and geometries are drawn
+    from a small pool to keep memory use down.
+    """
+    rng = np.random.RandomState(seed)
+    pool = [LineString([(-122.3 + 0.001*i, 47.6), (-122.3 + 0.001*i, 47.61)])
+            for i in range(1000)]
+    return gpd.GeoDataFrame({
+        'COMPKEY': rng.randint(0, size // 2 + 1, size),
+        'STNAME_ORD': ['Dummy St'] * size,
+        'SPEEDLIMIT': rng.choice([20, 25, 30, 35, 40], size),
+        'ARTCLASS': rng.randint(0, 6, size),
+        'geometry': [pool[i % len(pool)] for i in range(size)]
+    })
+
+
+def time_build(data_frame):
+    """Build street lists from one dataset and time it."""
+    lists = [[] for _ in range(7)]
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        get_street_data(data_frame, 'street', None, *lists, key_index={})
+    return len(lists[0]), time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    BASE_SIZE = get_base_size()
+    for scale in SCALES:
+        df = synthetic_streets(scale * BASE_SIZE)
+        num_added, seconds = time_build(df)
+        print('%4dx: %8d rows, %8d unique, %7.2f s, %8.0f rows/sec' %
+              (scale, len(df), num_added, seconds, len(df) / seconds))
@@ -0,0 +1,59 @@
+"""Benchmark reading cleaned street data from Parquet.
+
+Compare reading the cleaned street data pickle with reading the same
+data from a Parquet table written by write_table, in full and projected
+to a few columns, and report reads per second and rows
+per second. To use, run `python benchmarks/bench_table.py`
+from the repository root.
+"""
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from neighborhoodtrafficflow.data.storage import write_table, read_table
+from neighborhoodtrafficflow.data.street_data import CWD
+
+# Number of reads to time
+REPEATS = 10
+
+# Columns of projected reads
+PROJECTIONS = {
+    'Parquet flow counts': ['nbhd'] + [str(year)
+                                       for year in range(2007, 2019)],
+    'Parquet speed': ['nbhd', 'speed']
+}
+
+
+def time_read(read, *args):
+    """Read data REPEATS times and return best seconds per read."""
+    seconds = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        read(*args)
+        seconds.append(time.perf_counter() - start)
+    return min(seconds)
+
+
+def report(label, seconds, num_rows):
+    """Print reads per second and throughput."""
+    print('%-20s %7.4f s %8.1f reads/sec %10.0f rows/sec' %
+          (label, seconds, 1 / seconds, num_rows / seconds))
+
+
+if __name__ == '__main__':
+    STREET_PATH = CWD / 'cleaned/street_data.pkl'
+    TABLE_PATH = os.path.join(tempfile.mkdtemp(), 'street_data.parquet')
+    STREET_DATA = pd.read_pickle(STREET_PATH)
+    write_table(TABLE_PATH, STREET_DATA)
+    NUM_ROWS = len(STREET_DATA)
+    PICKLE_SIZE = os.path.getsize(STREET_PATH)
+    TABLE_SIZE = os.path.getsize(TABLE_PATH)
+
+    print('Size: %.2f MB pickle, %.2f MB Parquet' %
+          (PICKLE_SIZE / 1e6, TABLE_SIZE / 1e6))
+    report('Pickle', time_read(pd.read_pickle, STREET_PATH), NUM_ROWS)
+    report('Parquet', time_read(read_table, TABLE_PATH), NUM_ROWS)
+    for label, columns in PROJECTIONS.items():
+        report(label, time_read(read_table, TABLE_PATH, columns), NUM_ROWS)
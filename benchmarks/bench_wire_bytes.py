@@ -0,0 +1,77 @@
+"""Benchmark bytes on the wire of the default dashboard view.
+
+Replay the requests a browser makes to load the dashboard with the
+default University District view, the layout followed by every callback
+fired on load, and report response bytes and server time per request
+without compression, with compression per response, and with figure
+responses served precompressed from a figure store. To use, run
+`python benchmarks/bench_wire_bytes.py` from the repository root.
+"""
+from pathlib import Path
+import tempfile
+import time
+
+from neighborhoodtrafficflow import app
+from neighborhoodtrafficflow.figures.cache import figure_key
+from neighborhoodtrafficflow.figures.store import write_store, open_store
+
+# Default dashboard state
+NEIGHBORHOOD = 92
+MAP_TYPE = 'flow'
+YEAR = 2018
+
+# Inputs and state of callbacks fired on load
+INPUTS = {'dropdown': NEIGHBORHOOD, 'radio': MAP_TYPE, 'slider': YEAR,
+          'neighborhoodMapFigure': None, 'roadMapFigure': None,
+          'roadMapLevel': None}
+
+# Responses of default view
+KEYS = [figure_key('neighborhood', NEIGHBORHOOD),
+        figure_key('road_map', NEIGHBORHOOD, MAP_TYPE, YEAR)]
+
+# Accept-Encoding of a browser
+BROWSER_ENCODING = 'gzip, deflate, br'
+
+
+def load_view(accept_encoding):
+    """Load default view, returning layout and callback bytes and time."""
+    client = app.APP.server.test_client()
+    headers = {'Accept-Encoding': accept_encoding}
+    start = time.perf_counter()
+    layout = len(client.get(app.APP.config.routes_pathname_prefix +
+                            '_dash-layout', headers=headers).data)
+    callbacks = 0
+    for output, callback in app.APP.callback_map.items():
+        if callback.get('clientside_function'):
+            continue
+        body = {'output': output,
+                'inputs': [dict(item, value=INPUTS[item['id']])
+                           for item in callback['inputs']],
+                'state': [dict(item, value=INPUTS[item['id']])
+                          for item in callback['state']]}
+        response = client.post(app.UPDATE_PATH, json=body, headers=headers)
+        assert response.status_code == 200, output
+        callbacks += len(response.data)
+    return layout, callbacks, time.perf_counter() - start
+
+
+def report(name, accept_encoding):
+    """Print bytes and time of loading default view."""
+    load_view(accept_encoding)
+    layout, callbacks, seconds = load_view(accept_encoding)
+    print('%-24s layout %8.1f kB, callbacks %8.1f kB, %6.1f ms' %
+          (name, layout / 1e3, callbacks / 1e3, 1e3 * seconds))
+
+
+if __name__ == '__main__':
+    app.FIGURE_STORE = None
+    report('uncompressed', 'identity')
+    report('compressed per response', BROWSER_ENCODING)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        STORE_PATH = Path(tmp_dir) / 'figures'
+        write_store(STORE_PATH, app.STREET_DATA, app.COORDS, app.NBHD_INDEX,
+                    app.NBHD_DATA, app.DATA_VERSION, keys=KEYS,
+                    aggregates=app.AGGREGATES, lod=app.LOD)
+        app.FIGURE_STORE = open_store(STORE_PATH, app.DATA_VERSION)
+        report('precompressed store', BROWSER_ENCODING)
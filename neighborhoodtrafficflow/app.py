@@ -4,32 +4,110 @@ Interactive dashboard to explore traffic flow, speed limits, and road
 types in Seattle neighborhoods. To use, run `python app.py` in the
 terminal and copy/paste the URL into your browers.
 """
+import os
 from pathlib import Path
 import pickle
 
+import numpy as np
 import pandas as pd
+import flask
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
-from dash.dependencies import Input, Output
-
+from dash.dependencies import Input, Output, State, ClientsideFunction
+from dash.exceptions import PreventUpdate
+
+from neighborhoodtrafficflow.data.aggregates import \
+    YEARS, METRICS, build_aggregates, load_aggregates, metric_table
+from neighborhoodtrafficflow.data.geometry import \
+    pack_coords, load_coords, build_lod, load_lod
+from neighborhoodtrafficflow.data.manifest import hash_path
+from neighborhoodtrafficflow.data.neighborhood_index import \
+    build_nbhd_index, load_nbhd_index
+from neighborhoodtrafficflow.data.storage import \
+    read_bundle, read_bundle_aggregates, read_bundle_lod, read_data_version
+from neighborhoodtrafficflow.figures.cache import FigureCache, figure_key
 from neighborhoodtrafficflow.figures.maps import \
-    neighborhood_map, road_map
+    NBHD_INFO, neighborhood_map, road_map, road_map_level
 from neighborhoodtrafficflow.figures.charts import \
     traffic_flow_counts, speed_limits, road_types
+from neighborhoodtrafficflow.figures.store import NBHD_OUTPUTS, \
+    ROAD_MAP_OUTPUTS, ENCODINGS, nbhd_outputs, road_map_outputs, \
+    open_store, read_response
 
 # Data file paths
 CWD = Path(__file__).parent
 NBHD_PATH = CWD / 'data/cleaned/nbhd_data.pkl'
 STREET_PATH = CWD / 'data/cleaned/street_data.pkl'
-
-# Import neighborhood data
-with open(NBHD_PATH, 'rb') as pickle_file:
-    NBHD_DATA = pickle.load(pickle_file)
+COORDS_PATH = CWD / 'data/cleaned/street_coords.npz'
+NBHD_INDEX_PATH = CWD / 'data/cleaned/nbhd_index.npz'
+AGGREGATES_PATH = CWD / 'data/cleaned/aggregates.npz'
+LOD_PATH = CWD / 'data/cleaned/street_lod.npz'
+BUNDLE_PATH = CWD / 'data/cleaned/bundle'
+STORE_PATH = CWD / 'data/cleaned/figures'
+
+# Map bundle of cleaned data if available, otherwise import neighborhood
+# data, street data, flat street coordinates and their levels of detail,
+# neighborhood index, and neighborhood by year cube of street statistics
+if os.path.exists(BUNDLE_PATH):
+    STREET_DATA, COORDS, NBHD_DATA, NBHD_INDEX = read_bundle(BUNDLE_PATH)
+    AGGREGATES = read_bundle_aggregates(BUNDLE_PATH)
+    LOD = read_bundle_lod(BUNDLE_PATH, COORDS)
+    DATA_VERSION = read_data_version(BUNDLE_PATH)
+else:
+    with open(NBHD_PATH, 'rb') as pickle_file:
+        NBHD_DATA = pickle.load(pickle_file)
+    STREET_DATA = pd.read_pickle(STREET_PATH)
+    if os.path.exists(COORDS_PATH):
+        COORDS = load_coords(COORDS_PATH)
+    else:
+        COORDS = pack_coords(STREET_DATA['lon'], STREET_DATA['lat'])
+    if os.path.exists(NBHD_INDEX_PATH):
+        NBHD_INDEX = load_nbhd_index(NBHD_INDEX_PATH)
+    else:
+        NBHD_INDEX = build_nbhd_index(STREET_DATA['nbhd'], NBHD_DATA[0])
+    if os.path.exists(AGGREGATES_PATH):
+        AGGREGATES = load_aggregates(AGGREGATES_PATH)
+    else:
+        AGGREGATES = build_aggregates(STREET_DATA, NBHD_INDEX, NBHD_DATA[0])
+    if os.path.exists(LOD_PATH):
+        LOD = load_lod(LOD_PATH, COORDS)
+    else:
+        LOD = build_lod(COORDS)
+    DATA_VERSION = '-'.join(hash_path(path)
+                            for path in [NBHD_PATH, STREET_PATH])
 NAMES = NBHD_DATA[3]
 
-# Import street data
-STREET_DATA = pd.read_pickle(STREET_PATH)
+# Serve precomputed figures from store if built from the same data, and
+# cache other figures by dashboard state until the server is restarted
+FIGURE_STORE = open_store(STORE_PATH, DATA_VERSION)
+FIGURE_CACHE = FigureCache()
+
+# Store keys by callback output, with multi-output callbacks identified
+# as in Dash
+RESPONSE_OUTPUTS = {
+    '..%s..' % '...'.join('%s.%s' % output for output in NBHD_OUTPUTS):
+        'neighborhood',
+    '..%s..' % '...'.join('%s.%s' % output for output in ROAD_MAP_OUTPUTS):
+        'road_map'
+}
+
+# Neighborhood names and centroids, shipped to the browser once for
+# clientside callbacks
+NBHD_CLIENT_DATA = {'names': NBHD_INFO['name'].to_list(),
+                    'lon': NBHD_INFO['midLon'].to_list(),
+                    'lat': NBHD_INFO['midLat'].to_list()}
+
+# Neighborhood map metrics of every neighborhood, shipped to the browser
+# once so changing the metric or year only swaps the colors
+METRIC_TABLE = metric_table(AGGREGATES)
+NBHD_METRIC_DATA = {
+    'years': YEARS,
+    'labels': METRICS,
+    'values': {name: [[None if np.isnan(value) else round(value, 1)
+                       for value in column] for column in table.T]
+               for name, table in METRIC_TABLE.items()}
+}
 
 # Create control options for dropdown, radio, and slider
 NBHD_OPTIONS = [{'label': NAMES[idx], 'value': idx}
@@ -37,6 +115,8 @@ NBHD_OPTIONS = [{'label': NAMES[idx], 'value': idx}
 MAP_OPTIONS = [{'label': 'Traffic Flow', 'value': 'flow'},
                {'label': 'Speed Limit', 'value': 'speed'},
                {'label': 'Road Type', 'value': 'road'}]
+METRIC_OPTIONS = [{'label': 'None', 'value': 'none'}] + \
+    [{'label': label, 'value': name} for name, label in METRICS.items()]
 YEAR_OPTIONS = {year: str(year) for year in range(2007, 2019)}
 
 # Descriptions
@@ -50,7 +130,8 @@ APP_DESCRIPTION = 'This is an interactive dashboard for current and future \
     boxes on the right of each figure. Hover over any figure to display data.'
 NBHD_DESCRIPTION = 'Select a neighborhood by clicking an area on the map. \
     Use your cursor to zoom and pan. Hover over a neighborhood to display \
-    its name.'
+    its name. Color neighborhoods by a traffic metric using the radio \
+    selections above, filtered by year using the slider.'
 MAP_DESCRIPTION = 'Use the radio selections above to display average weekday \
     traffic flow counts, speed limits, or arterial classifications, and \
     filter traffic flow counts by year using the slider above. Hover over a \
@@ -66,14 +147,31 @@ ROAD_DESCRIPTION = 'Compare the number of road types in your selected \
     by city or neighborhood by selecting the boxes on the right. Hover over \
     bars to display data.'
 
-# Initialize dashboard
-APP = dash.Dash(__name__)
+# Initialize dashboard, compressing responses not served from store
+APP = dash.Dash(__name__, compress=True)
+UPDATE_PATH = APP.config.routes_pathname_prefix + '_dash-update-component'
 
 # Define dashboard layout
 APP.layout = html.Div(
     id='mainContainer',
     className='twelve columns',
     children=[
+        # Neighborhood names and centroids for clientside callbacks
+        dcc.Store(
+            id='nbhdInfo',
+            data=NBHD_CLIENT_DATA
+        ),
+        # Neighborhood map metrics for clientside callbacks
+        dcc.Store(
+            id='nbhdMetrics',
+            data=NBHD_METRIC_DATA
+        ),
+        # Neighborhood and level of detail of road map
+        dcc.Store(
+            id='roadMapLevel',
+            data={'neighborhood': 92,
+                  'level': road_map_level(92, num_levels=len(LOD))}
+        ),
         # Row one
         html.Div(
             id='rowOne',
@@ -128,6 +226,17 @@ APP.layout = html.Div(
                                 'width': '33%'
                             }
                         ),
+                        html.Br(),
+                        html.H6('Select a neighborhood map color:'),
+                        dcc.RadioItems(
+                            id='metric',
+                            options=METRIC_OPTIONS,
+                            value='median',
+                            labelStyle={
+                                'display': 'inline-block',
+                                'width': '25%'
+                            }
+                        ),
                         # Slider
                         html.Div(
                             id='sliderContainer',
@@ -162,7 +271,10 @@ APP.layout = html.Div(
                             children='Seattle Neighborhoods'),
                         dcc.Graph(
                             id='neighborhoodMapFigure',
-                            figure=neighborhood_map(*NBHD_DATA)
+                            figure=neighborhood_map(
+                                *NBHD_DATA,
+                                z=METRIC_TABLE['median'][:, -1],
+                                title=METRICS['median'])
                         ),
                         html.Br(),
                         html.P(NBHD_DESCRIPTION)
@@ -180,7 +292,9 @@ APP.layout = html.Div(
                         ),
                         dcc.Graph(
                             id='roadMapFigure',
-                            figure=road_map(STREET_DATA)
+                            figure=road_map(STREET_DATA,
+                                            nbhd_index=NBHD_INDEX,
+                                            merge=True, lod=LOD)
                         ),
                         html.Br(),
                         html.P(MAP_DESCRIPTION)
@@ -205,7 +319,9 @@ APP.layout = html.Div(
                         ),
                         dcc.Graph(
                             id='flowCountFigure',
-                            figure=traffic_flow_counts(STREET_DATA)
+                            figure=traffic_flow_counts(
+                                STREET_DATA, nbhd_index=NBHD_INDEX,
+                                aggregates=AGGREGATES)
                         ),
                         html.Br(),
                         html.P(FLOW_DESCRIPTION)
@@ -230,7 +346,9 @@ APP.layout = html.Div(
                         ),
                         dcc.Graph(
                             id='speedLimitFigure',
-                            figure=speed_limits(STREET_DATA)
+                            figure=speed_limits(
+                                STREET_DATA, nbhd_index=NBHD_INDEX,
+                                aggregates=AGGREGATES)
                         ),
                         html.Br(),
                         html.P(SPEED_DESCRIPTION)
@@ -248,7 +366,9 @@ APP.layout = html.Div(
                         ),
                         dcc.Graph(
                             id='roadTypeFigure',
-                            figure=road_types(STREET_DATA)
+                            figure=road_types(
+                                STREET_DATA, nbhd_index=NBHD_INDEX,
+                                aggregates=AGGREGATES)
                         ),
                         html.Br(),
                         html.P(ROAD_DESCRIPTION)
@@ -260,50 +380,6 @@ APP.layout = html.Div(
 )
 
 
-#########################
-# Update section titles #
-#########################
-
-# Update neighborhood road map title after dropdown selection
-@APP.callback(
-    Output('roadMapTitle', 'children'),
-    [Input('dropdown', 'value')]
-)
-def update_road_map_title(neighborhood):
-    """Update neighborhood road map title."""
-    return NAMES[neighborhood] + ' Roads'
-
-
-# Update traffic flow count title after dropdown selection
-@APP.callback(
-    Output('flowCountTitle', 'children'),
-    [Input('dropdown', 'value')]
-)
-def update_flow_count_title(neighborhood):
-    """Update flow count title."""
-    return NAMES[neighborhood] + ' Flow Counts'
-
-
-# Update speed limit title after dropdown selection
-@APP.callback(
-    Output('speedLimitTitle', 'children'),
-    [Input('dropdown', 'value')]
-)
-def update_speed_limit_title(neighborhood):
-    """Update speed limit title."""
-    return NAMES[neighborhood] + ' Speed Limits'
-
-
-# Update road type title after dropdown selection
-@APP.callback(
-    Output('roadTypeTitle', 'children'),
-    [Input('dropdown', 'value')]
-)
-def update_road_type_title(neighborhood):
-    """Update road type title."""
-    return NAMES[neighborhood] + ' Road Types'
-
-
 ##########################
 # Update controls status #
 ##########################
@@ -335,124 +411,156 @@ def update_dropdown(selected_data):
         return 92
 
 
-# Update slider after radio selection
-@APP.callback(
+# Update slider after radio or metric selection, in the browser
+APP.clientside_callback(
+    ClientsideFunction('neighborhood', 'update_slider'),
     Output('sliderContainer', 'style'),
-    [Input('radio', 'value')]
+    [Input('radio', 'value'),
+     Input('metric', 'value')],
+    [State('nbhdMetrics', 'data')]
 )
-def update_slider(map_type):
-    """Update slider after radio selection.
-
-    Update slider after radio selection. If 'flow' selected, show
-    slider. If 'speed' or 'road' selected, hide slider.
-
-    Parameters
-    ----------
-    map_type : str
-        Currently selected map type from radio.
-
-    Returns
-    -------
-    out : dict
-        CSS for slider status.
-    """
-    if map_type == 'flow':
-        return {'display': 'inline'}
-    return {'display': 'none'}
 
 
 ##################
 # Update figures #
 ##################
 
-# Update Seattle neighborhood map after dropdown selection
-@APP.callback(
-    Output('neighborhoodMapFigure', 'figure'),
-    [Input('dropdown', 'value')]
-)
-def update_neighborhood_map(neighborhood):
-    """Update Seattle neighborhood map.
+def road_map_view(neighborhood, relayout=None, view=None, zoomed=False):
+    """Get neighborhood and level of detail of road map.
 
-    Update neighborhood map after a drowpdown selection is made.
+    The level follows the axis ranges after the road map is zoomed, is
+    kept while the same neighborhood is shown, and otherwise fits the
+    whole neighborhood.
 
     Parameters
     ----------
     neighborhood : int
         Currently selected neighborhood (0-102).
+    relayout : dict
+        Relayout data of the road map.
+    view : dict
+        Neighborhood and level of detail of the shown road map, from
+        the roadMapLevel store.
+    zoomed : bool
+        Whether the road map was zoomed or panned.
 
     Returns
     -------
-    figure : dict
-        Plotly choroplethmapbox figure.
+    view : dict
+        'neighborhood' and 'level' of detail in LOD of the road map.
     """
-    return neighborhood_map(*NBHD_DATA, selected=neighborhood)
+    neighborhood = int(neighborhood)
+    if zoomed:
+        level = road_map_level(neighborhood, relayout, len(LOD))
+    elif view and view.get('neighborhood') == neighborhood:
+        level = int(view['level'])
+    else:
+        level = road_map_level(neighborhood, num_levels=len(LOD))
+    return {'neighborhood': neighborhood, 'level': level}
 
 
-# Update neighborhood road map after dropdown, radio, or slider selection
-@APP.callback(
-    Output('roadMapFigure', 'figure'),
-    [Input('dropdown', 'value'),
-     Input('radio', 'value'),
-     Input('slider', 'value')]
-)
-def update_road_map(neighborhood, map_type, year):
-    """Update neighborhood road map.
-
-    Update road map after a dropdown, radio, or slider selection is
-    made. Also triggered by neighborhood map selection via dropdown
-    callback.
+def request_key(body):
+    """Get store key of a callback request.
 
     Parameters
     ----------
-    neighborhood : int
-        Currently selected neighborhood (0-102)
-    map_type : str
-        Currently selected map type (flow, speed, road).
-    year : int
-        Currently selected year (2007-2018)
+    body : dict
+        JSON body of Dash callback request.
 
     Returns
     -------
-    figure : dict
-        Plotly scattermapbox figure.
+    key : tuple
+        Key from figure_key as in response_keys, or None if the request
+        is not for a callback with figures or has invalid inputs.
     """
-    return road_map(STREET_DATA, neighborhood, map_type, year)
-
-
-# Update traffic flow count figure after dropdown selection
-@APP.callback(
-    Output('flowCountFigure', 'figure'),
-    [Input('dropdown', 'value')]
-)
-def update_traffic_flow_counts(neighborhood):
-    """Update traffic flow count figure.
-
-    Update traffic flow count bar chart after a dropdown selection is
-    made. Also triggered by neighborhood map selection via dropdown
-    callback.
-
-    Parameters
-    ----------
-    neighborhood: int
-        Currently selected neighborhood (0-102)
+    callback = RESPONSE_OUTPUTS.get(body.get('output'))
+    if callback is None:
+        return None
+    values = {item.get('id'): item.get('value')
+              for item in body.get('inputs', []) + body.get('state', [])}
+    try:
+        key = figure_key(callback, values['dropdown'], values.get('radio'),
+                         values.get('slider'))
+        # Only road maps of the whole neighborhood are stored, and zooming
+        # may need no update
+        if callback == 'road_map' and (
+                'roadMapFigure.relayoutData' in body.get('changedPropIds', [])
+                or road_map_view(key[1], view=values.get('roadMapLevel'))
+                != road_map_view(key[1])):
+            return None
+        return key
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+# Serve callback responses from figure store before callbacks
+@APP.server.before_request
+def serve_stored_response():
+    """Serve precomputed callback response without running the callback.
+
+    Respond to callback requests in the figure store with the stored
+    response, precompressed in the best content encoding the client
+    accepts, so neither building, serializing, nor compressing figures
+    is part of request handling. Other requests fall through to Dash.
 
     Returns
     -------
-    figure : dict
-        Plotly bars figure.
+    response : Flask Response
+        Dash callback response, or None to let Dash handle the request.
     """
-    return traffic_flow_counts(STREET_DATA, neighborhood)
+    if FIGURE_STORE is None or flask.request.method != 'POST' or \
+            flask.request.path != UPDATE_PATH:
+        return None
+    key = request_key(flask.request.get_json(silent=True) or {})
+    if key is None:
+        return None
+    encoding = flask.request.accept_encodings.best_match(list(ENCODINGS))
+    data = read_response(FIGURE_STORE, key, encoding)
+    if data is None:
+        return None
+    response = flask.Response(data, mimetype='application/json')
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+# Update section titles after dropdown selection, in the browser
+APP.clientside_callback(
+    ClientsideFunction('neighborhood', 'update_titles'),
+    [Output('roadMapTitle', 'children'),
+     Output('flowCountTitle', 'children'),
+     Output('speedLimitTitle', 'children'),
+     Output('roadTypeTitle', 'children')],
+    [Input('dropdown', 'value')],
+    [State('nbhdInfo', 'data')]
+)
 
 
-# Update speed limit figure after dropdown selection
+# Highlight and center neighborhood map after dropdown selection, and
+# color it after metric or year selection, in the browser, so the
+# neighborhood geojson is never sent again
+APP.clientside_callback(
+    ClientsideFunction('neighborhood', 'update_neighborhood_map'),
+    Output('neighborhoodMapFigure', 'figure'),
+    [Input('dropdown', 'value'),
+     Input('metric', 'value'),
+     Input('slider', 'value')],
+    [State('nbhdInfo', 'data'),
+     State('nbhdMetrics', 'data'),
+     State('neighborhoodMapFigure', 'figure')]
+)
+
+
+# Update charts after dropdown selection
 @APP.callback(
-    Output('speedLimitFigure', 'figure'),
+    [Output(idx, prop) for idx, prop in NBHD_OUTPUTS],
     [Input('dropdown', 'value')]
 )
-def update_speed_limits(neighborhood):
-    """Update speed limits figure.
+def update_neighborhood(neighborhood):
+    """Update charts.
 
-    Update speed limits histogram after a dropdown selection is made.
+    Update all charts in one request after a dropdown selection is made.
     Also triggered by neighborhood map selection via dropdown callback.
 
     Parameters
@@ -462,34 +570,66 @@ def update_speed_limits(neighborhood):
 
     Returns
     -------
-    figure : dict
-        Plotly histogram figure.
+    outputs : list
+        Plotly box plot flow count, and histogram speed limit and road
+        type figures (dict).
     """
-    return speed_limits(STREET_DATA, neighborhood)
+    outputs = FIGURE_CACHE.get_or_build(
+        figure_key('neighborhood', neighborhood),
+        lambda: nbhd_outputs(STREET_DATA, NBHD_INDEX, neighborhood,
+                             AGGREGATES))
+    return [outputs[idx][prop] for idx, prop in NBHD_OUTPUTS]
 
 
-# Update road type figure after dropdown selection
+# Update neighborhood road map after dropdown, radio, or slider selection,
+# or after zooming to another level of detail
 @APP.callback(
-    Output('roadTypeFigure', 'figure'),
-    [Input('dropdown', 'value')]
+    [Output(idx, prop) for idx, prop in ROAD_MAP_OUTPUTS],
+    [Input('dropdown', 'value'),
+     Input('radio', 'value'),
+     Input('slider', 'value'),
+     Input('roadMapFigure', 'relayoutData')],
+    [State('roadMapLevel', 'data')]
 )
-def update_road_types(neighborhood):
-    """Update road types figure.
+def update_road_map(neighborhood, map_type, year, relayout=None, view=None):
+    """Update neighborhood road map.
 
-    Update road types histogram after a dropdown selection is made.
-    Also triggered by neighborhood map selection via dropdown callback.
+    Update road map after a dropdown, radio, or slider selection is
+    made. Also triggered by neighborhood map selection via dropdown
+    callback, and by zooming or panning the road map, which only
+    updates it if the level of detail changes.
 
     Parameters
     ----------
     neighborhood : int
-        Currently selected neighborhood (0-102).
+        Currently selected neighborhood (0-102)
+    map_type : str
+        Currently selected map type (flow, speed, road).
+    year : int
+        Currently selected year (2007-2018)
+    relayout : dict
+        Relayout data of the road map.
+    view : dict
+        Neighborhood and level of detail of the shown road map.
 
     Returns
     -------
-    figure : dict
-        Plotly histogram figure.
+    outputs : list
+        Plotly scattermapbox figure (dict) and its view from
+        road_map_view.
     """
-    return road_types(STREET_DATA, neighborhood)
+    zoomed = flask.has_request_context() and \
+        'roadMapFigure.relayoutData' in [
+            item['prop_id'] for item in dash.callback_context.triggered]
+    new_view = road_map_view(neighborhood, relayout, view, zoomed)
+    if zoomed and new_view == view:
+        raise PreventUpdate
+    key = figure_key('road_map', neighborhood, map_type, year)
+    outputs = FIGURE_CACHE.get_or_build(
+        key + (new_view['level'],),
+        lambda: road_map_outputs(STREET_DATA, COORDS, NBHD_INDEX, key, LOD,
+                                 new_view['level']))
+    return [outputs[idx][prop] for idx, prop in ROAD_MAP_OUTPUTS]
 
 
 # Run dashboard
@@ -0,0 +1,79 @@
+/*
+ * Clientside callbacks of the neighborhood traffic flow dashboard.
+ *
+ * Updates that need only the neighborhood names and centroids, shipped
+ * once in the nbhdInfo store, and the neighborhood map metrics, shipped
+ * once in the nbhdMetrics store, run in the browser without a request
+ * to the server.
+ */
+
+// Metric values of each neighborhood in a year, or undefined if none
+function metricValues(metric, year, metrics) {
+    var values = metrics.values[metric];
+    if (values === undefined) {
+        return undefined;
+    }
+    if (values.length === 1) {
+        return values[0];
+    }
+    var idx = metrics.years.indexOf(year);
+    return values[idx < 0 ? values.length - 1 : idx];
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    neighborhood: {
+        // Show slider only for traffic flow map or metrics by year
+        update_slider: function(mapType, metric, metrics) {
+            var values = metrics.values[metric];
+            if (mapType === 'flow' ||
+                    (values !== undefined && values.length > 1)) {
+                return {'display': 'inline'};
+            }
+            return {'display': 'none'};
+        },
+
+        // Section titles of selected neighborhood
+        update_titles: function(neighborhood, info) {
+            var name = info.names[neighborhood];
+            if (name === undefined) {
+                name = 'Neighborhood';
+            }
+            return [name + ' Roads', name + ' Flow Counts',
+                    name + ' Speed Limits', name + ' Road Types'];
+        },
+
+        // Color neighborhoods by metric of year, and highlight and center
+        // selected neighborhood if changed, copying only the trace and
+        // layout objects that change so the geojson is reused
+        update_neighborhood_map: function(neighborhood, metric, year, info,
+                                          metrics, figure) {
+            var z = metricValues(metric, year, metrics);
+            var trace = Object.assign({}, figure.data[0], {
+                z: z === undefined ? info.names.map(function() {
+                    return 0;
+                }) : z,
+                hoverinfo: z === undefined ? 'text' : 'text+z',
+                showscale: z !== undefined,
+                colorbar: {title: metrics.labels[metric]}
+            });
+            var layout = figure.layout;
+            var previous = (figure.data[0].selectedpoints || [])[0];
+            if (info.names[neighborhood] !== undefined &&
+                    neighborhood !== previous) {
+                trace.selectedpoints = [neighborhood];
+                layout = Object.assign({}, layout, {
+                    mapbox: Object.assign({}, layout.mapbox, {
+                        center: {
+                            lon: info.lon[neighborhood],
+                            lat: info.lat[neighborhood]
+                        }
+                    })
+                });
+            }
+            return Object.assign({}, figure, {
+                data: [trace].concat(figure.data.slice(1)),
+                layout: layout
+            });
+        }
+    }
+});
@@ -0,0 +1,319 @@
+"""Aggregate street data into a neighborhood by year cube.
+
+The cube holds statistics of every neighborhood in dense arrays with
+one row per neighborhood and a last row for the whole city, and for
+traffic flow counts one column per year, so charts read statistics of
+any neighborhood and year in O(1) instead of recomputing them from the
+street segments. Box plot outliers vary in number and are stored
+CSR-style as an offsets array with one entry per row and year, plus
+one, and a flat outliers array.
+"""
+import numpy as np
+
+from neighborhoodtrafficflow.data.neighborhood_index import nbhd_rows
+
+# Years of traffic flow counts
+YEARS = list(range(2007, 2019))
+
+# Percentiles of traffic flow counts
+QUANTILES = [0, 25, 50, 75, 100]
+
+# Neighborhood map metrics and their labels
+METRICS = {'median': 'Median Flow Count',
+           'density': 'Flow Count per Segment',
+           'arterial': 'Percent Arterials'}
+
+# Names of cube arrays
+AGGREGATE_NAMES = ['segments', 'count', 'sum', 'mean', 'quantiles',
+                   'fences', 'outlier_offsets', 'outliers', 'speed', 'road']
+
+
+def hazen_percentiles(values, percents):
+    """Get percentiles of values interpolated as in Plotly box plots.
+
+    Same as np.percentile with method 'hazen', which requires numpy
+    1.22: the p-th percentile is at position p / 100 * n - 0.5 of the
+    sorted values, clipped to the first and last value.
+
+    Parameters
+    ----------
+    values : ndarray
+        Sample values (float), not empty.
+    percents : list
+        Percentiles (float) between 0 and 100.
+
+    Returns
+    -------
+    percentiles : ndarray
+        Percentiles of values.
+    """
+    values = np.sort(values)
+    positions = np.clip(np.asarray(percents, dtype=float) / 100
+                        * len(values) - 0.5, 0, len(values) - 1)
+    return np.interp(positions, np.arange(len(values)), values)
+
+
+def box_stats(values):
+    """Get box plot statistics of values as Plotly computes them.
+
+    Fences are the most extreme values within 1.5 interquartile ranges
+    of the quartiles, and values beyond the fences are outliers.
+
+    Parameters
+    ----------
+    values : ndarray
+        Sample values (float), not empty.
+
+    Returns
+    -------
+    quantiles : ndarray
+        Percentiles of values in QUANTILES.
+    fences : ndarray
+        Lower and upper fence.
+    outliers : ndarray
+        Values beyond the fences, sorted.
+    """
+    quantiles = hazen_percentiles(values, QUANTILES)
+    q1, q3 = quantiles[1], quantiles[3]
+    fences = np.array([
+        min(q1, values[values >= q1 - 1.5 * (q3 - q1)].min()),
+        max(q3, values[values <= q3 + 1.5 * (q3 - q1)].max())
+    ])
+    outliers = np.sort(values[(values < fences[0]) | (values > fences[1])])
+    return quantiles, fences, outliers
+
+
+def build_aggregates(street_data, nbhd_index, num_nbhds=None):
+    """Build neighborhood by year cube of street statistics.
+
+    Parameters
+    ----------
+    street_data : DataFrame
+        Cleaned street data with speed, road, and traffic flow count
+        columns, negative if missing, in the row order of nbhd_index.
+        Years without a column have no counts.
+    nbhd_index : dict
+        Inverted index from build_nbhd_index.
+    num_nbhds : int
+        Number of neighborhoods. If None, the number in nbhd_index.
+
+    Returns
+    -------
+    aggregates : dict
+        Arrays with one row per neighborhood and a last row for the
+        city: 'segments' (int) street segments, and per year 'count'
+        (int) segments with a traffic flow count, 'sum' and 'mean' of
+        flow counts, 'quantiles' in QUANTILES and box plot 'fences',
+        NaN if no counts, and 'outlier_offsets' and 'outliers' read with
+        flow_outliers, and 'speed' and 'road' (int) segments with each
+        speed limit and arterial classification.
+    """
+    if num_nbhds is None:
+        num_nbhds = len(nbhd_index['offsets']) - 1
+    num_rows = num_nbhds + 1
+    speed = street_data['speed'].to_numpy()
+    road = street_data['road'].to_numpy()
+    flows = [year_flows(street_data, year) for year in YEARS]
+    aggregates = {
+        'segments': np.zeros(num_rows, dtype=np.int64),
+        'count': np.zeros((num_rows, len(YEARS)), dtype=np.int64),
+        'sum': np.zeros((num_rows, len(YEARS))),
+        'mean': np.full((num_rows, len(YEARS)), np.nan),
+        'quantiles': np.full((num_rows, len(YEARS), len(QUANTILES)), np.nan),
+        'fences': np.full((num_rows, len(YEARS), 2), np.nan),
+        'speed': np.zeros((num_rows, max(speed.max(initial=0), 0) + 1),
+                          dtype=np.int64),
+        'road': np.zeros((num_rows, max(road.max(initial=0), 0) + 1),
+                         dtype=np.int64)
+    }
+    outliers = []
+    for row in range(num_rows):
+        if row < num_nbhds:
+            rows = nbhd_rows(nbhd_index, row)
+        else:
+            rows = np.arange(len(street_data))
+        aggregates['segments'][row] = len(rows)
+        row_speed = speed[rows]
+        aggregates['speed'][row] = np.bincount(
+            row_speed[row_speed >= 0],
+            minlength=aggregates['speed'].shape[1])
+        aggregates['road'][row] = np.bincount(
+            road[rows], minlength=aggregates['road'].shape[1])
+        for col, flow in enumerate(flows):
+            values = flow[rows]
+            values = values[values >= 0]
+            aggregates['count'][row, col] = len(values)
+            if len(values) == 0:
+                outliers.append(values)
+                continue
+            aggregates['sum'][row, col] = values.sum()
+            aggregates['mean'][row, col] = values.mean()
+            quantiles, fences, row_outliers = box_stats(values)
+            aggregates['quantiles'][row, col] = quantiles
+            aggregates['fences'][row, col] = fences
+            outliers.append(row_outliers)
+
+    lengths = np.array([len(values) for values in outliers], dtype=np.int64)
+    aggregates['outlier_offsets'] = np.zeros(len(lengths) + 1,
+                                             dtype=np.int64)
+    np.cumsum(lengths, out=aggregates['outlier_offsets'][1:])
+    aggregates['outliers'] = np.concatenate(outliers) if outliers \
+        else np.zeros(0)
+    return aggregates
+
+
+def year_flows(street_data, year):
+    """Get traffic flow counts (float) of a year, all missing if no column."""
+    if str(year) not in street_data:
+        return np.full(len(street_data), -1.0)
+    return street_data[str(year)].to_numpy(dtype=float)
+
+
+def cube_row(aggregates, neighborhood=None):
+    """Get row of a neighborhood or the city in the cube.
+
+    Parameters
+    ----------
+    aggregates : dict
+        Cube from build_aggregates.
+    neighborhood : int
+        Index of neighborhood. If None, the city.
+
+    Returns
+    -------
+    row : int
+        Row in cube arrays, or None if the neighborhood is not in the
+        cube.
+    """
+    num_rows = len(aggregates['segments'])
+    if neighborhood is None:
+        return num_rows - 1
+    neighborhood = int(neighborhood)
+    if not 0 <= neighborhood < num_rows - 1:
+        return None
+    return neighborhood
+
+
+def flow_outliers(aggregates, row, col):
+    """Get outliers of traffic flow counts of a row and year column.
+
+    Returns a view into aggregates['outliers'], sorted.
+    """
+    idx = row * aggregates['count'].shape[1] + col
+    start, stop = aggregates['outlier_offsets'][idx:idx+2]
+    return aggregates['outliers'][start:stop]
+
+
+def metric_table(aggregates):
+    """Tabulate neighborhood map metrics of every neighborhood.
+
+    Metrics are the median traffic flow count, the sum of traffic flow
+    counts per street segment, and the percent of street segments that
+    are arterials.
+
+    Parameters
+    ----------
+    aggregates : dict
+        Cube from build_aggregates.
+
+    Returns
+    -------
+    table : dict
+        Mapping from name in METRICS to array (float) with one row per
+        neighborhood and one column per year, or a single column if the
+        metric does not vary by year. NaN if a neighborhood has no data.
+    """
+    rows = slice(0, len(aggregates['segments']) - 1)
+    segments = aggregates['segments'][rows].astype(float)
+    segments[segments == 0] = np.nan
+    road = aggregates['road'][rows]
+    return {
+        'median': np.array(aggregates['quantiles'][rows, :, 2]),
+        'density': aggregates['sum'][rows] / segments[:, np.newaxis],
+        'arterial': (100 * (road.sum(axis=1) - road[:, 0])
+                     / segments)[:, np.newaxis]
+    }
+
+
+def check_aggregates(aggregates, street_data):
+    """Check cube against statistics of the street segments.
+
+    Statistics are recomputed from the nbhd column of street_data, not
+    the inverted index the cube was built from.
+
+    Parameters
+    ----------
+    aggregates : dict
+        Cube from build_aggregates.
+    street_data : DataFrame
+        Cleaned street data the cube was built from.
+
+    Returns
+    -------
+    out : None
+
+    Raises
+    ------
+    ValueError
+        If any statistic of a neighborhood, the city, or a year differs
+        from the street segments, naming the first one.
+    """
+    num_nbhds = len(aggregates['segments']) - 1
+    membership = [[] for _ in range(num_nbhds)]
+    for row, nbhd_list in enumerate(street_data['nbhd']):
+        for neighborhood in set(nbhd_list):
+            if 0 <= neighborhood < num_nbhds:
+                membership[neighborhood].append(row)
+    membership.append(list(range(len(street_data))))
+
+    for row, rows in enumerate(membership):
+        segments = street_data.iloc[rows]
+        name = 'city' if row == num_nbhds else 'neighborhood %d' % row
+        speed = segments['speed'][segments['speed'] >= 0]
+        expected = {
+            'segments': len(rows),
+            'speed': np.bincount(speed,
+                                 minlength=aggregates['speed'].shape[1]),
+            'road': np.bincount(segments['road'],
+                                minlength=aggregates['road'].shape[1])
+        }
+        for key, value in expected.items():
+            if not np.array_equal(aggregates[key][row], value):
+                raise ValueError('%s of %s differs' % (key, name))
+        for col, year in enumerate(YEARS):
+            values = year_flows(segments, year)
+            values = values[values >= 0]
+            if aggregates['count'][row, col] != len(values):
+                raise ValueError('count of %s in %d differs' % (name, year))
+            if len(values) == 0:
+                continue
+            quantiles, fences, outliers = box_stats(values)
+            expected = {
+                'sum': values.sum(),
+                'mean': values.mean(),
+                'quantiles': quantiles,
+                'fences': fences
+            }
+            for key, value in expected.items():
+                if not np.allclose(aggregates[key][row, col], value,
+                                   rtol=1e-12):
+                    raise ValueError('%s of %s in %d differs' %
+                                     (key, name, year))
+            if not np.array_equal(flow_outliers(aggregates, row, col),
+                                  outliers):
+                raise ValueError('outliers of %s in %d differ' %
+                                 (name, year))
+
+
+def save_aggregates(aggregates_path, aggregates):
+    """Save cube to npz file."""
+    np.savez(aggregates_path, **aggregates)
+
+
+def load_aggregates(aggregates_path):
+    """Load cube from npz file.
+
+    Raises FileNotFoundError if file at aggregates_path does not exist.
+    """
+    with np.load(aggregates_path) as npz_file:
+        return {name: npz_file[name] for name in AGGREGATE_NAMES}
@@ -0,0 +1,231 @@
+"""Store street segment coordinates in flat, offset-indexed arrays.
+
+Coordinates are also simplified into levels of detail with the
+Douglas-Peucker algorithm at increasing tolerances, each stored in the
+same flat arrays, so maps draw no more vertices than they can show.
+"""
+from itertools import chain
+
+import numpy as np
+
+# Douglas-Peucker tolerances (m) of each level of detail, finest first.
+# Level 0 is the cleaned geometry.
+LOD_TOLERANCES = [0, 1, 3, 9]
+
+# Length (m) of one degree of latitude
+METERS_PER_DEGREE = 111320
+
+
+def pack_coords(lon_list, lat_list):
+    """Pack street segment coordinates into flat arrays.
+
+    Parameters
+    ----------
+    lon_list : list
+        List of longitude lists (float), one per street segment.
+    lat_list : list
+        List of latitude lists (float), one per street segment.
+
+    Returns
+    -------
+    coords : dict
+        Contiguous 'lon' and 'lat' arrays (float) of all coordinates
+        and 'offsets' array (int) with one more entry than segments,
+        so that segment i spans offsets[i]:offsets[i+1].
+
+    Raises
+    ------
+    ValueError
+        If a segment has a different number of lon and lat values.
+    """
+    lengths = np.array([len(lon) for lon in lon_list], dtype=np.int64)
+    if not np.array_equal(lengths, [len(lat) for lat in lat_list]):
+        raise ValueError('lon and lat lists have different lengths')
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return {
+        'lon': np.fromiter(chain.from_iterable(lon_list), dtype=float,
+                           count=offsets[-1]),
+        'lat': np.fromiter(chain.from_iterable(lat_list), dtype=float,
+                           count=offsets[-1]),
+        'offsets': offsets
+    }
+
+
+def segment_coords(coords, row):
+    """Get coordinates of one street segment.
+
+    Parameters
+    ----------
+    coords : dict
+        Coordinate arrays from pack_coords.
+    row : int
+        Row of street segment in the street DataFrame.
+
+    Returns
+    -------
+    lon : ndarray
+        Longitudes (float) of the segment, a view into coords['lon'].
+    lat : ndarray
+        Latitudes (float) of the segment, a view into coords['lat'].
+    """
+    start, stop = coords['offsets'][row], coords['offsets'][row + 1]
+    return coords['lon'][start:stop], coords['lat'][start:stop]
+
+
+def simplify_segment(lon, lat, tolerance):
+    """Simplify one street segment with the Douglas-Peucker algorithm.
+
+    Vertices are kept until every removed vertex lies within tolerance
+    of the simplified line. Coordinates are projected to meters about
+    the segment's mean latitude. The first and last vertices are always
+    kept, so segments meeting at a junction still meet after
+    simplification.
+
+    Parameters
+    ----------
+    lon : ndarray
+        Longitudes (float) of the segment.
+    lat : ndarray
+        Latitudes (float) of the segment.
+    tolerance : float
+        Maximum distance (m) of removed vertices from the simplified
+        line.
+
+    Returns
+    -------
+    keep : ndarray
+        Indices (int) of kept vertices, in order.
+    """
+    num = len(lon)
+    if num <= 2 or tolerance <= 0:
+        return np.arange(num)
+    x_m = np.asarray(lon) * METERS_PER_DEGREE * \
+        np.cos(np.radians(np.mean(lat)))
+    y_m = np.asarray(lat) * METERS_PER_DEGREE
+    keep = np.zeros(num, dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, num - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        # Distance of inner vertices to the chord, or to its first vertex
+        # if the chord is a closed loop
+        d_x = x_m[last] - x_m[first]
+        d_y = y_m[last] - y_m[first]
+        p_x = x_m[first + 1:last] - x_m[first]
+        p_y = y_m[first + 1:last] - y_m[first]
+        length = np.hypot(d_x, d_y)
+        if length == 0:
+            dist = np.hypot(p_x, p_y)
+        else:
+            along = np.clip((p_x * d_x + p_y * d_y) / length**2, 0, 1)
+            dist = np.hypot(p_x - along * d_x, p_y - along * d_y)
+        idx = np.argmax(dist)
+        if dist[idx] > tolerance:
+            split = first + 1 + idx
+            keep[split] = True
+            stack.extend([(first, split), (split, last)])
+    return np.flatnonzero(keep)
+
+
+def build_lod(coords, tolerances=None):
+    """Simplify street segment coordinates into levels of detail.
+
+    Parameters
+    ----------
+    coords : dict
+        Coordinate arrays from pack_coords.
+    tolerances : list
+        Douglas-Peucker tolerance (m) of each level, finest first. If
+        None, LOD_TOLERANCES.
+
+    Returns
+    -------
+    lod : list
+        Coordinate arrays as from pack_coords of each level, with coords
+        itself as level 0 if its tolerance is 0.
+    """
+    if tolerances is None:
+        tolerances = LOD_TOLERANCES
+    offsets = coords['offsets']
+    lod = []
+    for tolerance in tolerances:
+        if tolerance <= 0:
+            lod.append(coords)
+            continue
+        rows = [offsets[row] + simplify_segment(
+            *segment_coords(coords, row), tolerance)
+                for row in range(len(offsets) - 1)]
+        lengths = np.array([len(idx) for idx in rows], dtype=np.int64)
+        level_offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=level_offsets[1:])
+        idx = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        lod.append({'lon': coords['lon'][idx], 'lat': coords['lat'][idx],
+                    'offsets': level_offsets})
+    return lod
+
+
+def lod_level(resolution, num_levels=None, tolerances=None):
+    """Get coarsest level of detail finer than a map resolution.
+
+    Parameters
+    ----------
+    resolution : float
+        Size (m) of one pixel of the map.
+    num_levels : int
+        Number of levels available. If None, all levels of tolerances.
+    tolerances : list
+        Douglas-Peucker tolerance (m) of each level, finest first. If
+        None, LOD_TOLERANCES.
+
+    Returns
+    -------
+    level : int
+        Index of the coarsest level whose tolerance is at most one
+        pixel, so simplification is not visible.
+    """
+    if tolerances is None:
+        tolerances = LOD_TOLERANCES
+    if num_levels is None:
+        num_levels = len(tolerances)
+    level = 0
+    for idx, tolerance in enumerate(tolerances[:num_levels]):
+        if tolerance <= resolution:
+            level = idx
+    return level
+
+
+def save_coords(coords_path, coords):
+    """Save coordinate arrays to npz file."""
+    np.savez(coords_path, **coords)
+
+
+def load_coords(coords_path):
+    """Load coordinate arrays from npz file.
+
+    Raises FileNotFoundError if file at coords_path does not exist.
+    """
+    with np.load(coords_path) as npz_file:
+        return {name: npz_file[name] for name in ['lon', 'lat', 'offsets']}
+
+
+def save_lod(lod_path, lod):
+    """Save simplified levels of detail, above level 0, to npz file."""
+    np.savez(lod_path, **{'%s_%d' % (name, level): coords[name]
+                          for level, coords in enumerate(lod) if level > 0
+                          for name in ['lon', 'lat', 'offsets']})
+
+
+def load_lod(lod_path, coords):
+    """Load levels of detail from npz file, with coords as level 0.
+
+    Raises FileNotFoundError if file at lod_path does not exist.
+    """
+    lod = [coords]
+    with np.load(lod_path) as npz_file:
+        while 'offsets_%d' % len(lod) in npz_file:
+            lod.append({name: npz_file['%s_%d' % (name, len(lod))]
+                        for name in ['lon', 'lat', 'offsets']})
+    return lod
@@ -0,0 +1,106 @@
+"""Track raw dataset content hashes for incremental rebuilds."""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+
+def hash_path(path):
+    """Get content hash of a file or of all files in a directory.
+
+    Parameters
+    ----------
+    path : str
+        Path to file or directory.
+
+    Returns
+    -------
+    digest : str
+        SHA-256 hex digest of file names and contents.
+
+    Raises
+    ------
+    FileNotFoundError : No such file or directory
+        If nothing exists at path.
+    """
+    path = Path(path)
+    if path.is_dir():
+        files = sorted(p for p in path.iterdir() if p.is_file())
+    elif path.exists():
+        files = [path]
+    else:
+        raise FileNotFoundError(path)
+
+    sha = hashlib.sha256()
+    for file_path in files:
+        sha.update(file_path.name.encode())
+        with open(file_path, 'rb') as data_file:
+            for block in iter(lambda: data_file.read(1 << 20), b''):
+                sha.update(block)
+    return sha.hexdigest()
+
+
+def read_manifest(manifest_path):
+    """Read mapping from dataset name to content hash.
+
+    Returns an empty dictionary if no manifest exists yet.
+    """
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as json_file:
+        return json.load(json_file)
+
+
+def write_manifest(manifest_path, manifest):
+    """Write mapping from dataset name to content hash."""
+    with open(manifest_path, 'w+') as json_file:
+        json.dump(manifest, json_file, indent=2, sort_keys=True)
+
+
+def get_stale(old, new, names, cache_path, shared=()):
+    """Get names of datasets that need to be reprocessed.
+
+    A dataset is stale if its hash changed, if the hash of any input
+    shared by all datasets changed, or if its cached result is missing.
+
+    Parameters
+    ----------
+    old : dict
+        Manifest from the previous build.
+    new : dict
+        Manifest of the current raw inputs.
+    names : list
+        Names (str) of datasets with cached results.
+    cache_path : str
+        Directory of cached results.
+    shared : list
+        Names (str) of inputs that every dataset depends on.
+
+    Returns
+    -------
+    stale : list
+        Names of stale datasets, in the order of names.
+    """
+    if any(old.get(name) != new[name] for name in shared):
+        return list(names)
+    return [name for name in names if old.get(name) != new[name] or
+            not os.path.exists(get_cache_file(cache_path, name))]
+
+
+def get_cache_file(cache_path, name):
+    """Get path to cached result of a dataset."""
+    return Path(cache_path) / ('%s.pkl' % name)
+
+
+def load_cached(cache_path, name):
+    """Load cached result of a dataset."""
+    return pd.read_pickle(get_cache_file(cache_path, name))
+
+
+def save_cached(cache_path, name, data_frame):
+    """Save cached result of a dataset."""
+    if not os.path.exists(cache_path):
+        os.makedirs(cache_path)
+    data_frame.to_pickle(get_cache_file(cache_path, name))
@@ -5,8 +5,12 @@ import os
 import pickle
 
 import geopandas as gpd
+import pandas as pd
 from shapely.geometry import Polygon, MultiPolygon
 
+from neighborhoodtrafficflow.data.storage import \
+    write_table, nbhd_data_to_frame
+
 
 def prep_map_data(json_path, data_path):
     """Prepare neighborhood map dataset.
@@ -102,6 +106,40 @@ def prep_map_info(shp_path, info_path):
                                   bounds[3]])
 
 
+def prep_map_tables(data_path, info_path, data_table_path, info_table_path):
+    """Prepare Parquet tables of neighborhood datasets.
+
+    Convert neighborhood map and info datasets from prep_map_data and
+    prep_map_info to Parquet files. Raises FileNotFoundError if file at
+    data_path or info_path does not exist and overwrites files at
+    data_table_path and info_table_path if already exist.
+
+    Parameters
+    ----------
+    data_path : str
+        Path to neighborhood pkl file.
+    info_path : str
+        Path to neighborhood csv file.
+    data_table_path : str
+        Path to neighborhood map Parquet file.
+    info_table_path : str
+        Path to neighborhood info Parquet file.
+
+    Returns
+    -------
+    out : None
+
+    Raises
+    ------
+    FileNotFoundError : No such file or directory
+        If file at data_path or info_path does not exist.
+    """
+    with open(data_path, 'rb') as pickle_file:
+        nbhd_data = pickle.load(pickle_file)
+    write_table(data_table_path, nbhd_data_to_frame(nbhd_data))
+    write_table(info_table_path, pd.read_csv(info_path))
+
+
 if __name__ == '__main__':
     # Create directory for cleaned data if none exists
     if not os.path.exists('cleaned'):
@@ -112,7 +150,10 @@ if __name__ == '__main__':
     SHP_PATH = 'raw/zillow-neighborhoods/zillow-neighborhoods.shp'
     DATA_PATH = 'cleaned/nbhd_data.pkl'
     INFO_PATH = 'cleaned/nbhd_info.csv'
+    DATA_TABLE_PATH = 'cleaned/nbhd_data.parquet'
+    INFO_TABLE_PATH = 'cleaned/nbhd_info.parquet'
 
     # Prepare data
     prep_map_data(JSON_PATH, DATA_PATH)
     prep_map_info(SHP_PATH, INFO_PATH)
+    prep_map_tables(DATA_PATH, INFO_PATH, DATA_TABLE_PATH, INFO_TABLE_PATH)
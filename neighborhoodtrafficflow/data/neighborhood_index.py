@@ -0,0 +1,189 @@
+"""Index street segment rows by neighborhood.
+
+The index is stored CSR-style as an offsets array with one more entry
+than neighborhoods and a rows array, so that the rows of street
+segments in neighborhood i are rows[offsets[i]:offsets[i+1]], in
+ascending order. It also holds a bits array with one fixed-width bitset
+per street segment, where bit i of the segment is set if it is in
+neighborhood i, for vectorized queries over sets of neighborhoods.
+"""
+import numpy as np
+
+# Number of uint64 words per bitset, enough for 128 neighborhoods
+NBHD_WORDS = 2
+
+
+def build_nbhd_index(nbhd_lists, num_nbhds=None):
+    """Build inverted index from neighborhood to street segment rows.
+
+    Parameters
+    ----------
+    nbhd_lists : list
+        List of neighborhood index lists (int), one per street segment.
+    num_nbhds : int
+        Number of neighborhoods. If None or smaller, one more than the
+        largest neighborhood index is used.
+
+    Returns
+    -------
+    nbhd_index : dict
+        'offsets' array (int) with one more entry than neighborhoods,
+        'rows' array (int) of street segment rows grouped by
+        neighborhood, and 'bits' array (uint64) of shape (segments,
+        words) with at least NBHD_WORDS words.
+    """
+    lengths = np.fromiter((len(nbhd) for nbhd in nbhd_lists),
+                          dtype=np.int64, count=len(nbhd_lists))
+    rows = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+    nbhds = np.fromiter((idx for nbhd in nbhd_lists for idx in nbhd),
+                        dtype=np.int64, count=lengths.sum())
+
+    # Sort by neighborhood, then row, and drop repeated pairs
+    order = np.lexsort((rows, nbhds))
+    rows, nbhds = rows[order], nbhds[order]
+    unique = np.ones(len(rows), dtype=bool)
+    unique[1:] = (rows[1:] != rows[:-1]) | (nbhds[1:] != nbhds[:-1])
+    rows, nbhds = rows[unique], nbhds[unique]
+
+    counts = np.bincount(nbhds, minlength=num_nbhds or 0)
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    # Set bit of each neighborhood in bitset of each segment
+    num_words = max(NBHD_WORDS, -(-len(counts) // 64))
+    bits = np.zeros((len(lengths), num_words), dtype=np.uint64)
+    np.bitwise_or.at(bits, (rows, nbhds // 64), _word_bits(nbhds))
+    return {'offsets': offsets, 'rows': rows, 'bits': bits}
+
+
+def _word_bits(nbhds):
+    """Get bit (uint64) of each neighborhood within its bitset word."""
+    return np.left_shift(np.uint64(1), (nbhds % 64).astype(np.uint64))
+
+
+def nbhd_rows(nbhd_index, neighborhood):
+    """Get rows of street segments in a neighborhood.
+
+    Parameters
+    ----------
+    nbhd_index : dict
+        Inverted index from build_nbhd_index.
+    neighborhood : int
+        Index of neighborhood.
+
+    Returns
+    -------
+    rows : ndarray
+        Rows (int) in ascending order, a view into nbhd_index['rows'].
+        Empty if no street segment is in the neighborhood.
+    """
+    offsets = nbhd_index['offsets']
+    neighborhood = int(neighborhood)
+    if not 0 <= neighborhood < len(offsets) - 1:
+        return nbhd_index['rows'][:0]
+    return nbhd_index['rows'][offsets[neighborhood]:offsets[neighborhood+1]]
+
+
+def nbhd_bits_mask(neighborhoods, num_words=NBHD_WORDS):
+    """Get bitset of a set of neighborhoods.
+
+    Parameters
+    ----------
+    neighborhoods : list
+        Indices (int) of neighborhoods.
+    num_words : int
+        Number of uint64 words in bitset.
+
+    Returns
+    -------
+    mask : ndarray
+        Bitset (uint64) of shape (num_words,).
+
+    Raises
+    ------
+    ValueError
+        If a neighborhood index does not fit in the bitset.
+    """
+    nbhds = np.asarray(neighborhoods, dtype=np.int64).reshape(-1)
+    if np.any((nbhds < 0) | (nbhds >= 64 * num_words)):
+        raise ValueError('neighborhood index out of range of bitset')
+    mask = np.zeros(num_words, dtype=np.uint64)
+    np.bitwise_or.at(mask, nbhds // 64, _word_bits(nbhds))
+    return mask
+
+
+def in_any_nbhd(bits, neighborhoods):
+    """Get mask of street segments in any of a set of neighborhoods.
+
+    Parameters
+    ----------
+    bits : ndarray
+        Bitsets (uint64) of street segments from build_nbhd_index.
+    neighborhoods : list
+        Indices (int) of neighborhoods.
+
+    Returns
+    -------
+    mask : ndarray
+        Boolean mask, one entry per street segment.
+    """
+    mask = nbhd_bits_mask(neighborhoods, bits.shape[1])
+    return (bits & mask).any(axis=1)
+
+
+def in_all_nbhd(bits, neighborhoods):
+    """Get mask of street segments in all of a set of neighborhoods.
+
+    Parameters
+    ----------
+    bits : ndarray
+        Bitsets (uint64) of street segments from build_nbhd_index.
+    neighborhoods : list
+        Indices (int) of neighborhoods.
+
+    Returns
+    -------
+    mask : ndarray
+        Boolean mask, one entry per street segment.
+    """
+    mask = nbhd_bits_mask(neighborhoods, bits.shape[1])
+    return ((bits & mask) == mask).all(axis=1)
+
+
+def select_nbhd(data_frame, neighborhood, nbhd_index=None):
+    """Select street segments in a neighborhood.
+
+    Parameters
+    ----------
+    data_frame : Pandas DataFrame
+        DataFrame with nbhd column, in the row order of nbhd_index.
+    neighborhood : int
+        Index of neighborhood.
+    nbhd_index : dict
+        Inverted index from build_nbhd_index. If None, the nbhd column
+        of every street segment is searched instead.
+
+    Returns
+    -------
+    nbhd_data : Pandas DataFrame
+        Rows of data_frame in the neighborhood, in their original order.
+    """
+    if nbhd_index is None:
+        nbhd_idx = data_frame.nbhd.apply(
+            lambda nbhd_list: int(neighborhood) in nbhd_list)
+        return data_frame[nbhd_idx]
+    return data_frame.iloc[nbhd_rows(nbhd_index, neighborhood)]
+
+
+def save_nbhd_index(index_path, nbhd_index):
+    """Save inverted index to npz file."""
+    np.savez(index_path, **nbhd_index)
+
+
+def load_nbhd_index(index_path):
+    """Load inverted index from npz file.
+
+    Raises FileNotFoundError if file at index_path does not exist.
+    """
+    with np.load(index_path) as npz_file:
+        return {name: npz_file[name] for name in ['offsets', 'rows', 'bits']}
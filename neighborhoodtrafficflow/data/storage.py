@@ -0,0 +1,376 @@
+"""Save and load cleaned datasets as memory-mapped bundles and tables.
+
+A bundle is a directory of npy files and a json file. Numeric street
+columns are stored as one 2D array, street names as codes into the
+unique names, and street coordinates as flat, offset-indexed arrays,
+so loading a bundle maps the files instead of deserializing them and
+server processes share pages through the OS page cache. Neighborhood
+lists are stored only as the inverted index, which holds the same
+membership. The neighborhood by year cube of street statistics and the
+simplified levels of detail of street coordinates are stored alongside,
+one npy file per array.
+
+Tables are Parquet files of the cleaned street data, neighborhood data,
+and neighborhood info that can be read one column at a time.
+"""
+import json
+import os
+from pathlib import Path
+import pickle
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from neighborhoodtrafficflow.data.aggregates import \
+    AGGREGATE_NAMES, build_aggregates, load_aggregates
+from neighborhoodtrafficflow.data.geometry import \
+    pack_coords, load_coords, build_lod, load_lod
+from neighborhoodtrafficflow.data.manifest import hash_path
+from neighborhoodtrafficflow.data.neighborhood_index import build_nbhd_index
+
+# Bundle format version, increment on incompatible changes
+BUNDLE_VERSION = 6
+
+# File names in bundle
+META_FILE = 'meta.json'
+NBHD_FILE = 'nbhd.json'
+NUMERIC_FILE = 'numeric.npy'
+NAME_CODES_FILE = 'name_codes.npy'
+NAME_CATEGORIES_FILE = 'name_categories.npy'
+COORDS_FILES = {'lon': 'lon.npy', 'lat': 'lat.npy', 'offsets': 'offsets.npy'}
+NBHD_INDEX_FILES = {'offsets': 'nbhd_index_offsets.npy',
+                    'rows': 'nbhd_index_rows.npy',
+                    'bits': 'nbhd_index_bits.npy'}
+AGGREGATES_FILES = {name: 'aggregates_%s.npy' % name
+                    for name in AGGREGATE_NAMES}
+LOD_FILE = 'lod_%d_%s.npy'
+
+
+def write_bundle(bundle_path, street_data, coords, nbhd_data,
+                 nbhd_index=None, aggregates=None, lod=None):
+    """Write cleaned street and neighborhood data to a bundle.
+
+    The bundle is written to a temporary directory next to bundle_path
+    and then moved into place, replacing any existing bundle.
+
+    Parameters
+    ----------
+    bundle_path : str
+        Path to bundle directory.
+    street_data : DataFrame
+        Cleaned street data with name and nbhd columns. Columns lon and
+        lat, if present, are not written, and the nbhd column is written
+        only as the inverted index.
+    coords : dict
+        Street coordinate arrays from pack_coords.
+    nbhd_data : list
+        Number of neighborhoods, neighborhood geojson, region ids, and
+        neighborhood names from prep_map_data.
+    nbhd_index : dict
+        Inverted index from build_nbhd_index. If None, it is built from
+        the nbhd column of street_data.
+    aggregates : dict
+        Cube from build_aggregates. If None, it is built from
+        street_data and the inverted index.
+    lod : list
+        Coordinate arrays of each level of detail from build_lod. If
+        None, they are built from coords. Level 0 is not written again.
+
+    Returns
+    -------
+    out : None
+    """
+    bundle_path = Path(bundle_path)
+    tmp_path = bundle_path.with_name(bundle_path.name + '.tmp')
+    if tmp_path.exists():
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    # Numeric columns as one (column, row) array, so loading keeps a
+    # single pandas block backed by the memory map
+    numeric = street_data.drop(columns=['lon', 'lat'], errors='ignore') \
+        .select_dtypes('number')
+    np.save(tmp_path / NUMERIC_FILE,
+            np.ascontiguousarray(numeric.to_numpy().T))
+
+    # Street names as codes into the unique names
+    names = pd.Categorical(street_data['name'])
+    np.save(tmp_path / NAME_CODES_FILE, names.codes)
+    np.save(tmp_path / NAME_CATEGORIES_FILE,
+            names.categories.to_numpy(dtype=str))
+
+    # Street coordinates
+    for name, file_name in COORDS_FILES.items():
+        np.save(tmp_path / file_name, coords[name])
+
+    # Inverted index from neighborhood to street segment rows
+    if nbhd_index is None:
+        nbhd_index = build_nbhd_index(street_data['nbhd'], nbhd_data[0])
+    for name, file_name in NBHD_INDEX_FILES.items():
+        np.save(tmp_path / file_name, nbhd_index[name])
+
+    # Neighborhood by year cube of street statistics
+    if aggregates is None:
+        aggregates = build_aggregates(street_data, nbhd_index, nbhd_data[0])
+    for name, file_name in AGGREGATES_FILES.items():
+        np.save(tmp_path / file_name, aggregates[name])
+
+    # Simplified levels of detail of street coordinates
+    if lod is None:
+        lod = build_lod(coords)
+    for level, level_coords in enumerate(lod[1:], 1):
+        for name in COORDS_FILES:
+            np.save(tmp_path / (LOD_FILE % (level, name)),
+                    level_coords[name])
+
+    # Neighborhood data
+    with open(tmp_path / NBHD_FILE, 'w+') as json_file:
+        json.dump({'geojson': nbhd_data[1], 'region_ids': nbhd_data[2],
+                   'names': nbhd_data[3]}, json_file)
+
+    # Metadata last, so incomplete bundles are never valid
+    with open(tmp_path / META_FILE, 'w+') as json_file:
+        json.dump({'version': BUNDLE_VERSION,
+                   'data_version': hash_path(tmp_path),
+                   'num_segments': len(street_data),
+                   'numeric_columns': list(numeric.columns)},
+                  json_file, indent=2)
+
+    if bundle_path.exists():
+        shutil.rmtree(bundle_path)
+    os.rename(tmp_path, bundle_path)
+
+
+def read_bundle(bundle_path):
+    """Read cleaned street and neighborhood data from a bundle.
+
+    Numeric street columns, street coordinates, and the inverted index
+    are read-only views of memory-mapped files. Street names are read
+    as a categorical column, so only the unique names become Python
+    strings. Neighborhoods of each street segment are read with
+    nbhd_rows from the inverted index instead of a nbhd column. The
+    cube is read separately with read_bundle_aggregates.
+
+    Parameters
+    ----------
+    bundle_path : str
+        Path to bundle directory.
+
+    Returns
+    -------
+    street_data : DataFrame
+        Cleaned street data without lon, lat, and nbhd columns, with
+        numeric columns first followed by the name column.
+    coords : dict
+        Street coordinate arrays as from pack_coords.
+    nbhd_data : list
+        Number of neighborhoods, neighborhood geojson, region ids, and
+        neighborhood names as from prep_map_data.
+    nbhd_index : dict
+        Inverted index as from build_nbhd_index.
+
+    Raises
+    ------
+    FileNotFoundError : No such file or directory
+        If bundle at bundle_path does not exist.
+    ValueError
+        If bundle was written with a different format version.
+    """
+    bundle_path = Path(bundle_path)
+    with open(bundle_path / META_FILE) as json_file:
+        meta = json.load(json_file)
+    if meta['version'] != BUNDLE_VERSION:
+        raise ValueError('bundle version %s is not %s' %
+                         (meta['version'], BUNDLE_VERSION))
+
+    # Street data
+    numeric = np.load(bundle_path / NUMERIC_FILE, mmap_mode='r')
+    street_data = pd.DataFrame(numeric.T, columns=meta['numeric_columns'],
+                               copy=False)
+    street_data['name'] = pd.Categorical.from_codes(
+        np.load(bundle_path / NAME_CODES_FILE, mmap_mode='r'),
+        np.load(bundle_path / NAME_CATEGORIES_FILE))
+
+    # Street coordinates
+    coords = {name: np.load(bundle_path / file_name, mmap_mode='r')
+              for name, file_name in COORDS_FILES.items()}
+
+    # Inverted index from neighborhood to street segment rows
+    nbhd_index = {name: np.load(bundle_path / file_name, mmap_mode='r')
+                  for name, file_name in NBHD_INDEX_FILES.items()}
+
+    # Neighborhood data
+    with open(bundle_path / NBHD_FILE) as json_file:
+        nbhd_json = json.load(json_file)
+    nbhd_data = [len(nbhd_json['names']), nbhd_json['geojson'],
+                 nbhd_json['region_ids'], nbhd_json['names']]
+
+    return street_data, coords, nbhd_data, nbhd_index
+
+
+def read_bundle_aggregates(bundle_path):
+    """Read neighborhood by year cube from a bundle.
+
+    Parameters
+    ----------
+    bundle_path : str
+        Path to bundle directory from write_bundle.
+
+    Returns
+    -------
+    aggregates : dict
+        Cube as from build_aggregates, as read-only views of
+        memory-mapped files.
+
+    Raises
+    ------
+    FileNotFoundError : No such file or directory
+        If bundle at bundle_path does not exist.
+    """
+    return {name: np.load(Path(bundle_path) / file_name, mmap_mode='r')
+            for name, file_name in AGGREGATES_FILES.items()}
+
+
+def read_bundle_lod(bundle_path, coords):
+    """Read levels of detail of street coordinates from a bundle.
+
+    Parameters
+    ----------
+    bundle_path : str
+        Path to bundle directory from write_bundle.
+    coords : dict
+        Street coordinate arrays from read_bundle, used as level 0.
+
+    Returns
+    -------
+    lod : list
+        Coordinate arrays of each level as from build_lod, simplified
+        levels as read-only views of memory-mapped files.
+    """
+    lod = [coords]
+    while (Path(bundle_path) / (LOD_FILE % (len(lod), 'offsets'))).exists():
+        lod.append({name: np.load(Path(bundle_path) /
+                                  (LOD_FILE % (len(lod), name)),
+                                  mmap_mode='r')
+                    for name in COORDS_FILES})
+    return lod
+
+
+def read_data_version(bundle_path):
+    """Read content hash of the data files in a bundle.
+
+    Parameters
+    ----------
+    bundle_path : str
+        Path to bundle directory.
+
+    Returns
+    -------
+    data_version : str
+        SHA-256 hex digest of the bundle data files, which changes
+        whenever the bundle is rewritten with different data.
+
+    Raises
+    ------
+    FileNotFoundError : No such file or directory
+        If bundle at bundle_path does not exist.
+    """
+    with open(Path(bundle_path) / META_FILE) as json_file:
+        meta = json.load(json_file)
+    if 'data_version' not in meta:
+        return hash_path(bundle_path)
+    return meta['data_version']
+
+
+def write_table(table_path, data_frame):
+    """Write cleaned dataset to Parquet file.
+
+    Overwrites file at table_path if already exists. List columns such
+    as nbhd are stored as Parquet lists.
+    """
+    data_frame.to_parquet(table_path, engine='pyarrow', index=False)
+
+
+def read_table(table_path, columns=None):
+    """Read cleaned dataset from Parquet file.
+
+    Parameters
+    ----------
+    table_path : str
+        Path to Parquet file.
+    columns : list
+        Names (str) of columns to read. If None, all columns are read.
+
+    Returns
+    -------
+    data_frame : DataFrame
+        Cleaned dataset. List columns are read as arrays.
+
+    Raises
+    ------
+    FileNotFoundError : No such file or directory
+        If file at table_path does not exist.
+    """
+    return pd.read_parquet(table_path, engine='pyarrow', columns=columns)
+
+
+def nbhd_data_to_frame(nbhd_data):
+    """Convert neighborhood data to DataFrame with one row per feature.
+
+    Parameters
+    ----------
+    nbhd_data : list
+        Number of neighborhoods, neighborhood geojson, region ids, and
+        neighborhood names from prep_map_data.
+
+    Returns
+    -------
+    data_frame : DataFrame
+        Columns region_id, name, and feature, the geojson feature of
+        each neighborhood as a json string.
+    """
+    return pd.DataFrame({
+        'region_id': nbhd_data[2],
+        'name': nbhd_data[3],
+        'feature': [json.dumps(feature)
+                    for feature in nbhd_data[1]['features']]
+    })
+
+
+def frame_to_nbhd_data(data_frame):
+    """Convert DataFrame from nbhd_data_to_frame to neighborhood data."""
+    nbhd_json = {'type': 'FeatureCollection',
+                 'features': [json.loads(feature)
+                              for feature in data_frame['feature']]}
+    return [len(data_frame), nbhd_json, data_frame['region_id'].to_list(),
+            data_frame['name'].to_list()]
+
+
+if __name__ == '__main__':
+    # Paths to cleaned datasets
+    NBHD_PATH = 'cleaned/nbhd_data.pkl'
+    STREET_PATH = 'cleaned/street_data.pkl'
+    COORDS_PATH = 'cleaned/street_coords.npz'
+    AGGREGATES_PATH = 'cleaned/aggregates.npz'
+    LOD_PATH = 'cleaned/street_lod.npz'
+    BUNDLE_PATH = 'cleaned/bundle'
+
+    # Write bundle
+    with open(NBHD_PATH, 'rb') as pickle_file:
+        NBHD_DATA = pickle.load(pickle_file)
+    STREET_DATA = pd.read_pickle(STREET_PATH)
+    if os.path.exists(COORDS_PATH):
+        COORDS = load_coords(COORDS_PATH)
+    else:
+        COORDS = pack_coords(STREET_DATA['lon'], STREET_DATA['lat'])
+    if os.path.exists(AGGREGATES_PATH):
+        AGGREGATES = load_aggregates(AGGREGATES_PATH)
+    else:
+        AGGREGATES = None
+    if os.path.exists(LOD_PATH):
+        LOD = load_lod(LOD_PATH, COORDS)
+    else:
+        LOD = None
+    write_bundle(BUNDLE_PATH, STREET_DATA, COORDS, NBHD_DATA,
+                 aggregates=AGGREGATES, lod=LOD)
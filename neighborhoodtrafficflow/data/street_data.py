@@ -1,15 +1,44 @@
 """Load Seattle street datasets and reformat for dashboard."""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import os
 from pathlib import Path
+import time
 
 import geopandas as gpd
 import pandas as pd
 import numpy as np
 from shapely.geometry import Point, Polygon, MultiPolygon
+from shapely.prepared import prep
+from shapely.vectorized import contains
+
+from neighborhoodtrafficflow.data.aggregates import \
+    build_aggregates, check_aggregates, save_aggregates
+from neighborhoodtrafficflow.data.geometry import \
+    pack_coords, save_coords, build_lod, save_lod
+from neighborhoodtrafficflow.data.neighborhood_index import \
+    build_nbhd_index, save_nbhd_index
+from neighborhoodtrafficflow.data.manifest import \
+    hash_path, read_manifest, write_manifest, get_stale, load_cached, \
+    save_cached
+from neighborhoodtrafficflow.data.storage import write_table
 
 # File paths
 CWD = Path(__file__).parent
 STREET_PATH = CWD/'raw/Seattle_Streets/Seattle_Streets.shp'
+NBHD_SHP_PATH = CWD/'raw/zillow-neighborhoods/zillow-neighborhoods.shp'
+CACHE_PATH = CWD/'cache'
+OUT_PATH = CWD/'cleaned/street_data2.pkl'
+COORDS_OUT_PATH = CWD/'cleaned/street_coords2.npz'
+NBHD_INDEX_OUT_PATH = CWD/'cleaned/nbhd_index2.npz'
+TABLE_OUT_PATH = CWD/'cleaned/street_data2.parquet'
+AGGREGATES_OUT_PATH = CWD/'cleaned/aggregates2.npz'
+LOD_OUT_PATH = CWD/'cleaned/street_lod2.npz'
+OUT_PATHS = [OUT_PATH, COORDS_OUT_PATH, NBHD_INDEX_OUT_PATH, TABLE_OUT_PATH,
+             AGGREGATES_OUT_PATH, LOD_OUT_PATH]
+
+# Cache format version, increment when cached datasets change format
+CACHE_VERSION = 1
 
 # Mapping from dataset to street column name
 STREET_NAMES = {
@@ -75,12 +104,39 @@ def get_polygons(shp_path):
     return idx2poly
 
 
-def get_neighborhood(lon, lat, idx2poly):
+def get_polygon_index(idx2poly):
+    """Get bounding-box index of neighborhood polygons.
+
+    Store the bounds of every neighborhood polygon in a single array
+    alongside prepared copies of the polygons, so that a street
+    segment only needs to be tested against the polygons whose
+    bounding boxes overlap its own.
+
+    Parameters
+    ----------
+    idx2poly : dict
+        Mapping from neighborhood index to polygon.
+
+    Returns
+    -------
+    poly_index : tuple
+        List of neighborhood indices (int), array of polygon bounds
+        (minLon, minLat, maxLon, maxLat) with one row per neighborhood,
+        and list of prepared polygons.
+    """
+    keys = list(idx2poly)
+    bounds = np.array([idx2poly[key].bounds for key in keys])
+    prepared = [prep(idx2poly[key]) for key in keys]
+    return keys, bounds, prepared
+
+
+def get_neighborhood(lon, lat, idx2poly, poly_index=None):
     """Get neighborhoods that street passes through.
 
     Get list of neighborhods that a street segment passes through,
     based on inclusion of the street's (lon, lat) coordinates in
-    neighborhood polygons.
+    neighborhood polygons. If poly_index is given, only polygons
+    whose bounding boxes overlap the street segment are tested.
 
     Parameters
     ----------
@@ -90,6 +146,8 @@ def get_neighborhood(lon, lat, idx2poly):
         List of street segment latitude coordinates (float).
     idx2poly : dict
         Mapping from neighborhood index to polygon.
+    poly_index : tuple
+        Bounding-box index from get_polygon_index (optional).
 
     Returns
     -------
@@ -97,6 +155,8 @@ def get_neighborhood(lon, lat, idx2poly):
         List of indices (int) of all neighborhoods that the street
         segment passes through.
     """
+    if poly_index is not None:
+        return get_neighborhood_indexed(lon, lat, poly_index)
     point_list = [Point(lon[i], lat[i]) for i in range(len(lat))]
     nbhd_list = []
     for key in idx2poly:
@@ -105,6 +165,93 @@ def get_neighborhood(lon, lat, idx2poly):
     return nbhd_list
 
 
+def get_neighborhood_indexed(lon, lat, poly_index):
+    """Get neighborhoods that street passes through using an index.
+
+    Same as get_neighborhood, but candidate polygons are found with a
+    vectorized bounding-box overlap test and only the vertices inside
+    a candidate's bounding box are tested with its prepared polygon.
+
+    Parameters
+    ----------
+    lon : list
+        List of street segment longitude coordinates (float).
+    lat : list
+        List of street segment latitude coordinates (float).
+    poly_index : tuple
+        Bounding-box index from get_polygon_index.
+
+    Returns
+    -------
+    nbhd : list
+        List of indices (int) of all neighborhoods that the street
+        segment passes through.
+    """
+    keys, bounds, prepared = poly_index
+    lon = np.asarray(lon, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    if len(lon) == 0:
+        return []
+
+    # Polygons whose bounding boxes overlap the segment
+    overlap = (bounds[:, 0] <= lon.max()) & (bounds[:, 2] >= lon.min()) & \
+        (bounds[:, 1] <= lat.max()) & (bounds[:, 3] >= lat.min())
+
+    nbhd_list = []
+    for i in np.flatnonzero(overlap):
+        inside = (lon >= bounds[i, 0]) & (lon <= bounds[i, 2]) & \
+            (lat >= bounds[i, 1]) & (lat <= bounds[i, 3])
+        for j in np.flatnonzero(inside):
+            if prepared[i].contains(Point(lon[j], lat[j])):
+                nbhd_list.append(keys[i])
+                break
+    return nbhd_list
+
+
+def get_neighborhoods(lon_list, lat_list, idx2poly):
+    """Get neighborhoods that all streets pass through.
+
+    Vectorized version of get_neighborhood for all street segments at
+    once. The (lon, lat) coordinates of every street are flattened into
+    two arrays and each neighborhood polygon is tested against all
+    coordinates inside its bounding box in a single vectorized call.
+
+    Parameters
+    ----------
+    lon_list : list
+        List of longitude lists (float).
+    lat_list : list
+        List of latitude lists (float).
+    idx2poly : dict
+        Mapping from neighborhood index to polygon.
+
+    Returns
+    -------
+    nbhd_list : list
+        List of lists of indices (int) of all neighborhoods that
+        streets pass through, in the same order as get_neighborhood.
+    """
+    nbhd_list = [[] for _ in lat_list]
+    if not nbhd_list:
+        return nbhd_list
+
+    # Flatten coordinates and label them by street segment
+    segment = np.repeat(np.arange(len(lat_list)),
+                        [len(lat) for lat in lat_list])
+    lon = np.concatenate(lon_list).astype(float)
+    lat = np.concatenate(lat_list).astype(float)
+
+    # Find segments with at least one coordinate in each polygon
+    for key in idx2poly:
+        min_lon, min_lat, max_lon, max_lat = idx2poly[key].bounds
+        candidates = np.flatnonzero((lon >= min_lon) & (lon <= max_lon) &
+                                    (lat >= min_lat) & (lat <= max_lat))
+        inside = contains(idx2poly[key], lon[candidates], lat[candidates])
+        for seg in np.unique(segment[candidates[inside]]):
+            nbhd_list[seg].append(key)
+    return nbhd_list
+
+
 def get_flow_path(year):
     """Format path to current traffic flow dataset."""
     name = '%d_Traffic_Flow_Counts' % year
@@ -112,7 +259,137 @@ def get_flow_path(year):
     return CWD/path
 
 
-def get_flow_data():
+def read_flow_data(year):
+    """Load traffic flow dataset with only the columns used.
+
+    Parameters
+    ----------
+    year : int
+        Year of traffic flow dataset in 2007-2018.
+
+    Returns
+    -------
+    df : DataFrame
+        COMPKEY and FLOWSEGID (if in dataset), geometry, flow, and
+        street name columns.
+    """
+    df = gpd.read_file(get_flow_path(year))
+    columns = [col for col in ['COMPKEY', 'FLOWSEGID'] if col in df]
+    return df[columns + ['geometry', FLOW_NAMES[year], STREET_NAMES[year]]]
+
+
+def read_street_data():
+    """Load Seattle Streets dataset with only the columns used."""
+    df = gpd.read_file(STREET_PATH)
+    return df[['COMPKEY', 'geometry', STREET_NAMES['street'], 'SPEEDLIMIT',
+               'ARTCLASS']]
+
+
+def get_coords(geometry):
+    """Get coordinates of street segments.
+
+    Parameters
+    ----------
+    geometry : GeoSeries
+        Street segment geometries.
+
+    Returns
+    -------
+    lon_list : list
+        List of longitude lists (float), or None for multi-part
+        geometries, which have no coordinate sequence.
+    lat_list : list
+        List of latitude lists (float), or None for multi-part
+        geometries.
+    """
+    lon_list = []
+    lat_list = []
+    for geo in geometry:
+        try:
+            coords = list(geo.coords)
+        except NotImplementedError:
+            coords = None
+        lon_list.append(None if coords is None else [x for x, y in coords])
+        lat_list.append(None if coords is None else [y for x, y in coords])
+    return lon_list, lat_list
+
+
+def read_dataset(name):
+    """Load dataset and extract street coordinates.
+
+    Parameters
+    ----------
+    name : str or int
+        Either 'street' or a year in 2007-2018.
+
+    Returns
+    -------
+    df : DataFrame
+        Dataset from read_street_data or read_flow_data with lon and
+        lat columns from get_coords.
+    """
+    if name == 'street':
+        df = read_street_data()
+    else:
+        df = read_flow_data(name)
+    lon_list, lat_list = get_coords(df['geometry'])
+    return df.assign(lon=lon_list, lat=lat_list)
+
+
+def assign_neighborhoods(df, idx2poly):
+    """Add neighborhoods of street segments to dataset.
+
+    Parameters
+    ----------
+    df : DataFrame
+        Dataset from read_dataset.
+    idx2poly : dict
+        Mapping from neighborhood index to polygon.
+
+    Returns
+    -------
+    df : DataFrame
+        Dataset with nbhd column from get_neighborhoods. Multi-part
+        geometries have no neighborhoods.
+    """
+    nbhd_list = get_neighborhoods(
+        [[] if lon is None else lon for lon in df['lon']],
+        [[] if lat is None else lat for lat in df['lat']], idx2poly)
+    return df.assign(nbhd=nbhd_list)
+
+
+def get_dataset_path(name):
+    """Get path to raw dataset directory ('street' or year)."""
+    if str(name) == 'street':
+        return STREET_PATH.parent
+    return get_flow_path(int(name)).parent
+
+
+def read_datasets(names, jobs=1):
+    """Load datasets, in a process pool if jobs > 1.
+
+    Reading, column projection, and coordinate extraction are
+    independent for each dataset, so they can run in parallel.
+
+    Parameters
+    ----------
+    names : list
+        Dataset names, either 'street' or a year in 2007-2018.
+    jobs : int
+        Number of worker processes.
+
+    Returns
+    -------
+    df_list : list
+        List of DataFrames from read_dataset, in the order of names.
+    """
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            return list(executor.map(read_dataset, names))
+    return [read_dataset(name) for name in names]
+
+
+def get_flow_data(jobs=1):
     """Load and format traffic flow datasets.
 
     Load Traffic Flow Count datasets for 2007-2018 and populate
@@ -122,6 +399,11 @@ def get_flow_data():
     - 2015-2016 has unique FLOWSEGID (float)
     - 2017-2018 has unique FLOWSEGID (int) and list of COMPKEYS (str)
 
+    Parameters
+    ----------
+    jobs : int
+        Number of worker processes used to load the datasets.
+
     Returns
     -------
     flow2key : dict
@@ -133,87 +415,127 @@ def get_flow_data():
         List of reformatted traffic flow DataFrames.
     year_list :
         Years corresponding to the DataFrames in df_list.
-
-    Note
-    ----
-    pylint has a lot of complaints about this function, since it is a
-    bit overkill in terms of conditionals and type casting, etc., but
-    I'm prioritizing other things for now.
     """
-    # Initialize structures
-    flow2key = {}
-    key2flow = {}
-    new_compkey = 1e6
-    df_list = []
-    year_list = []
-
-    # Iterate backwards through traffic flow datasets
-    for year in range(2018, 2006, -1):
-        df = gpd.read_file(get_flow_path(year))
-        for idx, row in df.iterrows():
-
-            if year in [2017, 2018]:
-
-                # All rows have a FLOWSEGID
-                # 14 rows missing a COMPKEY, same roads for both years
-                if row['COMPKEY'] is None:
-                    if row['FLOWSEGID'] not in flow2key:
-                        df.at[idx, 'COMPKEY'] = str(new_compkey)
-                        flow2key[row['FLOWSEGID']] = str(new_compkey)
-                        key2flow[str(new_compkey)] = row['FLOWSEGID']
-                        new_compkey += 1
-                    else:
-                        df.at[idx, 'COMPKEY'] = flow2key[row['FLOWSEGID']]
-                # COMPKEYs can be lists
-                else:
-                    keys = row['COMPKEY'].split(',')
-                    for key in keys:
-                        if key not in key2flow:
-                            key2flow[key] = row['FLOWSEGID']
-                    if row['FLOWSEGID'] not in flow2key:
-                        flow2key[row['FLOWSEGID']] = row['COMPKEY']
-                    # 2017 has an additional COMPKEY for this FLOWSEGID
-                    if row['FLOWSEGID'] == 604:
-                        flow2key[row['FLOWSEGID']] = row['COMPKEY']
-
-            if year in [2015, 2016]:
-
-                # One row missing a FLOWSEGID, same for both years
-                if np.isnan(row['FLOWSEGID']):
-                    df.at[idx, 'FLOWSEGID'] = 1e6
-                    row['FLOWSEGID'] = 1e6
-
-                # No rows have a COMPKEY
-                if int(row['FLOWSEGID']) not in flow2key:
-                    df.at[idx, 'COMPKEY'] = str(new_compkey)
-                    flow2key[int(row['FLOWSEGID'])] = str(new_compkey)
-                    key2flow[str(new_compkey)] = int(row['FLOWSEGID'])
-                    new_compkey += 1
-                else:
-                    df.at[idx, 'COMPKEY'] = flow2key[int(row['FLOWSEGID'])]
+    year_list = list(range(2018, 2006, -1))
+    df_list = read_datasets(year_list, jobs)
+    return reconcile_flow_keys(df_list, year_list)
 
-            if year < 2015:
 
-                # All rows have a unique COMPKEY
-                if str(row['COMPKEY']) not in key2flow:
-                    df.at[idx, 'FLOWSEGID'] = -1
-                # No rows have a FLOWSEGID
-                else:
-                    df.at[idx, 'FLOWSEGID'] = key2flow[str(row['COMPKEY'])]
+def reconcile_flow_keys(df_list, year_list):
+    """Reconcile FLOWSEGIDs and COMPKEYs across traffic flow datasets.
 
-        # Reformate DataFrame and store in list
-        df = df[['COMPKEY', 'FLOWSEGID', 'geometry',
-                 FLOW_NAMES[year], STREET_NAMES[year]]]
-        df = df.astype({'COMPKEY': 'str', 'FLOWSEGID': 'int64',
-                        FLOW_NAMES[year]: 'float'})
-        df_list.append(df)
-        year_list.append(year)
+    Columnar key reconciliation for the datasets loaded by
+    read_flow_data, processed from 2018 back to 2007:
+    - 2017-2018: the first row with a FLOWSEGID sets its COMPKEY, or a
+      new synthetic COMPKEY (1e6, 1e6 + 1, ...) if missing. FLOWSEGID
+      604 takes the COMPKEY of its last row, since 2017 has an
+      additional COMPKEY. Rows missing a COMPKEY take their FLOWSEGID's.
+    - 2015-2016: the missing FLOWSEGID is set to 1e6, and FLOWSEGIDs not
+      seen in 2017-2018 get new synthetic COMPKEYs.
+    - 2007-2014: FLOWSEGID is looked up from COMPKEY, or -1 if missing.
+
+    Parameters
+    ----------
+    df_list : list
+        List of traffic flow DataFrames from read_flow_data or
+        read_dataset.
+    year_list : list
+        Years corresponding to the DataFrames in df_list, in order
+        2018 to 2007.
+
+    Returns
+    -------
+    flow2key : dict
+        Mapping from FLOWSEGID (int) to COMPKEY (str).
+        COMPKEY string may contain a list of COMPKEYS.
+    key2flow : dict
+        Mapping from COMPKEY (str) to FLOWSEGID (int).
+    df_list :
+        List of reformatted traffic flow DataFrames.
+    year_list :
+        Years corresponding to the DataFrames in df_list.
+    """
+    df_list = [df.copy() for df in df_list]
+    new_compkey = 1e6
 
-    return flow2key, key2flow, df_list, year_list
+    # 2017-2018: FLOWSEGIDs with lists of COMPKEYs
+    recent = [i for i, year in enumerate(year_list) if year in [2017, 2018]]
+    rows = pd.concat([df_list[i][['FLOWSEGID', 'COMPKEY']] for i in recent]
+                     or [pd.DataFrame(columns=['FLOWSEGID', 'COMPKEY'])],
+                     ignore_index=True)
+    missing = rows['COMPKEY'].isna()
+    first = ~rows['FLOWSEGID'].duplicated()
+
+    # Allocate synthetic COMPKEYs for FLOWSEGIDs first seen without one
+    new = first & missing
+    synthetic = [str(new_compkey + i) for i in range(new.sum())]
+    new_compkey += len(synthetic)
+
+    # COMPKEY assigned to each FLOWSEGID as of each row
+    assigned = rows['COMPKEY'].where(first | (rows['FLOWSEGID'] == 604))
+    assigned[new] = synthetic
+    assigned = assigned.groupby(rows['FLOWSEGID']).ffill()
+    flow2key = dict(zip(*_last_by_flow(rows['FLOWSEGID'], assigned)))
+
+    # Each COMPKEY in a list maps to the first FLOWSEGID that has it
+    keys = pd.DataFrame({
+        'FLOWSEGID': rows.loc[~missing, 'FLOWSEGID'],
+        'COMPKEY': rows.loc[~missing, 'COMPKEY'].str.split(',')
+    }).explode('COMPKEY').drop_duplicates(subset='COMPKEY')
+    key2flow = dict(zip(keys['COMPKEY'].tolist(),
+                        keys['FLOWSEGID'].tolist()))
+    key2flow.update(zip(synthetic, rows.loc[new, 'FLOWSEGID'].tolist()))
+
+    # Fill missing COMPKEYs
+    start = 0
+    for i in recent:
+        stop = start + len(df_list[i])
+        df_list[i]['COMPKEY'] = rows['COMPKEY'].where(
+            ~missing, assigned)[start:stop].to_numpy()
+        start = stop
+
+    # 2015-2016: FLOWSEGIDs without COMPKEYs
+    middle = [i for i, year in enumerate(year_list) if year in [2015, 2016]]
+    for i in middle:
+        df_list[i]['FLOWSEGID'] = df_list[i]['FLOWSEGID'].fillna(1e6)
+    flows = pd.concat([df_list[i]['FLOWSEGID'] for i in middle]
+                      or [pd.Series(dtype='float64')],
+                      ignore_index=True).astype('int64')
+    new = ~flows.isin(list(flow2key)) & ~flows.duplicated()
+    synthetic = [str(new_compkey + i) for i in range(new.sum())]
+    flow2key.update(zip(flows[new].tolist(), synthetic))
+    key2flow.update(zip(synthetic, flows[new].tolist()))
+    for i in middle:
+        df_list[i]['COMPKEY'] = \
+            df_list[i]['FLOWSEGID'].astype('int64').map(flow2key)
+
+    # 2007-2014: COMPKEYs without FLOWSEGIDs
+    for i, year in enumerate(year_list):
+        if year < 2015:
+            df_list[i]['FLOWSEGID'] = df_list[i]['COMPKEY'].astype(str) \
+                .map(key2flow).fillna(-1)
+
+    # Reformat DataFrames, keeping coordinates and neighborhoods if
+    # already added by read_dataset and assign_neighborhoods
+    for i, year in enumerate(year_list):
+        coords = [col for col in ['lon', 'lat', 'nbhd'] if col in df_list[i]]
+        df = df_list[i][['COMPKEY', 'FLOWSEGID', 'geometry',
+                         FLOW_NAMES[year], STREET_NAMES[year]] + coords]
+        df_list[i] = df.astype({'COMPKEY': 'str', 'FLOWSEGID': 'int64',
+                                FLOW_NAMES[year]: 'float'})
+
+    return flow2key, key2flow, df_list, list(year_list)
+
+
+def _last_by_flow(flows, values):
+    """Get last value for each FLOWSEGID in order of first appearance."""
+    last = values.groupby(flows, sort=False).last()
+    return [int(flow) for flow in last.index], last.tolist()
 
 
 def get_street_data(df, df_name, idx2poly, key_list, name_list,
-                    lon_list, lat_list, speed_list, road_list, nbhd_list):
+                    lon_list, lat_list, speed_list, road_list, nbhd_list,
+                    poly_index=None, key_index=None):
     """Load and format street data.
 
     Load Seattle Streets and Traffic Flow Count datasets for 2007-2018
@@ -226,7 +548,10 @@ def get_street_data(df, df_name, idx2poly, key_list, name_list,
     df_name : str
         Either 'streets' or a year in 2007-2018.
     idx2poly : dict
-        Mapping from neighborhood index to polygon.
+        Mapping from neighborhood index to polygon. If None,
+        neighborhoods are taken from the nbhd column added by
+        assign_neighborhoods, or if there is none, nbhd_list is left
+        unchanged so they can be assigned in bulk with get_neighborhoods.
     key_list : list
         List of COMPKEYs (str).
     name_list : list
@@ -242,11 +567,17 @@ def get_street_data(df, df_name, idx2poly, key_list, name_list,
     nbhd_list : list
         List of lists of indices (int) of all neighborhoods that
         streets pass through.
+    poly_index : tuple
+        Bounding-box index from get_polygon_index (optional).
+    key_index : dict
+        Mapping from COMPKEY (int) to row in key_list, shared across
+        calls to skip duplicate COMPKEYs in constant time. If None,
+        it is built from key_list.
 
     Returns
     -------
     out : None
-        Modifies the input lists in place.
+        Modifies the input lists (and key_index) in place.
 
     Note
     ----
@@ -254,6 +585,10 @@ def get_street_data(df, df_name, idx2poly, key_list, name_list,
     """
     print('\nDataset: %s' % df_name)
 
+    # Index of COMPKEYs already added
+    if key_index is None:
+        key_index = {key: row for row, key in enumerate(key_list)}
+
     # Populate lists for street data
     count = 0
     for idx, row in df.iterrows():
@@ -262,24 +597,34 @@ def get_street_data(df, df_name, idx2poly, key_list, name_list,
 
         row['COMPKEY'] = str(row['COMPKEY'])
         for key in row['COMPKEY'].split(','):
-            if int(float(key)) not in key_list:
+            if int(float(key)) not in key_index:
 
-                # Get geometry
+                # Get geometry, unless already extracted by read_dataset
                 add = True
-                try:
-                    geo = row['geometry']
-                    lon = [x for x, y in geo.coords]
-                    lat = [y for x, y in geo.coords]
-                except NotImplementedError:
-                    add = False
+                if 'lon' in row:
+                    lon = row['lon']
+                    lat = row['lat']
+                    add = lon is not None
+                else:
+                    try:
+                        geo = row['geometry']
+                        lon = [x for x, y in geo.coords]
+                        lat = [y for x, y in geo.coords]
+                    except NotImplementedError:
+                        add = False
 
                 if add:
                     # Add info in all datasets
+                    key_index[int(float(key))] = len(key_list)
                     key_list.append(int(float(key)))
                     name_list.append(row[STREET_NAMES[df_name]])
                     lon_list.append(lon)
                     lat_list.append(lat)
-                    nbhd_list.append(get_neighborhood(lon, lat, idx2poly))
+                    if idx2poly is not None:
+                        nbhd_list.append(get_neighborhood(
+                            lon, lat, idx2poly, poly_index))
+                    elif 'nbhd' in row:
+                        nbhd_list.append(row['nbhd'])
 
                     # Add info only in streets dataset
                     try:
@@ -299,7 +644,88 @@ def get_street_data(df, df_name, idx2poly, key_list, name_list,
     print('Added %d road segments' % count)
 
 
-def add_flow_data(df_streets, df_flow, year, flow2key):
+def get_crosswalk(flow2key):
+    """Get crosswalk table between FLOWSEGIDs and COMPKEYs.
+
+    Explode flow2key into one row per (FLOWSEGID, COMPKEY) pair, keeping
+    the order of COMPKEYs within each FLOWSEGID.
+
+    Parameters
+    ----------
+    flow2key : dict
+        Mapping from FLOWSEGID (int) to COMPKEY (str).
+        COMPKEY string may contain a list of COMPKEYS.
+
+    Returns
+    -------
+    crosswalk : DataFrame
+        Columns FLOWSEGID (int), COMPKEY (int), and position (int) of
+        the COMPKEY in the FLOWSEGID's list.
+    """
+    crosswalk = pd.DataFrame({
+        'FLOWSEGID': list(flow2key),
+        'COMPKEY': [keys.split(',') for keys in flow2key.values()]
+    }).explode('COMPKEY')
+    crosswalk['position'] = crosswalk.groupby(level=0).cumcount()
+    crosswalk = crosswalk.reset_index(drop=True)
+    return crosswalk.astype({'FLOWSEGID': 'int64', 'position': 'int64',
+                             'COMPKEY': 'float'}).astype({'COMPKEY': 'int64'})
+
+
+def get_flow_values(df_flow, year, crosswalk):
+    """Get traffic flow count for each COMPKEY in one year.
+
+    Rows without a FLOWSEGID are assigned by their own COMPKEY, and all
+    other rows are joined with the crosswalk to find every COMPKEY that
+    shares their FLOWSEGID. If a COMPKEY is assigned more than once,
+    the last assignment in row order is kept, and missing flows are -1.
+
+    Parameters
+    ----------
+    df_flow : DataFrame
+        Reformatted traffic flow count DataFrame.
+    year : int
+        Year corresponding to current traffic flow DataFrame.
+    crosswalk : DataFrame
+        Crosswalk table from get_crosswalk.
+
+    Returns
+    -------
+    flows : Series
+        Traffic flow counts (int) indexed by COMPKEY (int).
+
+    Raises
+    ------
+    KeyError
+        If a FLOWSEGID is missing from the crosswalk.
+    """
+    rows = pd.DataFrame({
+        'order': np.arange(len(df_flow)),
+        'FLOWSEGID': df_flow['FLOWSEGID'].to_numpy(),
+        'COMPKEY': df_flow['COMPKEY'].to_numpy(),
+        'flow': df_flow[FLOW_NAMES[year]].fillna(-1).astype('int64')
+                .to_numpy()
+    })
+
+    # Rows without a FLOWSEGID use their own COMPKEY
+    by_key = rows[rows['FLOWSEGID'] == -1].assign(position=0)
+    by_key['COMPKEY'] = by_key['COMPKEY'].astype(float).astype('int64')
+
+    # Rows with a FLOWSEGID use all COMPKEYs in the crosswalk
+    by_flow = rows[rows['FLOWSEGID'] != -1].drop(columns='COMPKEY')
+    missing = ~by_flow['FLOWSEGID'].isin(crosswalk['FLOWSEGID'])
+    if missing.any():
+        raise KeyError(by_flow.loc[missing, 'FLOWSEGID'].iloc[0])
+    by_flow = by_flow.merge(crosswalk, on='FLOWSEGID')
+
+    # Keep the last flow assigned to each COMPKEY
+    flows = pd.concat([by_key, by_flow], sort=False)
+    flows = flows.sort_values(by=['order', 'position'], kind='mergesort')
+    flows = flows.drop_duplicates(subset='COMPKEY', keep='last')
+    return flows.set_index('COMPKEY')['flow']
+
+
+def add_flow_data(df_streets, df_flow, year, flow2key, crosswalk=None):
     """Add traffic flow count data to DataFrame.
 
     Add traffic flow count from df_flow to df_streets and set any
@@ -319,90 +745,214 @@ def add_flow_data(df_streets, df_flow, year, flow2key):
     year : int
         Year corresponding to current traffic flow DataFrame.
     flow2key : dict
+        Mapping from FLOWSEGID (int) to COMPKEY (str).
+    crosswalk : DataFrame
+        Crosswalk table from get_crosswalk (optional). Built from
+        flow2key if None.
 
+    Returns
+    -------
+    out : None
+        Modifies the input DataFrame in place.
+    """
+    if crosswalk is None:
+        crosswalk = get_crosswalk(flow2key)
+    flows = get_flow_values(df_flow, year, crosswalk)
+    df_streets[str(year)] = \
+        df_streets['key'].map(flows).fillna(-1).astype('int64')
+
+
+def add_all_flow_data(df_streets, df_list, year_list, flow2key):
+    """Add traffic flow count data for all years to DataFrame.
+
+    Same as calling add_flow_data for every year, but the crosswalk is
+    built once and all year columns are written in a single aligned
+    assignment, ordered by year.
+
+    Parameters
+    ----------
+    df_streets : DataFrame
+        Contains street information from all datasets
+    df_list : list
+        List of reformatted traffic flow DataFrames.
+    year_list : list
+        Years corresponding to the DataFrames in df_list.
+    flow2key : dict
+        Mapping from FLOWSEGID (int) to COMPKEY (str).
 
     Returns
     -------
     out : None
         Modifies the input DataFrame in place.
     """
-    print('\nDataset: %d' % year)
+    crosswalk = get_crosswalk(flow2key)
+    columns = {}
+    for year, df_flow in sorted(zip(year_list, df_list), key=lambda x: x[0]):
+        flows = get_flow_values(df_flow, year, crosswalk)
+        columns[str(year)] = \
+            df_streets['key'].map(flows).fillna(-1).astype('int64')
+        print('Added %d flow values for %d' % (len(flows), year))
+    df_flows = pd.DataFrame(columns, index=df_streets.index)
+    df_streets[list(columns)] = df_flows
 
-    count = 0
-    df_streets[str(year)] = -1
-    for idx, row in df_flow.iterrows():
 
-        print('Percent done: %.2f' % (100.0*idx/len(df_flow)), end='\r')
+def load_datasets(names, jobs=1, force=False):
+    """Load datasets, reusing cached results of unchanged datasets.
 
-        try:
-            flow = int(row[FLOW_NAMES[year]])
-        except ValueError:
-            flow = -1
+    Hash each raw dataset and the neighborhood polygons, and compare
+    with the manifest from the last build. Datasets whose hashes
+    changed (or all datasets, if the polygons or CACHE_VERSION changed)
+    are loaded with read_datasets, assigned neighborhoods, and cached.
 
-        if row['FLOWSEGID'] == -1:
-            df_streets.loc[df_streets['key'] == int(float(row['COMPKEY'])), \
-                str(year)] = flow
-            count += 1
-        else:
-            keys = flow2key[row['FLOWSEGID']]
-            for key in keys.split(','):
-                df_streets.loc[df_streets['key'] == int(float(key)), \
-                    str(year)] = flow
-                count += 1
+    Parameters
+    ----------
+    names : list
+        Dataset names, either 'street' or a year in 2007-2018.
+    jobs : int
+        Number of worker processes used to load changed datasets.
+    force : bool
+        Reprocess all datasets, ignoring cached results.
 
-    print('Added %d flow values' % count)
+    Returns
+    -------
+    df_list : list
+        List of DataFrames from assign_neighborhoods, in the order of
+        names.
+    manifest : dict
+        Mapping from dataset name (str) to content hash, including the
+        neighborhood polygons under 'zillow' and CACHE_VERSION under
+        'version'.
+    changed : bool
+        Whether any hash differs from the last build.
+    """
+    old = read_manifest(CACHE_PATH/'manifest.json')
+    manifest = {str(name): hash_path(get_dataset_path(name))
+                for name in names}
+    manifest['zillow'] = hash_path(NBHD_SHP_PATH.parent)
+    manifest['version'] = CACHE_VERSION
+    stale = get_stale(old, manifest, [str(name) for name in names],
+                      CACHE_PATH, shared=['zillow', 'version'])
+    if force:
+        stale = [str(name) for name in names]
+
+    # Reprocess stale datasets
+    stale_names = [name for name in names if str(name) in stale]
+    if stale_names:
+        print('\nReprocessing: %s' % ', '.join(stale))
+        idx2poly = get_polygons(NBHD_SHP_PATH)
+        for name, df in zip(stale_names, read_datasets(stale_names, jobs)):
+            save_cached(CACHE_PATH, str(name),
+                        assign_neighborhoods(df, idx2poly))
+
+    df_list = [load_cached(CACHE_PATH, str(name)) for name in names]
+    return df_list, manifest, manifest != old
+
+
+def main(jobs=1, force=False):
+    """Build cleaned street data from raw datasets.
 
+    Parameters
+    ----------
+    jobs : int
+        Number of worker processes used to load datasets.
+    force : bool
+        Rebuild even if no raw dataset changed and every file in
+        OUT_PATHS exists.
 
-if __name__ == '__main__':
-    # Create directory for cleaned data if none exists
-    if not os.path.exists('cleaned'):
-        os.mkdir('cleaned')
+    Returns
+    -------
+    out : None
+        Writes cleaned street data to OUT_PATH and TABLE_OUT_PATH,
+        street coordinates from pack_coords to COORDS_OUT_PATH, their
+        simplified levels of detail from build_lod to LOD_OUT_PATH,
+        the inverted index from build_nbhd_index to
+        NBHD_INDEX_OUT_PATH, in the same row order, and the neighborhood
+        by year cube from build_aggregates, checked against the street
+        segments, to AGGREGATES_OUT_PATH.
+    """
+    start = time.time()
 
-    # Get neighborhood polygons
-    SHP_PATH = 'raw/zillow-neighborhoods/zillow-neighborhoods.shp'
-    IDX2POLY = get_polygons(SHP_PATH)
+    # Create directory for cleaned data if none exists
+    if not os.path.exists(OUT_PATH.parent):
+        os.mkdir(OUT_PATH.parent)
+
+    # Load all datasets, skipping the rest if nothing changed and no
+    # output is missing
+    year_list = list(range(2018, 2006, -1))
+    df_list, manifest, changed = load_datasets(['street'] + year_list,
+                                               jobs, force)
+    if not changed and not force and \
+            all(os.path.exists(path) for path in OUT_PATHS):
+        print('\nStreet data is up to date (%.1f s)' % (time.time() - start))
+        return
 
     # Get mapping from FLOWSEGID to COMPKEY
-    FLOW2KEY, _, DF_LIST, YEAR_LIST = get_flow_data()
+    df_street, *df_list = df_list
+    flow2key, _, df_list, year_list = reconcile_flow_keys(df_list, year_list)
 
     # Initialize lists for street data
-    KEY_LIST = []
-    NAME_LIST = []
-    LON_LIST = []
-    LAT_LIST = []
-    SPEED_LIST = []
-    ROAD_LIST = []
-    NBHD_LIST = []
+    key_index = {}
+    key_list = []
+    name_list = []
+    lon_list = []
+    lat_list = []
+    speed_list = []
+    road_list = []
+    nbhd_list = []
 
     # Get street data from Seattle Streets dataset
     print('\nAdding street data...')
-    df = gpd.read_file(STREET_PATH)
-    get_street_data(df, 'street', IDX2POLY, KEY_LIST, NAME_LIST,
-                    LON_LIST, LAT_LIST, SPEED_LIST, ROAD_LIST, NBHD_LIST)
+    get_street_data(df_street, 'street', None, key_list, name_list,
+                    lon_list, lat_list, speed_list, road_list, nbhd_list,
+                    key_index=key_index)
 
     # Get street data from Traffic Flow Counts datasets
-    for i in range(len(DF_LIST)-1, -1, -1):
-        get_street_data(DF_LIST[i], YEAR_LIST[i], IDX2POLY, KEY_LIST,
-                        NAME_LIST, LON_LIST, LAT_LIST, SPEED_LIST, ROAD_LIST,
-                        NBHD_LIST)
+    for i in range(len(df_list)-1, -1, -1):
+        get_street_data(df_list[i], year_list[i], None, key_list,
+                        name_list, lon_list, lat_list, speed_list, road_list,
+                        nbhd_list, key_index=key_index)
 
-    # Create initial DataFrame
-    DF_STREETS = pd.DataFrame(
+    # Create initial DataFrame, with coordinates stored separately
+    df_streets = pd.DataFrame(
         data={
-            'key': KEY_LIST,
-            'name': NAME_LIST,
-            'lon': LON_LIST,
-            'lat': LAT_LIST,
-            'speed': SPEED_LIST,
-            'road': ROAD_LIST,
-            'nbhd': NBHD_LIST
+            'key': key_list,
+            'name': name_list,
+            'speed': speed_list,
+            'road': road_list,
+            'nbhd': nbhd_list
         }
     )
 
     # Add traffic flow data
     print('\nAdding flow data...')
-    for i in range(len(DF_LIST)-1, -1, -1):
-        add_flow_data(DF_STREETS, DF_LIST[i], YEAR_LIST[i], FLOW2KEY)
+    add_all_flow_data(df_streets, df_list, year_list, flow2key)
+
+    # Save DataFrame, coordinates, and manifest of raw datasets used
+    df_streets.to_pickle(OUT_PATH)
+    write_table(TABLE_OUT_PATH, df_streets)
+    coords = pack_coords(lon_list, lat_list)
+    save_coords(COORDS_OUT_PATH, coords)
+    nbhd_index = build_nbhd_index(nbhd_list)
+    save_nbhd_index(NBHD_INDEX_OUT_PATH, nbhd_index)
+
+    # Aggregate statistics of each neighborhood and year
+    print('\nAggregating street data...')
+    aggregates = build_aggregates(df_streets, nbhd_index)
+    check_aggregates(aggregates, df_streets)
+    save_aggregates(AGGREGATES_OUT_PATH, aggregates)
 
-    # Save DataFrame
-    DF_STREETS.to_pickle('cleaned/street_data2.pkl')
+    # Simplify street geometry into levels of detail
+    print('\nSimplifying street geometry...')
+    save_lod(LOD_OUT_PATH, build_lod(coords))
+    write_manifest(CACHE_PATH/'manifest.json', manifest)
+    print('\nFinished in %.1f s' % (time.time() - start))
+
+
+if __name__ == '__main__':
+    PARSER = argparse.ArgumentParser(description=__doc__)
+    PARSER.add_argument('--jobs', type=int, default=1,
+                        help='number of processes used to load datasets')
+    PARSER.add_argument('--force', action='store_true',
+                        help='reprocess all datasets, ignoring the cache')
+    ARGS = PARSER.parse_args()
+    main(ARGS.jobs, ARGS.force)
@@ -0,0 +1,167 @@
+"""Cache generated figures by dashboard state."""
+from collections import OrderedDict
+import threading
+
+import numpy as np
+
+# Default cache size in bytes of serialized figures
+MAX_BYTES = 256 * 2**20
+
+# Number of items sampled to estimate size of long lists
+SAMPLE_SIZE = 32
+
+
+def figure_size(figure):
+    """Estimate size in bytes of figure serialized to JSON.
+
+    Strings count their length and other scalars 8 bytes. Long lists
+    are estimated from a sample of their items, so sizing a figure
+    takes far less time than serializing it.
+
+    Parameters
+    ----------
+    figure : dict
+        Plotly figure, or any part of one.
+
+    Returns
+    -------
+    size : int
+        Estimated size in bytes.
+    """
+    if isinstance(figure, str):
+        return len(figure)
+    if isinstance(figure, dict):
+        return sum(len(str(key)) + figure_size(val)
+                   for key, val in figure.items())
+    if isinstance(figure, np.ndarray):
+        if figure.dtype.kind not in 'OU':
+            return figure.nbytes
+        figure = figure.tolist()
+    if isinstance(figure, (list, tuple)):
+        sample = figure
+        if len(figure) > SAMPLE_SIZE:
+            sample = figure[::len(figure) // SAMPLE_SIZE][:SAMPLE_SIZE]
+        # Size scalars inline, since lists such as coordinates of
+        # geojson polygons hold many short lists of numbers
+        size = 0
+        for item in sample:
+            if isinstance(item, str):
+                size += len(item)
+            elif isinstance(item, (dict, list, tuple, np.ndarray)):
+                size += figure_size(item)
+            else:
+                size += 8
+        return len(figure) * size // max(len(sample), 1)
+    return 8
+
+
+def figure_key(callback, neighborhood, map_type=None, year=None):
+    """Create cache key for a figure.
+
+    Parameters
+    ----------
+    callback : str
+        Name of callback or figure function.
+    neighborhood : int
+        Index of selected neighborhood.
+    map_type : str
+        Selected map type, or None for charts.
+    year : int
+        Selected year. Ignored unless map_type is 'flow', since the
+        other maps do not depend on it.
+
+    Returns
+    -------
+    key : tuple
+        (callback, neighborhood, map_type, year)
+    """
+    if map_type != 'flow':
+        year = None
+    return (callback, int(neighborhood), map_type,
+            None if year is None else int(year))
+
+
+class FigureCache:
+    """Bounded, thread-safe LRU cache of figure dicts.
+
+    Figures are evicted least recently used first once their total
+    estimated size from figure_size exceeds max_bytes. Cached figures
+    are shared between callers and must not be modified. The data that
+    figures are generated from is loaded once per server process, so a
+    new data version takes effect, with an empty cache, only after the
+    server is restarted.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Maximum total size in bytes of cached figures.
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._figures)
+
+    def get(self, key):
+        """Get cached figure, or None if not cached."""
+        with self._lock:
+            if key not in self._figures:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._figures.move_to_end(key)
+            return self._figures[key][0]
+
+    def put(self, key, figure, size=None):
+        """Cache figure, evicting least recently used figures.
+
+        Figures larger than max_bytes are not cached.
+        """
+        if size is None:
+            size = figure_size(figure)
+        with self._lock:
+            if key in self._figures:
+                self.size -= self._figures.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._figures[key] = (figure, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, old_size) = self._figures.popitem(last=False)
+                self.size -= old_size
+                self.evictions += 1
+
+    def get_or_build(self, key, build):
+        """Get cached figure, or build and cache it on a miss.
+
+        Parameters
+        ----------
+        key : tuple
+            Cache key from figure_key.
+        build : function
+            Function without arguments that returns the figure.
+
+        Returns
+        -------
+        figure : dict
+            Cached or newly built figure.
+        """
+        figure = self.get(key)
+        if figure is None:
+            figure = build()
+            self.put(key, figure)
+        return figure
+
+    def stats(self):
+        """Get hit, miss, and eviction counts and size of cache."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'entries': len(self),
+                    'size': self.size, 'max_bytes': self.max_bytes}
@@ -1,9 +1,14 @@
 """Functions to generate Plotly charts for the dashboard."""
+import math
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 
+from neighborhoodtrafficflow.data.aggregates import \
+    YEARS, box_stats, cube_row, flow_outliers
+from neighborhoodtrafficflow.data.neighborhood_index import select_nbhd
+
 # Arterial classification for traffic flow map hover text
 ROAD_TYPE = {
     0: 'Not Designated',
@@ -19,8 +24,246 @@ CWD = Path(__file__).parent
 INFO_PATH = CWD / '../data/cleaned/nbhd_info.csv'
 NBHD_INFO = pd.read_csv(INFO_PATH)
 
+# Bar widths of binned speed limits, posted in steps of 5 mph, and of
+# binned arterial classifications
+SPEED_WIDTH = 5
+ROAD_WIDTH = 1
+
+
+def box_summary(quantiles, fences, outliers):
+    """Create a small sample with a box plot of the given statistics.
+
+    Plotly computes box plots in the browser from samples, with
+    quartiles interpolated as by hazen_percentiles, fences at the most
+    extreme values within 1.5 interquartile ranges of the quartiles,
+    and values beyond the fences drawn as outliers. The summary holds
+    the outliers, the fences, and each quartile repeated just enough to
+    keep its position in the sorted sample, so its size grows with the
+    number of outliers, not of values.
+
+    Parameters
+    ----------
+    quantiles : ndarray
+        Percentiles in QUANTILES from box_stats.
+    fences : ndarray
+        Lower and upper fence from box_stats.
+    outliers : ndarray
+        Values beyond the fences from box_stats, sorted.
+
+    Returns
+    -------
+    sample : ndarray
+        Summary sample.
+    """
+    _, q1, median, q3, _ = quantiles
+    lows = outliers[outliers < fences[0]]
+    highs = outliers[outliers > fences[1]]
+
+    # Find smallest core between outliers with the lower fence first,
+    # upper fence last, and quartile positions on their own runs,
+    # starting from the size the first and last conditions require
+    size = max(5, 3 * len(lows) - len(highs) + 6,
+               3 * len(highs) - len(lows) + 6)
+    while True:
+        num = len(lows) + size + len(highs)
+        first = [math.floor(quantile * num - 0.5) - len(lows)
+                 for quantile in [0.25, 0.5, 0.75]]
+        last = [math.ceil(quantile * num - 0.5) - len(lows)
+                for quantile in [0.25, 0.5, 0.75]]
+        if first[0] >= 1 and last[0] < first[1] and \
+                last[1] < first[2] and last[2] <= size - 2:
+            break
+        size += 1
+    core = np.full(size, median)
+    core[:first[1]] = q1
+    core[last[1] + 1:] = q3
+    core[0] = fences[0]
+    core[-1] = fences[1]
+    return np.concatenate([lows, core, highs])
+
+
+def box_sample(values):
+    """Summarize values with box_summary, if smaller than the values.
+
+    Parameters
+    ----------
+    values : array_like
+        Sample values.
+
+    Returns
+    -------
+    sample : ndarray
+        Summary sample, or values if no summary is smaller.
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) < 6:
+        return values
+    sample = box_summary(*box_stats(values))
+    if len(sample) >= len(values):
+        return values
+    return sample
+
+
+def flow_boxes(data_frame):
+    """Summarize traffic flow counts of each year with box_sample.
+
+    Parameters
+    ----------
+    data_frame : Pandas DataFrame
+        DataFrame with traffic flow counts, negative if missing.
+
+    Returns
+    -------
+    x : list
+        Year of each sample value.
+    y : list
+        Sample values of all years.
+    """
+    x_data = []
+    y_data = []
+    for year in YEARS:
+        values = data_frame[str(year)].to_numpy()
+        sample = box_sample(values[values >= 0])
+        x_data.extend([year] * len(sample))
+        y_data.extend(sample.tolist())
+    return x_data, y_data
+
+
+def cube_flow_boxes(aggregates, row):
+    """Summarize traffic flow counts of each year from the cube.
+
+    Parameters
+    ----------
+    aggregates : dict
+        Cube from build_aggregates.
+    row : int
+        Row from cube_row, or None for no street segments.
+
+    Returns
+    -------
+    x : list
+        Year of each sample value.
+    y : list
+        Sample values from box_summary of all years.
+    """
+    x_data = []
+    y_data = []
+    if row is None:
+        return x_data, y_data
+    for col, year in enumerate(YEARS):
+        if aggregates['count'][row, col] == 0:
+            continue
+        sample = box_summary(aggregates['quantiles'][row, col],
+                             aggregates['fences'][row, col],
+                             flow_outliers(aggregates, row, col))
+        x_data.extend([year] * len(sample))
+        y_data.extend(sample.tolist())
+    return x_data, y_data
+
+
+def bin_percents(values):
+    """Count values into bins of one and normalize to percent.
+
+    Parameters
+    ----------
+    values : Pandas Series
+        Integer values, negative if missing.
+
+    Returns
+    -------
+    x : list
+        Values with nonzero counts.
+    y : list
+        Percent of values in each bin.
+    """
+    values = values.to_numpy()
+    return count_percents(np.bincount(values[values >= 0]))
+
+
+def count_percents(counts):
+    """Normalize counts of values, such as a cube row, to percent.
+
+    Parameters
+    ----------
+    counts : ndarray
+        Count (int) of each value, or None for no values.
+
+    Returns
+    -------
+    x : list
+        Values with nonzero counts.
+    y : list
+        Percent of values in each bin.
+    """
+    if counts is None or counts.sum() == 0:
+        return [], []
+    x_data = np.flatnonzero(counts)
+    return x_data.tolist(), (100 * counts[x_data] / counts.sum()).tolist()
+
+
+def histogram_trace(name, color, x_data):
+    """Create trace of values binned in the browser, in percent.
+
+    Parameters
+    ----------
+    name : str
+        Trace name.
+    color : str
+        Bar color.
+    x_data : list
+        Values.
 
-def traffic_flow_counts(data_frame, neighborhood=92):
+    Returns
+    -------
+    trace : dict
+        Plotly histogram trace.
+    """
+    return {
+        'type': 'histogram',
+        'name': name,
+        'opacity': 0.75,
+        'x': x_data,
+        'histnorm': 'percent',
+        'marker': {
+            'color': color
+        }
+    }
+
+
+def bar_trace(name, color, bins, width):
+    """Create trace of values binned on the server, like histogram_trace.
+
+    Parameters
+    ----------
+    name : str
+        Trace name.
+    color : str
+        Bar color.
+    bins : tuple
+        Values and percents from bin_percents.
+    width : float
+        Bar width, centered on each value.
+
+    Returns
+    -------
+    trace : dict
+        Plotly bar trace.
+    """
+    return {
+        'type': 'bar',
+        'name': name,
+        'opacity': 0.75,
+        'x': bins[0],
+        'y': bins[1],
+        'width': width,
+        'marker': {
+            'color': color
+        }
+    }
+
+
+def traffic_flow_counts(data_frame, neighborhood=92, nbhd_index=None,
+                        nbhd_frame=None, aggregates=None):
     """Create traffic flow count chart.
 
     Create a Plotly box plot of traffic flow counts for Seattle and
@@ -32,28 +275,31 @@ def traffic_flow_counts(data_frame, neighborhood=92):
         DataFrame with traffic flow counts.
     neighborhood : int
         Index of currently selected neighborhood
+    nbhd_index : dict
+        Inverted index from build_nbhd_index, in the row order of
+        data_frame. If None, the nbhd column is searched instead.
+    nbhd_frame : Pandas DataFrame
+        Rows of data_frame in the neighborhood from select_nbhd, to
+        share one selection between charts. If None, they are selected.
+    aggregates : dict
+        Cube from build_aggregates, to read statistics of the city and
+        neighborhood instead of computing them from data_frame.
 
     Returns
     -------
     figure : dict
-        Plotly box plot figure.
+        Plotly box plot figure, with samples summarized by box_sample,
+        or by box_summary if read from aggregates.
     """
-    x_city = []
-    y_city = []
-    x_nbhd = []
-    y_nbhd = []
-    for year in range(2007, 2019):
-        # City statistics
-        city_data = data_frame[data_frame[str(year)] >= 0]
-        x_city.extend([year] * len(city_data))
-        y_city.extend(city_data[str(year)].to_list())
-
-        # Neighborhood statistics
-        nbhd_idx = city_data.nbhd.apply(
-            lambda nbhd_list: int(neighborhood) in nbhd_list)
-        nbhd_data = city_data[nbhd_idx]
-        x_nbhd.extend([year] * len(nbhd_data))
-        y_nbhd.extend(nbhd_data[str(year)].to_list())
+    if aggregates is not None:
+        x_city, y_city = cube_flow_boxes(aggregates, cube_row(aggregates))
+        x_nbhd, y_nbhd = cube_flow_boxes(
+            aggregates, cube_row(aggregates, neighborhood))
+    else:
+        x_city, y_city = flow_boxes(data_frame)
+        if nbhd_frame is None:
+            nbhd_frame = select_nbhd(data_frame, neighborhood, nbhd_index)
+        x_nbhd, y_nbhd = flow_boxes(nbhd_frame)
     trace_city = {
         'type': 'box',
         'name': 'City',
@@ -103,7 +349,8 @@ def traffic_flow_counts(data_frame, neighborhood=92):
     return figure
 
 
-def speed_limits(data_frame, neighborhood=92):
+def speed_limits(data_frame, neighborhood=92, nbhd_index=None,
+                 nbhd_frame=None, aggregates=None, binned=True):
     """Create speed limit chart.
 
     Create a Plotly histogram of traffic flow counts for Seattle and
@@ -115,38 +362,50 @@ def speed_limits(data_frame, neighborhood=92):
         DataFrame with speed limits.
     neighborhood : int
         Index of currently selected neighborhood
+    nbhd_index : dict
+        Inverted index from build_nbhd_index, in the row order of
+        data_frame. If None, the nbhd column is searched instead.
+    nbhd_frame : Pandas DataFrame
+        Rows of data_frame in the neighborhood from select_nbhd, to
+        share one selection between charts. If None, they are selected.
+    aggregates : dict
+        Cube from build_aggregates, to read statistics of the city and
+        neighborhood instead of computing them from data_frame. Only
+        used if binned.
+    binned : bool
+        If True, send bars of percents binned on the server with
+        bin_percents. If False, send speed limits to bin in the browser.
 
     Returns
     -------
     figure : dict
         Plotly histogram figure.
     """
-    city_data = data_frame[data_frame['speed'] >= 0]
-    x_city = city_data['speed'].to_list()
-    trace_city = {
-        'type': 'histogram',
-        'name': 'City',
-        'opacity': 0.75,
-        'x': x_city,
-        'histnorm': 'percent',
-        'marker': {
-            'color': 'gray'
-        }
-    }
-    nbhd_idx = city_data.nbhd.apply(
-        lambda nbhd_list: int(neighborhood) in nbhd_list)
-    nbhd_data = city_data[nbhd_idx]
-    nbhd_roads = nbhd_data['speed'].to_list()
-    trace_nbhd = {
-        'type': 'histogram',
-        'name': 'Neighborhood',
-        'opacity': 0.75,
-        'x': nbhd_roads,
-        'histnorm': 'percent',
-        'marker': {
-            'color': 'steelblue'
-        }
-    }
+    if binned:
+        if aggregates is not None:
+            row = cube_row(aggregates, neighborhood)
+            city_bins = count_percents(
+                aggregates['speed'][cube_row(aggregates)])
+            nbhd_bins = count_percents(
+                None if row is None else aggregates['speed'][row])
+        else:
+            city_bins = bin_percents(data_frame['speed'])
+            if nbhd_frame is None:
+                nbhd_frame = select_nbhd(data_frame, neighborhood,
+                                         nbhd_index)
+            nbhd_bins = bin_percents(nbhd_frame['speed'])
+        trace_city = bar_trace('City', 'gray', city_bins, SPEED_WIDTH)
+        trace_nbhd = bar_trace('Neighborhood', 'steelblue', nbhd_bins,
+                               SPEED_WIDTH)
+    else:
+        city_data = data_frame[data_frame['speed'] >= 0]
+        trace_city = histogram_trace('City', 'gray',
+                                     city_data['speed'].to_list())
+        if nbhd_frame is None:
+            nbhd_frame = select_nbhd(data_frame, neighborhood, nbhd_index)
+        nbhd_data = nbhd_frame[nbhd_frame['speed'] >= 0]
+        trace_nbhd = histogram_trace('Neighborhood', 'steelblue',
+                                     nbhd_data['speed'].to_list())
     figure = {
         'data': [trace_city, trace_nbhd],
         'layout': {
@@ -172,7 +431,8 @@ def speed_limits(data_frame, neighborhood=92):
     return figure
 
 
-def road_types(data_frame, neighborhood=92):
+def road_types(data_frame, neighborhood=92, nbhd_index=None,
+               nbhd_frame=None, aggregates=None, binned=True):
     """Create arterial classification chart.
 
     Create a Plotly histogram of traffic flow counts for Seattle and
@@ -184,38 +444,49 @@ def road_types(data_frame, neighborhood=92):
         DataFrame with arterial classifications.
     neighborhood : int
         Index of currently selected neighborhood
+    nbhd_index : dict
+        Inverted index from build_nbhd_index, in the row order of
+        data_frame. If None, the nbhd column is searched instead.
+    nbhd_frame : Pandas DataFrame
+        Rows of data_frame in the neighborhood from select_nbhd, to
+        share one selection between charts. If None, they are selected.
+    aggregates : dict
+        Cube from build_aggregates, to read statistics of the city and
+        neighborhood instead of computing them from data_frame. Only
+        used if binned.
+    binned : bool
+        If True, send bars of percents binned on the server with
+        bin_percents. If False, send classifications to bin in the
+        browser.
 
     Returns
     -------
     figure : dict
         Plotly histogram figure.
     """
-    city_data = data_frame
-    x_city = city_data['road'].to_list()
-    trace_city = {
-        'type': 'histogram',
-        'name': 'City',
-        'opacity': 0.75,
-        'x': x_city,
-        'histnorm': 'percent',
-        'marker': {
-            'color': 'gray'
-        }
-    }
-    nbhd_idx = city_data.nbhd.apply(
-        lambda nbhd_list: int(neighborhood) in nbhd_list)
-    nbhd_data = city_data[nbhd_idx]
-    nbhd_roads = nbhd_data['road'].to_list()
-    trace_nbhd = {
-        'type': 'histogram',
-        'name': 'Neighborhood',
-        'opacity': 0.75,
-        'x': nbhd_roads,
-        'histnorm': 'percent',
-        'marker': {
-            'color': 'steelblue'
-        }
-    }
+    if binned:
+        if aggregates is not None:
+            row = cube_row(aggregates, neighborhood)
+            city_bins = count_percents(
+                aggregates['road'][cube_row(aggregates)])
+            nbhd_bins = count_percents(
+                None if row is None else aggregates['road'][row])
+        else:
+            city_bins = bin_percents(data_frame['road'])
+            if nbhd_frame is None:
+                nbhd_frame = select_nbhd(data_frame, neighborhood,
+                                         nbhd_index)
+            nbhd_bins = bin_percents(nbhd_frame['road'])
+        trace_city = bar_trace('City', 'gray', city_bins, ROAD_WIDTH)
+        trace_nbhd = bar_trace('Neighborhood', 'steelblue', nbhd_bins,
+                               ROAD_WIDTH)
+    else:
+        trace_city = histogram_trace('City', 'gray',
+                                     data_frame['road'].to_list())
+        if nbhd_frame is None:
+            nbhd_frame = select_nbhd(data_frame, neighborhood, nbhd_index)
+        trace_nbhd = histogram_trace('Neighborhood', 'steelblue',
+                                     nbhd_frame['road'].to_list())
     figure = {
         'data': [trace_city, trace_nbhd],
         'layout': {
@@ -3,9 +3,12 @@ from pathlib import Path
 
 import numpy as np
 import matplotlib.cm as cm
-from matplotlib.colors import Normalize
 import pandas as pd
 
+from neighborhoodtrafficflow.data.geometry import \
+    LOD_TOLERANCES, METERS_PER_DEGREE, segment_coords, lod_level
+from neighborhoodtrafficflow.data.neighborhood_index import select_nbhd
+
 # Arterial classification for traffic flow map hover text
 ROAD_TYPE = {
     0: 'Not Designated',
@@ -68,13 +71,57 @@ CMAP_INFO = {
     'road': [ROAD_CMAP, 5.9, 'Arterial Classification']
 }
 
+# Number of color bins for traffic flow and speed limit in merged road map
+COLOR_BINS = 32
+
+# Decimals of coordinates in merged road map, about 0.1 m
+COORD_DECIMALS = 6
+
+# Approximate size (pixels) of road map plot area, to choose its level
+# of detail
+ROAD_MAP_PIXELS = 450
+
+# Number of entries in color lookup tables
+LUT_SIZE = 256
 
-def neighborhood_map(num, data, region_ids, names, selected=92):
+
+def colormap_lut(cmap):
+    """Create color lookup table for road colors.
+
+    Parameters
+    ----------
+    cmap : str
+        Name of matplotlib colormap.
+
+    Returns
+    -------
+    lut : ndarray
+        LUT_SIZE rgb strings (str) of colormap at normalized values
+        k / LUT_SIZE, for k = 0, ..., LUT_SIZE - 1.
+    """
+    rgba = cm.get_cmap(cmap)(np.arange(LUT_SIZE) / LUT_SIZE)
+    return np.array(['rgb(%f,%f,%f)' % tuple(color[:-1]) for color in rgba])
+
+
+# Color lookup tables and max values for road colors
+COLOR_LUTS = {
+    'flow': [colormap_lut('viridis'), 108179],
+    'speed': [colormap_lut('RdYlGn_r'), 60],
+    'road': [colormap_lut('tab10'), 9]
+}
+GREY = 'rgb(192,192,192)'
+BLACK = 'rgb(0.000000,0.000000,0.000000)'
+
+
+def neighborhood_map(num, data, region_ids, names, selected=92, z=None,
+                     title=None):
     """Create neighborhood map with selected neighborhood highlighted.
 
     Create Plotly choroplethmapbox figure of Seattle neighborhoods from
     Zillow data with selected neighborhood highlighted in a darker
     color. Default neighborhood is University District (index=92).
+    Neighborhoods are colored by a metric such as from metric_table if
+    given, otherwise uniformly.
 
     Parameters
     ----------
@@ -88,6 +135,11 @@ def neighborhood_map(num, data, region_ids, names, selected=92):
         Neighborhood names (str).
     selected : int
         Index of selected neighborhood on map.
+    z : array_like
+        Metric (float) of each neighborhood, NaN if none. If None, no
+        metric is shown.
+    title : str
+        Color bar title of metric.
 
     Returns
     -------
@@ -97,18 +149,21 @@ def neighborhood_map(num, data, region_ids, names, selected=92):
     figure = {
         'data': [{
             'type': 'choroplethmapbox',
-            'z': np.zeros((num)),
+            'z': np.zeros((num)) if z is None else z,
             'geojson': data,
             'locations': region_ids,
             'hovertext': names,
-            'hoverinfo': 'text',
+            'hoverinfo': 'text' if z is None else 'text+z',
             'marker': {
                 'line': {
                     'width': 2
                 }
             },
             'colorscale': 'Greens',
-            'showscale': False,
+            'showscale': z is not None,
+            'colorbar': {
+                'title': title
+            },
             'selectedpoints': [selected],
             'selected': {
                 'marker': {
@@ -143,7 +198,9 @@ def neighborhood_map(num, data, region_ids, names, selected=92):
     return figure
 
 
-def road_map(data_frame, neighborhood=92, map_type='flow', year=2018):
+def road_map(data_frame, neighborhood=92, map_type='flow', year=2018,
+             coords=None, nbhd_index=None, merge=False, lod=None,
+             level=None):
     """Create road map of currently selected neighborhood.
 
     Create Plotly scattermapbox figure of roads in selected Seattle
@@ -161,16 +218,34 @@ def road_map(data_frame, neighborhood=92, map_type='flow', year=2018):
         Selected type from radio: 'flow', 'speed', or 'road'.
     year : int
         Selected year from slider.
+    coords : dict
+        Coordinate arrays from pack_coords, indexed by DataFrame row.
+        If None, coordinates are read from the lon and lat columns.
+    nbhd_index : dict
+        Inverted index from build_nbhd_index, in the row order of
+        data_frame. If None, the nbhd column is searched instead.
+    merge : bool
+        Merge roads into one trace per color bin from color_bins
+        instead of one trace per road.
+    lod : list
+        Coordinate arrays of each level of detail from build_lod, used
+        instead of coords.
+    level : int
+        Level of detail in lod. If None, road_map_level of the whole
+        neighborhood.
 
     Returns
     -------
     figure : dict
         Plotly scattermapbox figure.
     """
+    if lod is not None:
+        if level is None:
+            level = road_map_level(neighborhood, num_levels=len(lod))
+        coords = lod[min(level, len(lod) - 1)]
+
     # Filter DataFrame by neighborhood
-    nbhd_idx = data_frame.nbhd.apply(
-        lambda nbhd_list: int(neighborhood) in nbhd_list)
-    data_frame = data_frame[nbhd_idx]
+    data_frame = select_nbhd(data_frame, neighborhood, nbhd_index)
     if map_type == 'flow':
         data_frame = data_frame.rename(columns={str(year): 'flow'})
         data_frame = data_frame.sort_values(by=['flow'])
@@ -211,21 +286,31 @@ def road_map(data_frame, neighborhood=92, map_type='flow', year=2018):
         ]
 
     # Add roads to data list
-    for _, row in data_frame.iterrows():
-        trace = {
-            'type': 'scattergl',
-            'x': row['lon'],
-            'y': row['lat'],
-            'mode': 'lines',
-            'line': {
-                'width': 3,
-                'color': road_color(row[map_type], map_type)
-            },
-            'showlegend': False,
-            'hoverinfo': 'text',
-            'hovertext': hover_text(row['name'], row[map_type], map_type)
-        }
-        data.append(trace)
+    if merge:
+        data.extend(merged_road_traces(data_frame, map_type, coords))
+    else:
+        colors = road_colors(data_frame[map_type], map_type).tolist()
+        texts = hover_texts(data_frame['name'], data_frame[map_type],
+                            map_type).tolist()
+        for row, (row_id, road) in enumerate(data_frame.iterrows()):
+            if coords is None:
+                lon, lat = road['lon'], road['lat']
+            else:
+                lon, lat = segment_coords(coords, row_id)
+            trace = {
+                'type': 'scattergl',
+                'x': lon,
+                'y': lat,
+                'mode': 'lines',
+                'line': {
+                    'width': 3,
+                    'color': colors[row]
+                },
+                'showlegend': False,
+                'hoverinfo': 'text',
+                'hovertext': texts[row]
+            }
+            data.append(trace)
 
     # Define plotly figure
     if map_type == 'flow':
@@ -243,6 +328,7 @@ def road_map(data_frame, neighborhood=92, map_type='flow', year=2018):
             'paper_bgcolor': '#F9F9F9',
             'hovermode': 'closest',
             'clickmode': 'none',
+            'uirevision': int(neighborhood),
             'xaxis': {
                 'linecolor': 'black',
                 'mirror': True,
@@ -261,12 +347,204 @@ def road_map(data_frame, neighborhood=92, map_type='flow', year=2018):
     return figure
 
 
+def road_map_level(neighborhood, relayout=None, num_levels=None):
+    """Get level of detail of road map from its axis ranges.
+
+    Parameters
+    ----------
+    neighborhood : int
+        Index of selected neighborhood.
+    relayout : dict
+        Relayout data of the road map with axis ranges after zooming.
+        If None or without ranges, the whole neighborhood is shown.
+    num_levels : int
+        Number of levels available, such as len(lod). If None, all
+        levels of LOD_TOLERANCES.
+
+    Returns
+    -------
+    level : int
+        Level of detail from lod_level for one pixel of the road map.
+    """
+    relayout = relayout or {}
+    info = NBHD_INFO.loc[neighborhood]
+    spans = {'x': info['maxLon'] - info['minLon'],
+             'y': info['maxLat'] - info['minLat']}
+    for axis in spans:
+        bounds = relayout.get('%saxis.range' % axis) or [
+            relayout.get('%saxis.range[%d]' % (axis, idx)) for idx in [0, 1]]
+        try:
+            spans[axis] = abs(float(bounds[1]) - float(bounds[0]))
+        except (IndexError, TypeError, ValueError):
+            pass
+    meters = min(spans['x'] * np.cos(np.radians(info['midLat'])),
+                 spans['y']) * METERS_PER_DEGREE
+    return lod_level(meters / ROAD_MAP_PIXELS, num_levels, LOD_TOLERANCES)
+
+
+def merged_road_traces(data_frame, map_type, coords=None):
+    """Create one road trace per color bin for neighborhood road map.
+
+    Roads in the same color bin are joined into a single trace, with
+    None between roads so that they are drawn as separate lines. Each
+    point carries the road name, and the road value if it differs
+    within the bin, as customdata for its hover text.
+
+    Parameters
+    ----------
+    data_frame : Pandas DataFrame
+        DataFrame of roads to draw, with name and map_type columns.
+    map_type : str
+        Either 'flow', 'speed', or 'road'.
+    coords : dict
+        Coordinate arrays from pack_coords, indexed by DataFrame row.
+        If None, coordinates are read from the lon and lat columns.
+
+    Returns
+    -------
+    traces : list
+        Plotly scattergl traces, in ascending order of color bin.
+    """
+    values = data_frame[map_type].to_numpy()
+    names = data_frame['name'].to_numpy()
+    bins = color_bins(values, map_type)
+    traces = []
+    for color_bin in np.unique(bins):
+        rows = np.flatnonzero(bins == color_bin)
+        value = values[rows[0]]
+        if np.all(values[rows] == value):
+            template = hover_template(map_type, value)
+        else:
+            template = hover_template(map_type)
+            value = None
+        x_list = []
+        y_list = []
+        customdata = []
+        for row in rows:
+            row_id = data_frame.index[row]
+            if coords is None:
+                lon = data_frame.at[row_id, 'lon']
+                lat = data_frame.at[row_id, 'lat']
+            else:
+                lon, lat = segment_coords(coords, row_id)
+            x_list.extend(np.round(lon, COORD_DECIMALS).tolist())
+            y_list.extend(np.round(lat, COORD_DECIMALS).tolist())
+            if value is None:
+                point = [names[row], int(values[row])]
+            else:
+                point = names[row]
+            customdata.extend([point] * len(lon))
+            x_list.append(None)
+            y_list.append(None)
+            customdata.append(None)
+        traces.append({
+            'type': 'scattergl',
+            'x': x_list,
+            'y': y_list,
+            'mode': 'lines',
+            'line': {
+                'width': 3,
+                'color': bin_color(color_bin, map_type)
+            },
+            'showlegend': False,
+            'customdata': customdata,
+            'hovertemplate': template
+        })
+    return traces
+
+
+def color_bins(values, map_type):
+    """Assign color bins for merged neighborhood road map.
+
+    Traffic flow and speed limit values are quantized into COLOR_BINS
+    equal bins between zero and the colorscale maximum, road types each
+    get their own bin, and unknown values (-1) get bin -1.
+
+    Parameters
+    ----------
+    values : ndarray
+        Traffic flow, speed limit, or road type of each road.
+    map_type : str
+        Either 'flow', 'speed', or 'road'.
+
+    Returns
+    -------
+    bins : ndarray
+        Color bin (int) of each road.
+    """
+    values = np.asarray(values, dtype=float)
+    if map_type == 'road':
+        bins = values.astype(np.int64)
+    else:
+        bins = np.floor(values / CMAP_INFO[map_type][1] * COLOR_BINS)
+        bins = np.clip(bins, 0, COLOR_BINS - 1).astype(np.int64)
+    bins[values == -1] = -1
+    return bins
+
+
+def bin_color(color_bin, map_type):
+    """Assign road color of a color bin from color_bins.
+
+    Traffic flow and speed limit bins use the color of the bin center.
+    """
+    if color_bin == -1 or map_type == 'road':
+        return road_color(color_bin, map_type)
+    vmax = CMAP_INFO[map_type][1]
+    return road_color((color_bin + 0.5) * vmax / COLOR_BINS, map_type)
+
+
+def hover_template(map_type, val=None):
+    """Create hover template for merged neighborhood road map.
+
+    The template gives the same description as hover_text. If val is
+    given, customdata of each point is the road name, otherwise it is
+    the road name and value. Road types always need val.
+    """
+    if val is not None:
+        template = hover_text('%{customdata}', val, map_type)
+    elif map_type == 'flow':
+        template = '%{customdata[0]}, Flow Count: %{customdata[1]}'
+    else:
+        template = '%{customdata[0]}, Speed Limit: %{customdata[1]}mph'
+    return template + '<extra></extra>'
+
+
+def road_colors(values, map_type):
+    """Assign road colors for neighborhood road map.
+
+    Determine the colors of roads based on road type and values, with
+    one lookup in viridis (flow), RdYlGn (speed), or tab10 (road) color
+    tables from COLOR_LUTS. Unknown values (-1 or None) are grey and
+    principal arterials (road type 1) are black because orange looks
+    like red.
+
+    Parameters
+    ----------
+    values : ndarray
+        Traffic flow, speed limit, or road type of each road.
+    map_type : str
+        Either 'flow', 'speed', or 'road'.
+
+    Returns
+    -------
+    colors : ndarray
+        Strings (str) containing rgb value of each road.
+    """
+    lut, vmax = COLOR_LUTS[map_type]
+    values = np.asarray(values, dtype=float)
+    bad = np.isnan(values) | (values == -1)
+    idx = np.clip(np.where(bad, 0, values) / vmax * LUT_SIZE, 0, LUT_SIZE - 1)
+    colors = lut[idx.astype(np.int64)]
+    if map_type == 'road':
+        colors = np.where(values == 1, BLACK, colors)
+    return np.where(bad, GREY, colors)
+
+
 def road_color(val, map_type):
     """Assign road color for neighborhood road map.
 
-    Determine the color of a given road based on road type and value.
-    Color is determined by viridis (flow), RdYlGn (speed), and tab10
-    (road) colormaps and min/max values in dataset.
+    Determine the color of a given road based on road type and value
+    with road_colors.
 
     Parameters
     ----------
@@ -280,29 +558,7 @@ def road_color(val, map_type):
     rgb : str
         String containting rgb value of given road.
     """
-    # Bad values
-    if val is None or val == -1:
-        return 'rgb(192,192,192)'
-
-    # Create colormap
-    if map_type == 'flow':
-        cmap = cm.get_cmap('viridis')
-        norm = Normalize(vmin=0, vmax=108179)
-    elif map_type == 'speed':
-        cmap = cm.get_cmap('RdYlGn_r')
-        norm = Normalize(vmin=0, vmax=60)
-    else:
-        cmap = cm.get_cmap('tab10')
-        norm = Normalize(vmin=0, vmax=9)
-
-    # Assign color
-    if map_type == 'road' and val == 1:
-        rgba = (0, 0, 0, 1)  # use black because orange looks like red
-    else:
-        rgba = cmap(norm(float(val)))
-
-    # Parse color
-    return 'rgb(%f,%f,%f)' % rgba[:-1]
+    return str(road_colors([val], map_type)[0])
 
 
 def hover_text(name, val, map_type):
@@ -334,3 +590,44 @@ def hover_text(name, val, map_type):
             return name + ', Speed Limit: Unknown'
         return name + ', Speed Limit: ' + str(int(val)) + 'mph'
     return name + ', Road Type: ' + ROAD_TYPE[val]
+
+
+def hover_texts(names, values, map_type):
+    """Create hover text of all roads for neighborhood road map.
+
+    Create the same descriptions as hover_text for arrays of roads with
+    vectorized string operations.
+
+    Parameters
+    ----------
+    names : ndarray
+        Names (str) of the streets.
+    values : ndarray
+        Traffic flow, speed limit, or road type of each road.
+    map_type : str
+        Either 'flow', 'speed', or 'road'.
+
+    Returns
+    -------
+    hovertext : ndarray
+        Descriptions (str) of roads including name and value.
+
+    Raises
+    ------
+    KeyError
+        If a road type is not in ROAD_TYPE.
+    """
+    names = np.asarray(names, dtype=object)
+    values = np.asarray(values)
+    if map_type not in ['flow', 'speed']:
+        types = pd.Series(values).map(ROAD_TYPE)
+        if types.isna().any():
+            raise KeyError(values[types.isna().to_numpy()][0])
+        return names + ', Road Type: ' + types.to_numpy(dtype=object)
+    known = values != -1
+    counts = np.full(len(values), 'Unknown', dtype=object)
+    counts[known] = values[known].astype(np.int64).astype(str)
+    if map_type == 'flow':
+        return names + ', Flow Count: ' + counts
+    counts[known] += 'mph'
+    return names + ', Speed Limit: ' + counts
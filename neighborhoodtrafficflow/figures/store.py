@@ -0,0 +1,405 @@
+"""Precompute dashboard figures into a figure store on disk.
+
+All inputs of the map and chart figures are static, so every callback
+response with figures the dashboard can show is rendered ahead of time
+in a store directory, one JSON file per key from figure_key, and served
+as is. These are the road map for each neighborhood, map type, and
+year, at the level of detail of the whole neighborhood, and the charts
+for each neighborhood. Road maps at other levels, after zooming, are
+built on the fly. Section titles and the neighborhood map highlight
+and colors are updated in the browser and not stored. Each response is
+also stored gzip and brotli compressed at the highest levels, which are
+too slow to compress per request. A manifest records the data version
+the figures were rendered from, so a store built from other data is
+never served.
+"""
+from functools import partial
+import gzip
+import io
+import json
+from multiprocessing import Pool
+import os
+from pathlib import Path
+import shutil
+
+import brotli
+import plotly
+
+from neighborhoodtrafficflow.data.aggregates import build_aggregates
+from neighborhoodtrafficflow.data.geometry import build_lod
+from neighborhoodtrafficflow.data.neighborhood_index import select_nbhd
+from neighborhoodtrafficflow.figures.cache import figure_key
+from neighborhoodtrafficflow.figures.charts import \
+    traffic_flow_counts, speed_limits, road_types
+from neighborhoodtrafficflow.figures.maps import road_map, road_map_level
+
+# Store format version, increment on incompatible changes
+STORE_VERSION = 8
+MANIFEST_FILE = 'manifest.json'
+
+
+def gzip_compress(data):
+    """Compress data with gzip at level 9 and a fixed modification time.
+
+    Same as gzip.compress(data, 9, mtime=0), which requires Python 3.8,
+    so compressed responses do not change between store builds.
+    """
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=9,
+                       mtime=0) as gzip_file:
+        gzip_file.write(data)
+    return buffer.getvalue()
+
+
+# File suffixes and compression of stored responses by content encoding
+ENCODINGS = {
+    'br': ['.br', partial(brotli.compress, quality=11)],
+    'gzip': ['.gz', gzip_compress]
+}
+
+# Selectable map types and years
+MAP_TYPES = ['flow', 'speed', 'road']
+YEARS = list(range(2007, 2019))
+
+# Chart functions by callback name
+CHARTS = {'traffic_flow_counts': traffic_flow_counts,
+          'speed_limits': speed_limits,
+          'road_types': road_types}
+
+# Server-side outputs (component id, property) that depend only on the
+# neighborhood, and their charts by component id
+NBHD_OUTPUTS = [('flowCountFigure', 'figure'),
+                ('speedLimitFigure', 'figure'),
+                ('roadTypeFigure', 'figure')]
+NBHD_CHARTS = {'flowCountFigure': 'traffic_flow_counts',
+               'speedLimitFigure': 'speed_limits',
+               'roadTypeFigure': 'road_types'}
+
+# Server-side outputs of the road map, the figure and its neighborhood
+# and level of detail
+ROAD_MAP_OUTPUTS = [('roadMapFigure', 'figure'),
+                    ('roadMapLevel', 'data')]
+
+# Street data of pool worker processes
+_WORKER_DATA = {}
+
+
+def response_keys(num_nbhds):
+    """Get keys of every callback response with figures.
+
+    Parameters
+    ----------
+    num_nbhds : int
+        Number of neighborhoods.
+
+    Returns
+    -------
+    keys : list
+        Keys from figure_key, 'neighborhood' for neighborhood outputs
+        and 'road_map' for road maps.
+    """
+    keys = []
+    for neighborhood in range(num_nbhds):
+        keys.append(figure_key('neighborhood', neighborhood))
+        for map_type in MAP_TYPES:
+            for year in YEARS if map_type == 'flow' else [None]:
+                keys.append(figure_key('road_map', neighborhood, map_type,
+                                       year))
+    return keys
+
+
+def build_figure(street_data, coords, nbhd_index, key, lod=None, level=None):
+    """Build road map figure.
+
+    Parameters
+    ----------
+    street_data : DataFrame
+        Cleaned street data.
+    coords : dict
+        Street coordinate arrays from pack_coords.
+    nbhd_index : dict
+        Inverted index from build_nbhd_index.
+    key : tuple
+        Road map key from figure_key.
+    lod : list
+        Street coordinate arrays of each level of detail from build_lod,
+        used for road maps instead of coords.
+    level : int
+        Level of detail of road maps in lod. If None, road_map_level of
+        the whole neighborhood.
+
+    Returns
+    -------
+    figure : dict
+        Plotly figure.
+    """
+    _, neighborhood, map_type, year = key
+    return road_map(street_data, neighborhood, map_type,
+                    YEARS[-1] if year is None else year, coords, nbhd_index,
+                    merge=True, lod=lod, level=level)
+
+
+def nbhd_outputs(street_data, nbhd_index, neighborhood, aggregates=None):
+    """Build charts of a neighborhood.
+
+    Statistics are read from the cube if given. Otherwise the street
+    segments of the neighborhood are selected once and shared by all
+    charts.
+
+    Parameters
+    ----------
+    street_data : DataFrame
+        Cleaned street data.
+    nbhd_index : dict
+        Inverted index from build_nbhd_index.
+    neighborhood : int
+        Index of selected neighborhood.
+    aggregates : dict
+        Cube from build_aggregates. If None, statistics are computed
+        from street_data.
+
+    Returns
+    -------
+    outputs : dict
+        Mapping from component id to mapping from property to value,
+        for every output in NBHD_OUTPUTS.
+    """
+    outputs = {}
+    nbhd_frame = None
+    if aggregates is None:
+        nbhd_frame = select_nbhd(street_data, neighborhood, nbhd_index)
+    for idx, chart in NBHD_CHARTS.items():
+        outputs[idx] = {'figure': CHARTS[chart](
+            street_data, neighborhood, nbhd_index, nbhd_frame, aggregates)}
+    return outputs
+
+
+def outputs_response(outputs):
+    """Serialize outputs as body of a multi-output callback response."""
+    return json.dumps({'response': outputs, 'multi': True},
+                      cls=plotly.utils.PlotlyJSONEncoder).encode()
+
+
+def road_map_outputs(street_data, coords, nbhd_index, key, lod=None,
+                     level=None):
+    """Build road map and its level of detail.
+
+    Parameters are as of build_figure.
+
+    Returns
+    -------
+    outputs : dict
+        Mapping from component id to mapping from property to value,
+        for every output in ROAD_MAP_OUTPUTS.
+    """
+    if level is None:
+        level = road_map_level(key[1], num_levels=1 if lod is None
+                               else len(lod))
+    figure = build_figure(street_data, coords, nbhd_index, key, lod, level)
+    return {'roadMapFigure': {'figure': figure},
+            'roadMapLevel': {'data': {'neighborhood': key[1],
+                                      'level': level}}}
+
+
+def build_response(street_data, coords, nbhd_index, key, aggregates=None,
+                   lod=None):
+    """Build Dash callback response of neighborhood or road map outputs.
+
+    Parameters
+    ----------
+    street_data : DataFrame
+        Cleaned street data.
+    coords : dict
+        Street coordinate arrays from pack_coords.
+    nbhd_index : dict
+        Inverted index from build_nbhd_index.
+    key : tuple
+        Key from response_keys.
+    aggregates : dict
+        Cube from build_aggregates. If None, statistics are computed
+        from street_data.
+    lod : list
+        Street coordinate arrays of each level of detail from build_lod.
+        If None, road maps are drawn from coords.
+
+    Returns
+    -------
+    response : bytes
+        Response body.
+    """
+    if key[0] == 'neighborhood':
+        return outputs_response(
+            nbhd_outputs(street_data, nbhd_index, key[1], aggregates))
+    return outputs_response(road_map_outputs(street_data, coords, nbhd_index,
+                                             key, lod))
+
+
+def response_file(key, encoding=None):
+    """Get name of response file in store, such as road_map-92-flow-2018.json.
+
+    Responses compressed with an encoding from ENCODINGS have its
+    suffix appended to the name.
+    """
+    name = '-'.join(str(part) for part in key) + '.json'
+    if encoding is not None:
+        name += ENCODINGS[encoding][0]
+    return name
+
+
+def _init_worker(street_data, coords, nbhd_index, aggregates, lod):
+    """Set data of pool worker process."""
+    _WORKER_DATA.update(street_data=street_data, coords=coords,
+                        nbhd_index=nbhd_index, aggregates=aggregates,
+                        lod=lod)
+
+
+def _render_response(store_path, key):
+    """Build response in pool worker process and write it to store."""
+    response = build_response(
+        _WORKER_DATA['street_data'], _WORKER_DATA['coords'],
+        _WORKER_DATA['nbhd_index'], key, _WORKER_DATA['aggregates'],
+        _WORKER_DATA['lod'])
+    with open(Path(store_path) / response_file(key), 'wb') as data_file:
+        data_file.write(response)
+    for encoding, (_, compress) in ENCODINGS.items():
+        with open(Path(store_path) / response_file(key, encoding),
+                  'wb') as data_file:
+            data_file.write(compress(response))
+
+
+def write_store(store_path, street_data, coords, nbhd_index, nbhd_data,
+                data_version, processes=None, keys=None, aggregates=None,
+                lod=None):
+    """Render callback responses to a figure store.
+
+    Responses are rendered by a pool of processes into a temporary
+    directory next to store_path, which is then moved into place,
+    replacing any existing store.
+
+    Parameters
+    ----------
+    store_path : str
+        Path to store directory.
+    street_data : DataFrame
+        Cleaned street data.
+    coords : dict
+        Street coordinate arrays from pack_coords.
+    nbhd_index : dict
+        Inverted index from build_nbhd_index.
+    nbhd_data : list
+        Number of neighborhoods, neighborhood geojson, region ids, and
+        neighborhood names from prep_map_data.
+    data_version : str
+        Version of the data, such as from read_data_version.
+    processes : int
+        Number of worker processes. If None, the number of CPUs.
+    keys : list
+        Keys of responses to render. If None, every response from
+        response_keys is rendered.
+    aggregates : dict
+        Cube from build_aggregates. If None, it is built once and
+        shared by the workers.
+    lod : list
+        Street coordinate arrays of each level of detail from build_lod.
+        If None, they are built once and shared by the workers.
+
+    Returns
+    -------
+    out : None
+    """
+    store_path = Path(store_path)
+    tmp_path = store_path.with_name(store_path.name + '.tmp')
+    if tmp_path.exists():
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    if keys is None:
+        keys = response_keys(nbhd_data[0])
+    if aggregates is None:
+        aggregates = build_aggregates(street_data, nbhd_index, nbhd_data[0])
+    if lod is None:
+        lod = build_lod(coords)
+    with Pool(processes, _init_worker,
+              (street_data, coords, nbhd_index, aggregates, lod)) as pool:
+        for _ in pool.imap_unordered(partial(_render_response, tmp_path),
+                                     keys, chunksize=8):
+            pass
+
+    # Manifest last, so incomplete stores are never valid
+    with open(tmp_path / MANIFEST_FILE, 'w+') as json_file:
+        json.dump({'version': STORE_VERSION, 'data_version': data_version,
+                   'num_responses': len(keys)}, json_file, indent=2)
+
+    if store_path.exists():
+        shutil.rmtree(store_path)
+    os.rename(tmp_path, store_path)
+
+
+def open_store(store_path, data_version):
+    """Check that a figure store matches the data.
+
+    Parameters
+    ----------
+    store_path : str
+        Path to store directory.
+    data_version : str
+        Version of the data served by the dashboard.
+
+    Returns
+    -------
+    store_path : Path
+        Path to store directory, or None if no complete store exists or
+        it was rendered with a different format or data version.
+    """
+    try:
+        with open(Path(store_path) / MANIFEST_FILE) as json_file:
+            manifest = json.load(json_file)
+    except FileNotFoundError:
+        return None
+    if manifest['version'] != STORE_VERSION or \
+            manifest['data_version'] != data_version:
+        return None
+    return Path(store_path)
+
+
+def read_response(store_path, key, encoding=None):
+    """Read Dash callback response from figure store.
+
+    Parameters
+    ----------
+    store_path : Path
+        Path to store directory from open_store.
+    key : tuple
+        Key from response_keys.
+    encoding : str
+        Content encoding from ENCODINGS, or None for uncompressed JSON.
+
+    Returns
+    -------
+    response : bytes
+        Response body, or None if the store has no such response.
+    """
+    try:
+        with open(store_path / response_file(key, encoding),
+                  'rb') as data_file:
+            return data_file.read()
+    except FileNotFoundError:
+        return None
+
+
+if __name__ == '__main__':
+    from neighborhoodtrafficflow.data.storage import \
+        read_bundle, read_bundle_aggregates, read_bundle_lod, \
+        read_data_version
+
+    # Paths to cleaned data bundle and figure store
+    CLEANED_PATH = Path(__file__).parents[1] / 'data/cleaned'
+    BUNDLE_PATH = CLEANED_PATH / 'bundle'
+    STORE_PATH = CLEANED_PATH / 'figures'
+
+    # Render figure store from bundle
+    STREET_DATA, COORDS, NBHD_DATA, NBHD_INDEX = read_bundle(BUNDLE_PATH)
+    write_store(STORE_PATH, STREET_DATA, COORDS, NBHD_INDEX, NBHD_DATA,
+                read_data_version(BUNDLE_PATH),
+                aggregates=read_bundle_aggregates(BUNDLE_PATH),
+                lod=read_bundle_lod(BUNDLE_PATH, COORDS))
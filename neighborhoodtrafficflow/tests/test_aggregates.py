@@ -0,0 +1,156 @@
+"""Test module for the neighborhood by year cube of street statistics."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from neighborhoodtrafficflow.data.aggregates import \
+    YEARS, METRICS, AGGREGATE_NAMES, hazen_percentiles, box_stats, \
+    build_aggregates, cube_row, flow_outliers, metric_table, \
+    check_aggregates, save_aggregates, load_aggregates
+from neighborhoodtrafficflow.data.neighborhood_index import build_nbhd_index
+
+# Example street data
+STREET_DATA = pd.DataFrame({
+    'speed': [25, -1, 35, 40, 25],
+    'road': [0, 1, 5, 2, 0],
+    'nbhd': [[0, 2], [2], [], [0], [0]],
+    **{str(year): [100 * year, -1, 2000, 300, 1] for year in YEARS}
+})
+NBHD_INDEX = build_nbhd_index(STREET_DATA['nbhd'], 3)
+
+
+#####################
+# hazen_percentiles #
+#####################
+
+def test_output_hazen_percentiles():
+    """Check percentiles interpolated between sorted values."""
+    values = np.array([4.0, 1, 3, 2])
+    assert hazen_percentiles(values, [0, 10, 25, 50, 75, 90, 100]) \
+        .tolist() == [1, 1, 1.5, 2.5, 3.5, 4, 4]
+    assert hazen_percentiles(np.array([3.0]), [0, 50, 100]).tolist() == \
+        [3, 3, 3]
+
+
+#############
+# box_stats #
+#############
+
+def test_output_box_stats():
+    """Check quartiles, fences, and outliers of values."""
+    values = np.array([1.0, 2, 3, 4, 5, 6, 7, 8, 100])
+    quantiles, fences, outliers = box_stats(values)
+    assert quantiles.tolist() == [1, 2.75, 5, 7.25, 100]
+    assert fences.tolist() == [1, 8]
+    assert outliers.tolist() == [100]
+    quantiles, fences, outliers = box_stats(np.array([3.0]))
+    assert quantiles.tolist() == [3] * 5
+    assert fences.tolist() == [3, 3]
+    assert outliers.tolist() == []
+
+
+####################
+# build_aggregates #
+####################
+
+def test_output_build_aggregates():
+    """Check statistics of neighborhoods and the city."""
+    aggregates = build_aggregates(STREET_DATA, NBHD_INDEX, 3)
+    assert aggregates['segments'].tolist() == [3, 0, 2, 5]
+    assert aggregates['count'][:, 0].tolist() == [3, 0, 1, 4]
+    assert aggregates['sum'][0, 0] == 200700 + 300 + 1
+    assert aggregates['mean'][3, 0] == (200700 + 2000 + 300 + 1) / 4
+    assert np.isnan(aggregates['mean'][1, 0])
+    assert aggregates['quantiles'][2, 0].tolist() == [200700] * 5
+    assert aggregates['speed'][0, [25, 40]].tolist() == [2, 1]
+    assert aggregates['speed'][3].sum() == 4
+    assert aggregates['road'][2].tolist() == [1, 1, 0, 0, 0, 0]
+
+
+def test_shape_build_aggregates():
+    """Check that arrays have one row per neighborhood and the city."""
+    aggregates = build_aggregates(STREET_DATA, NBHD_INDEX)
+    assert sorted(aggregates) == sorted(AGGREGATE_NAMES)
+    assert aggregates['count'].shape == (4, len(YEARS))
+    assert aggregates['quantiles'].shape == (4, len(YEARS), 5)
+    assert aggregates['fences'].shape == (4, len(YEARS), 2)
+    assert len(aggregates['outlier_offsets']) == 4 * len(YEARS) + 1
+    assert aggregates['outlier_offsets'][-1] == len(aggregates['outliers'])
+
+
+############
+# cube_row #
+############
+
+def test_output_cube_row():
+    """Check rows of neighborhoods and the city."""
+    aggregates = build_aggregates(STREET_DATA, NBHD_INDEX)
+    assert cube_row(aggregates) == 3
+    assert cube_row(aggregates, 2) == 2
+    assert cube_row(aggregates, 3) is None
+    assert cube_row(aggregates, -1) is None
+
+
+#################
+# flow_outliers #
+#################
+
+def test_output_flow_outliers():
+    """Check that outliers of each row and year match box_stats."""
+    aggregates = build_aggregates(STREET_DATA, NBHD_INDEX)
+    city = STREET_DATA.iloc[[0, 2, 3, 4]]
+    for col, year in enumerate(YEARS):
+        _, _, outliers = box_stats(city[str(year)].to_numpy(dtype=float))
+        assert flow_outliers(aggregates, 3, col).tolist() == \
+            outliers.tolist()
+        assert flow_outliers(aggregates, 1, col).tolist() == []
+
+
+################
+# metric_table #
+################
+
+def test_output_metric_table():
+    """Check metrics of each neighborhood and year."""
+    table = metric_table(build_aggregates(STREET_DATA, NBHD_INDEX, 3))
+    assert sorted(table) == sorted(METRICS)
+    assert table['median'].shape == (3, len(YEARS))
+    assert table['median'][0, 0] == 300
+    assert np.isnan(table['median'][1]).all()
+    assert table['density'][2, 0] == 200700 / 2
+    assert np.isnan(table['density'][1]).all()
+    assert table['arterial'].shape == (3, 1)
+    assert table['arterial'][[0, 2], 0].tolist() == [100 / 3, 50]
+
+
+####################
+# check_aggregates #
+####################
+
+def test_consistent_check_aggregates():
+    """Check that a cube built from the street data passes."""
+    check_aggregates(build_aggregates(STREET_DATA, NBHD_INDEX), STREET_DATA)
+
+
+def test_corrupted_check_aggregates():
+    """Check that any changed statistic is reported."""
+    for name, idx in [('segments', 1), ('count', (0, 3)), ('sum', (3, 0)),
+                      ('quantiles', (2, 5, 1)), ('speed', (0, 25)),
+                      ('road', (3, 5))]:
+        aggregates = build_aggregates(STREET_DATA, NBHD_INDEX)
+        aggregates[name][idx] += 1
+        with pytest.raises(ValueError, match=name):
+            check_aggregates(aggregates, STREET_DATA)
+
+
+###################
+# save_aggregates #
+###################
+
+def test_round_trip_save_aggregates(tmp_path):
+    """Check that cube is loaded back unchanged."""
+    aggregates = build_aggregates(STREET_DATA, NBHD_INDEX)
+    save_aggregates(tmp_path / 'aggregates.npz', aggregates)
+    loaded = load_aggregates(tmp_path / 'aggregates.npz')
+    for name in AGGREGATE_NAMES:
+        assert np.array_equal(loaded[name], aggregates[name], equal_nan=True)
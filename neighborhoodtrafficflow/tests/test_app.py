@@ -1,38 +1,85 @@
 """Test module for dashboard manager."""
-from neighborhoodtrafficflow.app import \
-    update_road_map_title, update_flow_count_title, \
-    update_speed_limit_title, update_road_type_title, \
-    update_dropdown, update_slider, update_neighborhood_map, \
-    update_road_map, update_traffic_flow_counts, update_speed_limits, \
-    update_road_types
-
-
-#########################
-# update section titles #
-#########################
-
-def test_update_road_map_title():
-    """Check output string."""
-    output = update_road_map_title(0)
-    assert output[-23:-4] == 'West Woodland Roads'
-
-
-def test_update_flow_count_title():
-    """Check output string."""
-    output = update_flow_count_title(0)
-    assert output[-29:-4] == 'West Woodland Flow Counts'
+import gzip
+import json
+from pathlib import Path
 
-
-def test_update_speed_limit_title():
-    """Test output string."""
-    output = update_speed_limit_title(0)
-    assert output[-30:-4] == 'West Woodland Speed Limits'
-
-
-def test_update_road_type_title():
-    """Test output string."""
-    output = update_road_type_title(0)
-    assert output[-28:-4] == 'West Woodland Road Types'
+from neighborhoodtrafficflow import app
+from neighborhoodtrafficflow.app import \
+    update_dropdown, update_neighborhood, update_road_map, road_map_view, \
+    request_key, APP, UPDATE_PATH, NAMES, NBHD_CLIENT_DATA, NBHD_METRIC_DATA
+from neighborhoodtrafficflow.figures.cache import figure_key
+from neighborhoodtrafficflow.figures.store import \
+    ENCODINGS, outputs_response, response_file
+
+# Example callback request body of road map
+ROAD_MAP_BODY = {
+    'output': '..roadMapFigure.figure...roadMapLevel.data..',
+    'inputs': [{'id': 'dropdown', 'property': 'value', 'value': 92},
+               {'id': 'radio', 'property': 'value', 'value': 'flow'},
+               {'id': 'slider', 'property': 'value', 'value': 2018},
+               {'id': 'roadMapFigure', 'property': 'relayoutData',
+                'value': None}],
+    'state': [{'id': 'roadMapLevel', 'property': 'data', 'value': None}],
+    'changedPropIds': ['dropdown.value']
+}
+
+# Example relayout data of road map zoomed in on a block
+ZOOMED = {'xaxis.range[0]': -122.31, 'xaxis.range[1]': -122.309,
+          'yaxis.range[0]': 47.660, 'yaxis.range[1]': 47.661}
+
+
+#######################
+# update neighborhood #
+#######################
+
+def test_figures_update_neighborhood():
+    """Check figure types."""
+    outputs = json.loads(update_neighborhood(92))['response']
+    assert len(outputs) == 3
+    for idx, trace_type in [('flowCountFigure', 'box'),
+                            ('speedLimitFigure', 'bar'),
+                            ('roadTypeFigure', 'bar')]:
+        assert outputs[idx]['figure']['data'][0]['type'] == trace_type
+
+
+########################
+# clientside callbacks #
+########################
+
+def test_clientside_callbacks():
+    """Check that titles, slider, and neighborhood map run in the browser."""
+    with open(Path(app.__file__).parent / 'assets/clientside.js') as js_file:
+        script = js_file.read()
+    outputs = ['roadMapTitle.children', 'sliderContainer.style',
+               'neighborhoodMapFigure.figure']
+    for output in outputs:
+        callback_id = [idx for idx in APP.callback_map if output in idx][0]
+        function = APP.callback_map[callback_id]['clientside_function']
+        assert function['namespace'] == 'neighborhood'
+        assert function['function_name'] + ': function(' in script
+
+
+def test_nbhd_client_data():
+    """Check that names and centroids of every neighborhood are shipped."""
+    assert NBHD_CLIENT_DATA['names'] == list(NAMES)
+    assert len(NBHD_CLIENT_DATA['lon']) == len(NAMES)
+    assert len(NBHD_CLIENT_DATA['lat']) == len(NAMES)
+
+
+def test_nbhd_metric_data():
+    """Check that metrics are shipped as one vector per year."""
+    assert sorted(NBHD_METRIC_DATA['values']) == \
+        sorted(NBHD_METRIC_DATA['labels'])
+    for values in NBHD_METRIC_DATA['values'].values():
+        assert len(values) in [1, len(NBHD_METRIC_DATA['years'])]
+        assert all(len(column) == len(NAMES) for column in values)
+    json.dumps(NBHD_METRIC_DATA, allow_nan=False)
+    inputs = [idx for idx in APP.callback_map
+              if 'neighborhoodMapFigure.figure' in idx]
+    assert APP.callback_map[inputs[0]]['inputs'] == [
+        {'id': 'dropdown', 'property': 'value'},
+        {'id': 'metric', 'property': 'value'},
+        {'id': 'slider', 'property': 'value'}]
 
 
 #########################
@@ -52,51 +99,90 @@ def test_example_update_dropdown():
     assert value[-4:-3] == '0'
 
 
-def test_flow_update_slider():
-    """Test flow output."""
-    output = update_slider('flow')
-    assert output[-11:-5] == 'inline'
-
-
-def test_other_update_slider():
-    """Test non-flow output."""
-    output = update_slider('dummy')
-    assert output[-9:-5] == 'none'
-
-
-###############
-# update maps #
-###############
-
-def test_type_update_neighborhood_map():
-    """Test output type."""
-    figure = update_neighborhood_map(92)
-    assert figure[54:70] == 'choroplethmapbox'
-
+###################
+# update road map #
+###################
 
 def test_type_update_road_map():
     """Test output type."""
-    figure = update_road_map(92, 'flow', 2018)
-    assert figure[54:63] == 'scattergl'
-
-
-#################
-# update charts #
-#################
-
-def test_type_update_traffic_flow_counts():
-    """Test output type."""
-    figure = update_traffic_flow_counts(92)
-    assert figure[54:57] == 'box'
-
-
-def test_type_update_speed_limits():
-    """Test output type."""
-    figure = update_speed_limits(92)
-    assert figure[54:63] == 'histogram'
-
-
-def test_type_update_road_types():
-    """Test output type."""
-    figure = update_road_types(92)
-    assert figure[54:63] == 'histogram'
+    outputs = json.loads(update_road_map(92, 'flow', 2018))['response']
+    assert outputs['roadMapFigure']['figure']['data'][0]['type'] == \
+        'scattergl'
+    assert outputs['roadMapLevel']['data'] == road_map_view(92)
+
+
+def test_zoom_update_road_map():
+    """Check that zooming updates the road map only for another level."""
+    client = APP.server.test_client()
+    view = road_map_view(92)
+    body = dict(ROAD_MAP_BODY, changedPropIds=['roadMapFigure.relayoutData'])
+    body['inputs'] = ROAD_MAP_BODY['inputs'][:3] + [
+        {'id': 'roadMapFigure', 'property': 'relayoutData', 'value': ZOOMED}]
+    body['state'] = [{'id': 'roadMapLevel', 'property': 'data',
+                      'value': view}]
+    output = client.post(UPDATE_PATH, json=body)
+    assert output.status_code == 200
+    level = output.get_json()['response']['roadMapLevel']['data']['level']
+    assert level < view['level']
+    body['state'][0]['value'] = dict(view, level=level)
+    assert client.post(UPDATE_PATH, json=body).status_code == 204
+
+
+def test_road_map_view():
+    """Check that level follows zoom and is kept per neighborhood."""
+    default = road_map_view(92)
+    assert default['neighborhood'] == 92
+    zoomed = road_map_view(92, ZOOMED, default, zoomed=True)
+    assert zoomed['level'] == 0 < default['level']
+    assert road_map_view(92, ZOOMED, zoomed) == zoomed
+    assert road_map_view(0, ZOOMED, zoomed) == road_map_view(0)
+
+
+####################
+# stored responses #
+####################
+
+def test_request_key():
+    """Check keys of road map, neighborhood, and other requests."""
+    assert request_key(ROAD_MAP_BODY) == \
+        figure_key('road_map', 92, 'flow', 2018)
+    output = [idx for idx in APP.callback_map if 'roadTypeFigure' in idx][0]
+    nbhd_body = {'output': output, 'inputs': ROAD_MAP_BODY['inputs'][:1]}
+    assert request_key(nbhd_body) == figure_key('neighborhood', 92)
+    assert request_key({'output': 'sliderContainer.style'}) is None
+    cleared_body = {'output': output,
+                    'inputs': [{'id': 'dropdown', 'property': 'value'}]}
+    assert request_key(cleared_body) is None
+    zoomed_body = dict(ROAD_MAP_BODY,
+                       changedPropIds=['roadMapFigure.relayoutData'])
+    assert request_key(zoomed_body) is None
+    view = road_map_view(92, ZOOMED, zoomed=True)
+    kept_body = dict(ROAD_MAP_BODY, state=[
+        {'id': 'roadMapLevel', 'property': 'data', 'value': view}])
+    assert request_key(kept_body) is None
+
+
+def test_serve_stored_response(tmp_path, monkeypatch):
+    """Check that stored response is served without running callback."""
+    key = figure_key('road_map', 92, 'flow', 2018)
+    response = outputs_response({'roadMapFigure': {'figure': {
+        'data': [], 'layout': {'title': 'Stored'}}}})
+    with open(tmp_path / response_file(key), 'wb') as data_file:
+        data_file.write(response)
+    for encoding, (_, compress) in ENCODINGS.items():
+        with open(tmp_path / response_file(key, encoding), 'wb') as data_file:
+            data_file.write(compress(response))
+    monkeypatch.setattr(app, 'FIGURE_STORE', tmp_path)
+    client = APP.server.test_client()
+
+    output = client.post(UPDATE_PATH, json=ROAD_MAP_BODY,
+                         headers={'Accept-Encoding': 'identity'})
+    assert output.status_code == 200
+    assert 'Content-Encoding' not in output.headers
+    assert output.data == response
+
+    output = client.post(UPDATE_PATH, json=ROAD_MAP_BODY,
+                         headers={'Accept-Encoding': 'gzip, deflate'})
+    assert output.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in output.headers['Vary']
+    assert gzip.decompress(output.data) == response
@@ -0,0 +1,118 @@
+"""Test module for figure cache."""
+import threading
+
+import numpy as np
+
+from neighborhoodtrafficflow.figures.cache import \
+    FigureCache, figure_key, figure_size
+
+# Example figure
+FIGURE = {'data': [{'type': 'bar', 'x': np.arange(3), 'y': [1, 2, 3]}],
+          'layout': {'title': 'Example'}}
+
+
+##############
+# figure_key #
+##############
+
+def test_year_figure_key():
+    """Check that year only keys flow maps."""
+    assert figure_key('road_map', 92, 'flow', 2018) != \
+        figure_key('road_map', 92, 'flow', 2017)
+    assert figure_key('road_map', 92, 'speed', 2018) == \
+        figure_key('road_map', 92, 'speed', 2017)
+    assert figure_key('speed_limits', 92) == \
+        ('speed_limits', 92, None, None)
+
+
+def test_type_figure_key():
+    """Check that numpy integers give the same key as ints."""
+    assert figure_key('road_map', np.int64(92), 'flow', np.int64(2018)) == \
+        figure_key('road_map', 92, 'flow', 2018)
+
+
+###############
+# figure_size #
+###############
+
+def test_figure_size():
+    """Check that figures with numpy arrays are sized."""
+    assert figure_size(FIGURE) > 0
+
+
+def test_sample_figure_size():
+    """Check that long lists are sized from a sample."""
+    assert figure_size(['ab'] * 1000) == 2000
+    assert figure_size(np.array(['ab'] * 1000)) == 2000
+    assert figure_size(np.zeros(1000)) == 8000
+
+
+###############
+# FigureCache #
+###############
+
+def test_hit_get_or_build():
+    """Check that figure is built once and then returned from cache."""
+    cache = FigureCache()
+    calls = []
+    for _ in range(3):
+        figure = cache.get_or_build(
+            ('key',), lambda: calls.append(1) or FIGURE)
+    assert figure is FIGURE
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (2, 1, 1)
+    assert stats['size'] == figure_size(FIGURE)
+
+
+def test_evict_put():
+    """Check that least recently used figure is evicted."""
+    size = figure_size(FIGURE)
+    cache = FigureCache(max_bytes=2 * size)
+    cache.put(1, FIGURE)
+    cache.put(2, FIGURE)
+    cache.get(1)
+    cache.put(3, FIGURE)
+    assert cache.get(2) is None
+    assert cache.get(1) is FIGURE
+    assert cache.get(3) is FIGURE
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['size'] == 2 * size
+
+
+def test_replace_put():
+    """Check that replacing a figure does not count its size twice."""
+    cache = FigureCache()
+    cache.put(1, FIGURE, size=10)
+    cache.put(1, FIGURE, size=20)
+    assert len(cache) == 1
+    assert cache.stats()['size'] == 20
+
+
+def test_too_large_put():
+    """Check that figures larger than the cache are not cached."""
+    cache = FigureCache(max_bytes=10)
+    cache.put(1, FIGURE, size=5)
+    cache.put(2, FIGURE, size=11)
+    assert cache.get(2) is None
+    assert cache.get(1) is FIGURE
+
+
+def test_threads_get_or_build():
+    """Check that counts and size are consistent across threads."""
+    max_bytes = 5 * figure_size(FIGURE)
+    cache = FigureCache(max_bytes=max_bytes)
+
+    def worker():
+        for idx in range(200):
+            cache.get_or_build(idx % 20, lambda: FIGURE)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert stats['hits'] + stats['misses'] == 8 * 200
+    assert stats['size'] == len(cache) * figure_size(FIGURE)
+    assert stats['size'] <= max_bytes
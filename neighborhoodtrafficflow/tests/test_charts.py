@@ -1,9 +1,151 @@
 """Test module for generating charts."""
+import numpy as np
+import pandas as pd
 import pytest
 
+from neighborhoodtrafficflow.data.aggregates import \
+    build_aggregates, hazen_percentiles
+from neighborhoodtrafficflow.data.neighborhood_index import \
+    build_nbhd_index, select_nbhd
 from neighborhoodtrafficflow.figures.charts import \
+    box_sample, flow_boxes, bin_percents, count_percents, \
     traffic_flow_counts, speed_limits, road_types
 
+# Example street data
+STREET_DATA = pd.DataFrame({
+    'speed': [25, -1, 35, 40],
+    'road': [0, 1, 5, 2],
+    'nbhd': [[4, 28], [28], [], [4]],
+    **{str(year): [100 * year, -1, 2000, 300] for year in range(2007, 2019)}
+})
+NBHD_INDEX = build_nbhd_index(STREET_DATA['nbhd'])
+AGGREGATES = build_aggregates(STREET_DATA, NBHD_INDEX)
+
+
+def box_stats(values):
+    """Get quartiles, fences, and sorted outliers of box plot as Plotly."""
+    values = np.sort(values)
+    q1, median, q3 = hazen_percentiles(values, [25, 50, 75])
+    lower = min(q1, values[values >= q1 - 1.5 * (q3 - q1)][0])
+    upper = max(q3, values[values <= q3 + 1.5 * (q3 - q1)][-1])
+    outliers = values[(values < lower) | (values > upper)]
+    return [q1, median, q3, lower, upper], outliers.tolist()
+
+
+##############
+# box_sample #
+##############
+
+def test_stats_box_sample():
+    """Check that summary has the same box plot as the values."""
+    rng = np.random.default_rng(0)
+    for values in [rng.lognormal(0, 1, 5000), rng.normal(0, 1, 999),
+                   rng.integers(0, 4, 300).astype(float),
+                   np.arange(7.0)]:
+        sample = box_sample(values)
+        stats, outliers = box_stats(values)
+        sample_stats, sample_outliers = box_stats(sample)
+        assert np.allclose(sample_stats, stats)
+        assert sample_outliers == outliers
+    assert len(box_sample(rng.normal(0, 1, 5000))) < 250
+
+
+def test_small_box_sample():
+    """Check that values are kept if no summary is smaller."""
+    assert box_sample([3, 1, 2]).tolist() == [3, 1, 2]
+    assert box_sample([]).tolist() == []
+
+
+##############
+# flow_boxes #
+##############
+
+def test_flow_boxes():
+    """Check that each year is summarized without missing counts."""
+    x_data, y_data = flow_boxes(STREET_DATA)
+    assert x_data[:3] == [2007, 2007, 2007]
+    assert y_data[:3] == [200700, 2000, 300]
+    assert len(y_data) == 3 * 12
+
+
+################
+# bin_percents #
+################
+
+def test_bin_percents():
+    """Check that percents of values are counted without missing values."""
+    x_data, y_data = bin_percents(STREET_DATA['speed'])
+    assert x_data == [25, 35, 40]
+    assert np.allclose(y_data, [100 / 3] * 3)
+    assert bin_percents(pd.Series([-1, -1])) == ([], [])
+
+
+##################
+# count_percents #
+##################
+
+def test_count_percents():
+    """Check that counts match percents binned from values."""
+    counts = np.bincount([25, 35, 40])
+    assert count_percents(counts) == bin_percents(STREET_DATA['speed'])
+    assert count_percents(np.zeros(3, dtype=int)) == ([], [])
+    assert count_percents(None) == ([], [])
+
+
+##############
+# aggregates #
+##############
+
+def test_aggregates_charts():
+    """Check that charts read from the cube match the street data."""
+    for neighborhood in [4, 28]:
+        for chart in [speed_limits, road_types]:
+            assert str(chart(STREET_DATA, neighborhood, NBHD_INDEX)) == \
+                str(chart(STREET_DATA, neighborhood,
+                          aggregates=AGGREGATES))
+        figure = traffic_flow_counts(STREET_DATA, neighborhood, NBHD_INDEX)
+        cube_figure = traffic_flow_counts(STREET_DATA, neighborhood,
+                                          aggregates=AGGREGATES)
+        for trace, cube_trace in zip(figure['data'], cube_figure['data']):
+            assert sorted(set(cube_trace['x'])) == sorted(set(trace['x']))
+            for year in set(trace['x']):
+                values = [y for x, y in zip(trace['x'], trace['y'])
+                          if x == year]
+                cube_values = [y for x, y in zip(cube_trace['x'],
+                                                 cube_trace['y'])
+                               if x == year]
+                stats, outliers = box_stats(np.array(values, dtype=float))
+                cube_stats, cube_outliers = box_stats(np.array(cube_values))
+                assert np.allclose(cube_stats, stats)
+                assert cube_outliers == outliers
+
+
+def test_missing_aggregates_charts():
+    """Check that neighborhoods not in the cube have empty traces."""
+    for chart in [traffic_flow_counts, speed_limits, road_types]:
+        figure = chart(STREET_DATA, 99, aggregates=AGGREGATES)
+        assert figure['data'][0]['x']
+        assert figure['data'][1]['x'] == []
+
+
+##########
+# binned #
+##########
+
+def test_binned_charts():
+    """Check that bars have the percents of browser-binned histograms."""
+    for chart, column in [(speed_limits, 'speed'), (road_types, 'road')]:
+        histogram = chart(STREET_DATA, 4, NBHD_INDEX, binned=False)
+        bars = chart(STREET_DATA, 4, NBHD_INDEX)
+        for hist_trace, bar_trace in zip(histogram['data'], bars['data']):
+            assert hist_trace['type'] == 'histogram'
+            assert bar_trace['type'] == 'bar'
+            values = pd.Series(hist_trace['x'])
+            assert bar_trace['x'] == sorted(set(hist_trace['x']))
+            assert np.allclose(bar_trace['y'], [
+                100 * (values == value).mean() for value in bar_trace['x']])
+        assert len(bars['data'][0]['x']) <= len(STREET_DATA[column])
+
 
 def test_dataframe_type_traffic_flow_counts():
     """Ensure function breaks if not given a dataframe."""
@@ -21,3 +163,37 @@ def test_dataframe_type_road_types():
     """Ensure function breaks if not given a dataframe."""
     with pytest.raises(TypeError):
         road_types("STREET_DATA")
+
+
+def test_nbhd_index_traffic_flow_counts():
+    """Check that index and search give the same chart."""
+    for neighborhood in [4, 28, 92]:
+        assert str(traffic_flow_counts(STREET_DATA, neighborhood)) == \
+            str(traffic_flow_counts(STREET_DATA, neighborhood, NBHD_INDEX))
+    figure = traffic_flow_counts(STREET_DATA, 4, NBHD_INDEX)
+    assert figure['data'][1]['y'][:2] == [200700, 300]
+
+
+def test_nbhd_index_speed_limits():
+    """Check that index and search give the same chart."""
+    for neighborhood in [4, 28, 92]:
+        assert str(speed_limits(STREET_DATA, neighborhood)) == \
+            str(speed_limits(STREET_DATA, neighborhood, NBHD_INDEX))
+    assert speed_limits(STREET_DATA, 28, NBHD_INDEX)['data'][1]['x'] == [25]
+
+
+def test_nbhd_index_road_types():
+    """Check that index and search give the same chart."""
+    for neighborhood in [4, 28, 92]:
+        assert str(road_types(STREET_DATA, neighborhood)) == \
+            str(road_types(STREET_DATA, neighborhood, NBHD_INDEX))
+    assert road_types(STREET_DATA, 28, NBHD_INDEX)['data'][1]['x'] == [0, 1]
+
+
+def test_nbhd_frame_charts():
+    """Check that a shared neighborhood selection gives the same charts."""
+    for neighborhood in [4, 28, 92]:
+        nbhd_frame = select_nbhd(STREET_DATA, neighborhood, NBHD_INDEX)
+        for chart in [traffic_flow_counts, speed_limits, road_types]:
+            assert str(chart(STREET_DATA, neighborhood, NBHD_INDEX)) == \
+                str(chart(STREET_DATA, neighborhood, nbhd_frame=nbhd_frame))
@@ -0,0 +1,177 @@
+"""Test module for flat street segment coordinate storage."""
+import os
+
+import numpy as np
+import pytest
+
+from neighborhoodtrafficflow.data.geometry import \
+    LOD_TOLERANCES, METERS_PER_DEGREE, pack_coords, segment_coords, \
+    simplify_segment, build_lod, lod_level, save_coords, load_coords, \
+    save_lod, load_lod
+
+# Example coordinates
+LON_LIST = [[-122.30, -122.31, -122.32], [], [-122.33, -122.34]]
+LAT_LIST = [[47.60, 47.61, 47.62], [], [47.63, 47.64]]
+COORDS_PATH = 'street_coords.npz'
+LOD_PATH = 'street_lod.npz'
+
+# Example curved segment, a quarter circle of radius 100 m
+ANGLES = np.linspace(0, np.pi / 2, 50)
+CURVE_LON = -122.30 + 100 * np.cos(ANGLES) / \
+    (METERS_PER_DEGREE * np.cos(np.radians(47.60)))
+CURVE_LAT = 47.60 + 100 * np.sin(ANGLES) / METERS_PER_DEGREE
+
+
+def max_deviation(lon, lat, keep):
+    """Get distance (m) of removed vertices from the simplified line."""
+    x_m = lon * METERS_PER_DEGREE * np.cos(np.radians(np.mean(lat)))
+    y_m = lat * METERS_PER_DEGREE
+    fine = np.column_stack([np.interp(np.arange(len(lon)), keep, x_m[keep]),
+                            np.interp(np.arange(len(lon)), keep, y_m[keep])])
+    return np.hypot(fine[:, 0] - x_m, fine[:, 1] - y_m).max()
+
+
+###############
+# pack_coords #
+###############
+
+def test_output_pack_coords():
+    """Check flat arrays and offsets."""
+    coords = pack_coords(LON_LIST, LAT_LIST)
+    assert coords['offsets'].tolist() == [0, 3, 3, 5]
+    assert coords['lon'].tolist() == [-122.30, -122.31, -122.32,
+                                      -122.33, -122.34]
+    assert coords['lat'].dtype == float
+    assert coords['offsets'].dtype == np.int64
+
+
+def test_length_pack_coords():
+    """Ensure function breaks if lon and lat lengths differ."""
+    with pytest.raises(ValueError):
+        pack_coords([[1.0, 2.0]], [[1.0]])
+
+
+def test_empty_pack_coords():
+    """Check output with no street segments."""
+    coords = pack_coords([], [])
+    assert coords['offsets'].tolist() == [0]
+    assert len(coords['lon']) == 0
+
+
+##################
+# segment_coords #
+##################
+
+def test_output_segment_coords():
+    """Check coordinates of each segment."""
+    coords = pack_coords(LON_LIST, LAT_LIST)
+    for row in range(3):
+        lon, lat = segment_coords(coords, row)
+        assert lon.tolist() == LON_LIST[row]
+        assert lat.tolist() == LAT_LIST[row]
+
+
+def test_view_segment_coords():
+    """Check that segments are views, not copies."""
+    coords = pack_coords(LON_LIST, LAT_LIST)
+    lon, lat = segment_coords(coords, 2)
+    assert np.shares_memory(lon, coords['lon'])
+    assert np.shares_memory(lat, coords['lat'])
+
+
+####################
+# simplify_segment #
+####################
+
+def test_tolerance_simplify_segment():
+    """Check that fewer vertices are kept at larger tolerances."""
+    counts = [len(simplify_segment(CURVE_LON, CURVE_LAT, tolerance))
+              for tolerance in [0, 0.1, 1, 10, 1000]]
+    assert counts[0] == 50
+    assert counts == sorted(counts, reverse=True)
+    assert counts[-1] == 2
+
+
+def test_endpoints_simplify_segment():
+    """Check that endpoints are kept and vertices stay in order."""
+    for tolerance in [0.1, 1, 10]:
+        keep = simplify_segment(CURVE_LON, CURVE_LAT, tolerance)
+        assert keep[0] == 0
+        assert keep[-1] == 49
+        assert np.all(np.diff(keep) > 0)
+
+
+def test_closed_simplify_segment():
+    """Check that closed loops are not collapsed to one point."""
+    lon = np.append(CURVE_LON, CURVE_LON[0])
+    lat = np.append(CURVE_LAT, CURVE_LAT[0])
+    assert len(simplify_segment(lon, lat, 1)) > 2
+
+
+#############
+# build_lod #
+#############
+
+def test_output_build_lod():
+    """Check that each level shares endpoints and stays within tolerance."""
+    coords = pack_coords([CURVE_LON, [-122.30, -122.31]] + LON_LIST,
+                         [CURVE_LAT, [47.60, 47.61]] + LAT_LIST)
+    lod = build_lod(coords)
+    assert len(lod) == len(LOD_TOLERANCES)
+    assert lod[0] is coords
+    for level, tolerance in enumerate(LOD_TOLERANCES):
+        assert len(lod[level]['offsets']) == len(coords['offsets'])
+        assert len(segment_coords(lod[level], 3)[0]) == 0
+        for row in [0, 1, 2, 4]:
+            lon, lat = segment_coords(lod[level], row)
+            full_lon, full_lat = segment_coords(coords, row)
+            assert lon[[0, -1]].tolist() == full_lon[[0, -1]].tolist()
+            assert lat[[0, -1]].tolist() == full_lat[[0, -1]].tolist()
+        keep = np.flatnonzero(np.isin(CURVE_LON,
+                                      segment_coords(lod[level], 0)[0]))
+        assert max_deviation(CURVE_LON, CURVE_LAT, keep) <= tolerance + 1e-6
+    assert len(lod[-1]['lon']) < len(lod[1]['lon']) < len(coords['lon'])
+
+
+#############
+# lod_level #
+#############
+
+def test_output_lod_level():
+    """Check coarsest level finer than one pixel."""
+    assert lod_level(0.5, tolerances=[0, 1, 3]) == 0
+    assert lod_level(1, tolerances=[0, 1, 3]) == 1
+    assert lod_level(100, tolerances=[0, 1, 3]) == 2
+    assert lod_level(100, 2, [0, 1, 3]) == 1
+
+
+###############
+# save_coords #
+###############
+
+def test_round_trip_save_coords():
+    """Check coordinates are loaded back unchanged."""
+    coords = pack_coords(LON_LIST, LAT_LIST)
+    save_coords(COORDS_PATH, coords)
+    loaded = load_coords(COORDS_PATH)
+    for name in ['lon', 'lat', 'offsets']:
+        assert np.array_equal(loaded[name], coords[name])
+    os.remove(COORDS_PATH)
+
+
+############
+# save_lod #
+############
+
+def test_round_trip_save_lod():
+    """Check levels of detail are loaded back unchanged."""
+    coords = pack_coords([CURVE_LON] + LON_LIST, [CURVE_LAT] + LAT_LIST)
+    lod = build_lod(coords)
+    save_lod(LOD_PATH, lod)
+    loaded = load_lod(LOD_PATH, coords)
+    assert len(loaded) == len(lod)
+    assert loaded[0] is coords
+    for level in range(1, len(lod)):
+        for name in ['lon', 'lat', 'offsets']:
+            assert np.array_equal(loaded[level][name], lod[level][name])
+    os.remove(LOD_PATH)
@@ -0,0 +1,92 @@
+"""Test module for tracking raw dataset content hashes."""
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from neighborhoodtrafficflow.data.manifest import \
+    hash_path, read_manifest, write_manifest, get_stale, get_cache_file, \
+    load_cached, save_cached
+
+# File paths
+CWD = Path(__file__).parent
+RAW_PATH = CWD / '../data/raw/2007_Traffic_Flow_Counts'
+
+
+#############
+# hash_path #
+#############
+
+def test_exception_hash_path():
+    """Check that function throws an error if nothing at path."""
+    with pytest.raises(FileNotFoundError):
+        hash_path('dummy')
+
+
+def test_output_hash_path():
+    """Check hashes of directory and file."""
+    digest = hash_path(RAW_PATH)
+    assert isinstance(digest, str)
+    assert len(digest) == 64
+    assert digest == hash_path(RAW_PATH)
+    assert digest != hash_path(RAW_PATH / '2007_Traffic_Flow_Counts.shp')
+
+
+def test_change_hash_path(tmp_path):
+    """Check that hash changes with file contents."""
+    (tmp_path / 'data.txt').write_text('one')
+    digest = hash_path(tmp_path)
+    (tmp_path / 'data.txt').write_text('two')
+    assert hash_path(tmp_path) != digest
+
+
+############
+# manifest #
+############
+
+def test_missing_read_manifest(tmp_path):
+    """Check empty manifest if no file exists."""
+    assert read_manifest(tmp_path / 'manifest.json') == {}
+
+
+def test_round_trip_write_manifest(tmp_path):
+    """Check manifest is read back unchanged."""
+    manifest = {'street': 'abc', '2007': 'def'}
+    write_manifest(tmp_path / 'manifest.json', manifest)
+    assert read_manifest(tmp_path / 'manifest.json') == manifest
+
+
+#############
+# get_stale #
+#############
+
+def test_output_get_stale(tmp_path):
+    """Check changed and missing datasets are stale."""
+    old = {'a': '1', 'b': '2', 'c': '3', 'zillow': '0'}
+    new = {'a': '1', 'b': '9', 'c': '3', 'zillow': '0'}
+    save_cached(tmp_path, 'a', pd.DataFrame())
+    save_cached(tmp_path, 'b', pd.DataFrame())
+    stale = get_stale(old, new, ['a', 'b', 'c'], tmp_path,
+                      shared=['zillow'])
+    assert stale == ['b', 'c']
+
+
+def test_shared_get_stale(tmp_path):
+    """Check all datasets are stale if a shared input changed."""
+    old = {'a': '1', 'zillow': '0'}
+    new = {'a': '1', 'zillow': '9'}
+    save_cached(tmp_path, 'a', pd.DataFrame())
+    assert get_stale(old, new, ['a'], tmp_path, shared=['zillow']) == ['a']
+    assert get_stale(old, new, ['a'], tmp_path) == []
+
+
+##########
+# cached #
+##########
+
+def test_round_trip_save_cached(tmp_path):
+    """Check cached DataFrame is loaded back unchanged."""
+    data_frame = pd.DataFrame({'key': [1, 2], 'nbhd': [[0], [1, 2]]})
+    save_cached(tmp_path / 'cache', '2007', data_frame)
+    assert get_cache_file(tmp_path / 'cache', '2007').exists()
+    assert load_cached(tmp_path / 'cache', '2007').equals(data_frame)
@@ -6,9 +6,13 @@ import numpy as np
 import pandas as pd
 import pytest
 
+from neighborhoodtrafficflow.data.geometry import pack_coords, build_lod
+from neighborhoodtrafficflow.data.neighborhood_index import build_nbhd_index
 from neighborhoodtrafficflow.figures.maps import \
-    matplotlib_to_plotly, neighborhood_map, road_map, road_color, \
-    hover_text
+    COLOR_BINS, LUT_SIZE, matplotlib_to_plotly, colormap_lut, \
+    neighborhood_map, road_map, road_map_level, merged_road_traces, \
+    color_bins, bin_color, hover_template, road_colors, road_color, \
+    hover_text, hover_texts
 
 # Import neighborhood data
 CWD = Path(__file__).parent
@@ -17,6 +21,10 @@ with open(NBHD_PATH, 'rb') as pickle_file:
     NBHD_DATA = pickle.load(pickle_file)
 STREET_DATA = pd.read_pickle(CWD / '../data/cleaned/street_data.pkl')
 
+# Example relayout data of a road map zoomed to a few blocks
+ZOOMED = {'xaxis.range[0]': -122.31, 'xaxis.range[1]': -122.309,
+          'yaxis.range[0]': 47.660, 'yaxis.range[1]': 47.661}
+
 
 ########################
 # matplotlib_to_plotly #
@@ -86,6 +94,19 @@ def test_example_neighborhood_map():
     assert figure['layout']['mapbox']['center'] == center
 
 
+def test_metric_neighborhood_map():
+    """Check that neighborhoods are colored by metric if given."""
+    z = np.arange(NBHD_DATA[0], dtype=float)
+    trace = neighborhood_map(*NBHD_DATA, z=z, title='Metric')['data'][0]
+    assert trace['z'] is z
+    assert trace['showscale']
+    assert trace['colorbar']['title'] == 'Metric'
+    assert trace['hoverinfo'] == 'text+z'
+    trace = neighborhood_map(*NBHD_DATA)['data'][0]
+    assert not trace['z'].any()
+    assert not trace['showscale']
+
+
 ############
 # road_map #
 ############
@@ -159,6 +180,205 @@ def test_road_road_map():
     assert figure['layout']['yaxis']['title'] == title
 
 
+def test_coords_road_map():
+    """Check flat coordinates match coordinate columns."""
+    coords = pack_coords(STREET_DATA['lon'], STREET_DATA['lat'])
+    figure = road_map(STREET_DATA)
+    figure_coords = road_map(STREET_DATA.drop(columns=['lon', 'lat']),
+                             coords=coords)
+    assert len(figure['data']) == len(figure_coords['data'])
+    for trace, trace_coords in zip(figure['data'], figure_coords['data']):
+        assert list(trace['x']) == list(trace_coords['x'])
+        assert list(trace['y']) == list(trace_coords['y'])
+
+
+def test_nbhd_index_road_map():
+    """Check that index and search give the same map."""
+    nbhd_index = build_nbhd_index(STREET_DATA['nbhd'])
+    for map_type in ['flow', 'speed', 'road']:
+        figure = road_map(STREET_DATA, 92, map_type)
+        figure_index = road_map(STREET_DATA, 92, map_type,
+                                nbhd_index=nbhd_index)
+        assert str(figure) == str(figure_index)
+
+
+def test_merge_road_map():
+    """Check that merged map has one trace per color bin."""
+    for map_type in ['flow', 'speed', 'road']:
+        figure = road_map(STREET_DATA, map_type=map_type)
+        figure_merged = road_map(STREET_DATA, map_type=map_type, merge=True)
+        assert str(figure_merged['data'][0]) == str(figure['data'][0])
+        assert figure_merged['layout'] == figure['layout']
+        colors = {trace['line']['color'] for trace in figure['data'][1:]}
+        assert len(figure_merged['data']) - 1 <= len(colors)
+        num_roads = sum(trace['x'].count(None)
+                        for trace in figure_merged['data'][1:])
+        assert num_roads == len(figure['data']) - 1
+
+
+def test_lod_road_map():
+    """Check that coarser levels of detail draw fewer points."""
+    coords = pack_coords(STREET_DATA['lon'], STREET_DATA['lat'])
+    lod = build_lod(coords)
+    figure = road_map(STREET_DATA, coords=coords)
+    assert figure['layout']['uirevision'] == 92
+    assert str(road_map(STREET_DATA, lod=lod, level=0)) == str(figure)
+    points = [sum(len(trace['x']) for trace in
+                  road_map(STREET_DATA, lod=lod, level=level)['data'])
+              for level in range(len(lod))]
+    assert points == sorted(points, reverse=True)
+    assert points[-1] < points[0]
+    figure_default = road_map(STREET_DATA, lod=lod)
+    assert str(figure_default) == str(road_map(
+        STREET_DATA, lod=lod, level=road_map_level(92)))
+
+
+##################
+# road_map_level #
+##################
+
+def test_zoom_road_map_level():
+    """Check that zooming in gives a finer level of detail."""
+    assert road_map_level(92) > road_map_level(92, ZOOMED) == 0
+    zoomed = {'xaxis.range': [-122.31, -122.309],
+              'yaxis.range': [47.660, 47.661]}
+    assert road_map_level(92, zoomed) == road_map_level(92, ZOOMED)
+    assert road_map_level(92, {'autosize': True}) == road_map_level(92)
+    assert road_map_level(92, num_levels=2) <= 1
+
+
+######################
+# merged_road_traces #
+######################
+
+def test_separators_merged_road_traces():
+    """Check that roads are separated by None in every trace."""
+    street_data = STREET_DATA.head(50)
+    for trace in merged_road_traces(street_data, 'speed'):
+        assert len(trace['x']) == len(trace['y']) == len(trace['customdata'])
+        assert trace['x'][-1] is None
+        separators = [idx for idx, lon in enumerate(trace['x'])
+                      if lon is None]
+        assert separators == [idx for idx, lat in enumerate(trace['y'])
+                              if lat is None]
+        assert all(trace['customdata'][idx] is None for idx in separators)
+
+
+def test_coords_merged_road_traces():
+    """Check that all road coordinates are kept."""
+    street_data = STREET_DATA.head(50)
+    coords = pack_coords(street_data['lon'], street_data['lat'])
+    traces = merged_road_traces(street_data, 'road', coords)
+    lon = sorted(x for trace in traces for x in trace['x'] if x is not None)
+    expected = sorted(round(x, 6) for row in street_data['lon'] for x in row)
+    assert lon == expected
+
+
+def test_customdata_merged_road_traces():
+    """Check hover data of each point."""
+    street_data = STREET_DATA.head(50).rename(columns={'2018': 'flow'})
+    hover = {hover_text(row['name'], row['flow'], 'flow')
+             for _, row in street_data.iterrows()}
+    for trace in merged_road_traces(street_data, 'flow'):
+        template = trace['hovertemplate'].replace('<extra></extra>', '')
+        for point in trace['customdata']:
+            if isinstance(point, list):
+                text = template.replace('%{customdata[0]}', point[0]) \
+                    .replace('%{customdata[1]}', str(point[1]))
+            elif point is not None:
+                text = template.replace('%{customdata}', point)
+            else:
+                continue
+            assert text in hover
+
+
+##############
+# color_bins #
+##############
+
+def test_flow_color_bins():
+    """Check traffic flow bins."""
+    bins = color_bins([-1, 0, 108179 / COLOR_BINS, 108179, 200000], 'flow')
+    assert bins.tolist() == [-1, 0, 1, COLOR_BINS - 1, COLOR_BINS - 1]
+
+
+def test_road_color_bins():
+    """Check road type bins."""
+    assert color_bins([0, 1, 5], 'road').tolist() == [0, 1, 5]
+
+
+#############
+# bin_color #
+#############
+
+def test_output_bin_color():
+    """Check colors of bins."""
+    assert bin_color(-1, 'flow') == 'rgb(192,192,192)'
+    assert bin_color(1, 'road') == road_color(1, 'road')
+    assert bin_color(0, 'speed') == road_color(60 / COLOR_BINS / 2, 'speed')
+
+
+##################
+# hover_template #
+##################
+
+def test_output_hover_template():
+    """Check templates match hover text."""
+    assert hover_template('speed', 30) == \
+        hover_text('%{customdata}', 30, 'speed') + '<extra></extra>'
+    assert hover_template('road', 4) == \
+        '%{customdata}, Road Type: State Highway<extra></extra>'
+    assert hover_template('flow') == \
+        '%{customdata[0]}, Flow Count: %{customdata[1]}<extra></extra>'
+    assert hover_template('flow', -1) == \
+        '%{customdata}, Flow Count: Unknown<extra></extra>'
+
+
+################
+# colormap_lut #
+################
+
+def test_output_colormap_lut():
+    """Check size and end colors of lookup table."""
+    lut = colormap_lut('viridis')
+    assert len(lut) == LUT_SIZE
+    assert lut[0] == 'rgb(0.267004,0.004874,0.329415)'
+    assert lut[-1] == 'rgb(0.993248,0.906157,0.143936)'
+
+
+###############
+# road_colors #
+###############
+
+def test_flow_road_colors():
+    """Check that colors match road_color for every value."""
+    values = np.array([-1, 0, 500, 54000, 108179, 200000])
+    colors = road_colors(values, 'flow')
+    assert colors.tolist() == [road_color(val, 'flow') for val in values]
+
+
+def test_bad_road_colors():
+    """Check grey for unknown values."""
+    colors = road_colors(np.array([-1, np.nan, 30]), 'speed')
+    assert colors[0] == colors[1] == 'rgb(192,192,192)'
+    assert colors[2] != 'rgb(192,192,192)'
+
+
+def test_road_road_colors():
+    """Check black for principal arterials."""
+    colors = road_colors(np.arange(6), 'road')
+    assert colors[1] == 'rgb(0.000000,0.000000,0.000000)'
+    assert colors[0] == 'rgb(0.121569,0.466667,0.705882)'
+    assert colors[5] == 'rgb(0.549020,0.337255,0.294118)'
+    assert len(set(colors)) == 6
+
+
+def test_type_road_colors():
+    """Ensure function breaks if given wrong map type."""
+    with pytest.raises(KeyError):
+        road_colors(np.array([0]), 'dummy')
+
+
 ##############
 # road_color #
 ##############
@@ -185,6 +405,7 @@ def test_road_road_color():
     assert road_color(-1, 'road') == 'rgb(192,192,192)'
     assert road_color(0, 'road') == 'rgb(0.121569,0.466667,0.705882)'
     assert road_color(5, 'road') == 'rgb(0.549020,0.337255,0.294118)'
+    assert road_color(1, 'road') == 'rgb(0.000000,0.000000,0.000000)'
 
 
 ##############
@@ -217,3 +438,43 @@ def test_road_hover_text():
         text = 'Dummy, Road Type: ' + road_type[i]
         test_text = hover_text('Dummy', i, 'road')
         assert test_text == text
+
+
+###############
+# hover_texts #
+###############
+
+def test_flow_hover_texts():
+    """Check that texts match hover_text."""
+    names = ['Pine St', '1st Ave', 'Main St']
+    values = np.array([-1, 1200, 55.7])
+    assert hover_texts(names, values, 'flow').tolist() == \
+        [hover_text(name, val, 'flow') for name, val in zip(names, values)]
+
+
+def test_speed_hover_texts():
+    """Check that texts match hover_text."""
+    names = ['Pine St', '1st Ave']
+    assert hover_texts(names, [-1, 30], 'speed').tolist() == \
+        ['Pine St, Speed Limit: Unknown', '1st Ave, Speed Limit: 30mph']
+
+
+def test_road_hover_texts():
+    """Check that texts match hover_text."""
+    names = ['Pine St', '1st Ave']
+    assert hover_texts(names, [0, 5], 'road').tolist() == \
+        ['Pine St, Road Type: Not Designated',
+         '1st Ave, Road Type: Interstate Freeway']
+    with pytest.raises(KeyError):
+        hover_texts(names, [0, 6], 'road')
+
+
+def test_city_hover_texts():
+    """Check that texts match hover_text for all roads."""
+    for map_type, column in [('flow', '2018'), ('speed', 'speed'),
+                             ('road', 'road')]:
+        texts = hover_texts(STREET_DATA['name'], STREET_DATA[column],
+                            map_type)
+        assert texts.tolist() == [
+            hover_text(name, val, map_type)
+            for name, val in zip(STREET_DATA['name'], STREET_DATA[column])]
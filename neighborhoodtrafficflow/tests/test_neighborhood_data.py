@@ -7,7 +7,9 @@ import pandas as pd
 import pytest
 
 from neighborhoodtrafficflow.data.neighborhood_data import \
-    prep_map_data, prep_map_info
+    prep_map_data, prep_map_info, prep_map_tables
+from neighborhoodtrafficflow.data.storage import \
+    read_table, frame_to_nbhd_data
 
 # File paths
 CWD = Path(__file__).parent
@@ -15,6 +17,8 @@ JSON_PATH = CWD / '../data/raw/zillow-neighborhoods/' \
     'zillow-neighborhoods.geojson'
 SHP_PATH = CWD / '../data/raw/zillow-neighborhoods/' \
     'zillow-neighborhoods.shp'
+CLEANED_DATA_PATH = CWD / '../data/cleaned/nbhd_data.pkl'
+CLEANED_INFO_PATH = CWD / '../data/cleaned/nbhd_info.csv'
 DATA_PATH = 'nbhd_data.pkl'
 INFO_PATH = 'nbhd_info.csv'
 
@@ -209,3 +213,34 @@ def test_entries_prep_map_info():
 
     # Delete new data file
     os.remove(INFO_PATH)
+
+
+###################
+# prep_map_tables #
+###################
+
+def test_no_file_prep_map_tables(tmp_path):
+    """Check that function throws an error if no file at data_path."""
+    with pytest.raises(FileNotFoundError):
+        prep_map_tables('dummy.pkl', CLEANED_INFO_PATH,
+                        tmp_path / 'data.parquet', tmp_path / 'info.parquet')
+
+
+def test_entries_prep_map_tables(tmp_path):
+    """Check that tables hold the same data as the cleaned files."""
+    data_table_path = tmp_path / 'data.parquet'
+    info_table_path = tmp_path / 'info.parquet'
+    prep_map_tables(CLEANED_DATA_PATH, CLEANED_INFO_PATH,
+                    data_table_path, info_table_path)
+
+    # Check neighborhood data
+    with open(CLEANED_DATA_PATH, 'rb') as pickle_file:
+        nbhd_data = pickle.load(pickle_file)
+    assert frame_to_nbhd_data(read_table(data_table_path)) == nbhd_data
+
+    # Check neighborhood info and column projection
+    nbhd_info = pd.read_csv(CLEANED_INFO_PATH)
+    assert read_table(info_table_path).equals(nbhd_info)
+    names = read_table(info_table_path, columns=['name'])
+    assert names.columns.to_list() == ['name']
+    assert names['name'].to_list() == nbhd_info['name'].to_list()
@@ -0,0 +1,143 @@
+"""Test module for indexing street segments by neighborhood."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from neighborhoodtrafficflow.data.neighborhood_index import \
+    NBHD_WORDS, build_nbhd_index, nbhd_rows, nbhd_bits_mask, in_any_nbhd, \
+    in_all_nbhd, select_nbhd, save_nbhd_index, load_nbhd_index
+
+# Example street data
+NBHD_LISTS = [[4, 28], [], [7], [4], [28, 28]]
+STREET_DATA = pd.DataFrame({'speed': [25, 30, 35, 40, 20],
+                            'nbhd': NBHD_LISTS})
+INDEX_PATH = 'nbhd_index.npz'
+
+
+####################
+# build_nbhd_index #
+####################
+
+def test_output_build_nbhd_index():
+    """Check offsets and rows."""
+    nbhd_index = build_nbhd_index(NBHD_LISTS)
+    assert len(nbhd_index['offsets']) == 30
+    assert nbhd_index['rows'].tolist() == [0, 3, 2, 0, 4]
+    assert nbhd_index['offsets'][[0, 4, 5, 7, 8, 28, 29]].tolist() == \
+        [0, 0, 2, 2, 3, 3, 5]
+
+
+def test_bits_build_nbhd_index():
+    """Check bitset of each segment."""
+    bits = build_nbhd_index(NBHD_LISTS)['bits']
+    assert bits.shape == (5, NBHD_WORDS)
+    assert bits.dtype == np.uint64
+    assert bits[:, 0].tolist() == [2**4 + 2**28, 0, 2**7, 2**4, 2**28]
+    assert not bits[:, 1].any()
+    bits = build_nbhd_index([[64, 102], [200]])['bits']
+    assert bits.shape == (2, 4)
+    assert bits[0].tolist() == [0, 2**0 + 2**38, 0, 0]
+    assert bits[1].tolist() == [0, 0, 0, 2**8]
+
+
+def test_num_nbhds_build_nbhd_index():
+    """Check that offsets cover all neighborhoods."""
+    assert len(build_nbhd_index(NBHD_LISTS, 103)['offsets']) == 104
+    assert len(build_nbhd_index(NBHD_LISTS, 2)['offsets']) == 30
+    assert build_nbhd_index([], 3)['offsets'].tolist() == [0, 0, 0, 0]
+
+
+#############
+# nbhd_rows #
+#############
+
+def test_output_nbhd_rows():
+    """Check rows of each neighborhood."""
+    nbhd_index = build_nbhd_index(NBHD_LISTS)
+    for neighborhood in range(30):
+        rows = [row for row, nbhd in enumerate(NBHD_LISTS)
+                if neighborhood in nbhd]
+        assert nbhd_rows(nbhd_index, neighborhood).tolist() == rows
+
+
+def test_out_of_range_nbhd_rows():
+    """Check that unknown neighborhoods have no rows."""
+    nbhd_index = build_nbhd_index(NBHD_LISTS)
+    assert len(nbhd_rows(nbhd_index, 30)) == 0
+    assert len(nbhd_rows(nbhd_index, -1)) == 0
+
+
+##################
+# nbhd_bits_mask #
+##################
+
+def test_output_nbhd_bits_mask():
+    """Check bitset of a set of neighborhoods."""
+    assert nbhd_bits_mask([0, 63, 64, 102]).tolist() == \
+        [2**0 + 2**63, 2**0 + 2**38]
+    assert nbhd_bits_mask([]).tolist() == [0, 0]
+    assert nbhd_bits_mask(5).tolist() == [2**5, 0]
+
+
+def test_range_nbhd_bits_mask():
+    """Ensure function breaks if neighborhood does not fit in bitset."""
+    with pytest.raises(ValueError):
+        nbhd_bits_mask([128])
+    with pytest.raises(ValueError):
+        nbhd_bits_mask([-1])
+
+
+###############
+# in_any_nbhd #
+###############
+
+def test_output_in_any_nbhd():
+    """Check union of neighborhoods."""
+    bits = build_nbhd_index(NBHD_LISTS)['bits']
+    assert in_any_nbhd(bits, [4]).tolist() == \
+        [True, False, False, True, False]
+    assert in_any_nbhd(bits, [7, 28]).tolist() == \
+        [True, False, True, False, True]
+    assert not in_any_nbhd(bits, []).any()
+
+
+###############
+# in_all_nbhd #
+###############
+
+def test_output_in_all_nbhd():
+    """Check intersection of neighborhoods."""
+    bits = build_nbhd_index(NBHD_LISTS)['bits']
+    assert in_all_nbhd(bits, [4, 28]).tolist() == \
+        [True, False, False, False, False]
+    assert in_all_nbhd(bits, [28]).tolist() == \
+        [True, False, False, False, True]
+    assert in_all_nbhd(bits, []).all()
+
+
+###############
+# select_nbhd #
+###############
+
+def test_index_select_nbhd():
+    """Check that index and search select the same rows."""
+    nbhd_index = build_nbhd_index(NBHD_LISTS)
+    for neighborhood in [0, 4, 7, 28, 92]:
+        assert select_nbhd(STREET_DATA, neighborhood, nbhd_index).equals(
+            select_nbhd(STREET_DATA, neighborhood))
+
+
+###################
+# save_nbhd_index #
+###################
+
+def test_round_trip_save_nbhd_index():
+    """Check that index is loaded back unchanged."""
+    nbhd_index = build_nbhd_index(NBHD_LISTS)
+    save_nbhd_index(INDEX_PATH, nbhd_index)
+    loaded = load_nbhd_index(INDEX_PATH)
+    for name in ['offsets', 'rows', 'bits']:
+        assert loaded[name].tolist() == nbhd_index[name].tolist()
+    os.remove(INDEX_PATH)
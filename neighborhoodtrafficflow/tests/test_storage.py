@@ -0,0 +1,214 @@
+"""Test module for memory-mapped bundles of cleaned datasets."""
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from neighborhoodtrafficflow.data.aggregates import AGGREGATE_NAMES
+from neighborhoodtrafficflow.data.geometry import \
+    LOD_TOLERANCES, pack_coords
+from neighborhoodtrafficflow.data.storage import \
+    BUNDLE_VERSION, META_FILE, write_bundle, read_bundle, \
+    read_bundle_aggregates, read_bundle_lod, read_data_version, \
+    write_table, read_table, nbhd_data_to_frame, frame_to_nbhd_data
+
+# Example cleaned datasets
+STREET_DATA = pd.DataFrame({
+    'key': [1, 2, 3],
+    'name': ['1ST AVE', 'PINE ST', 'MAIN ST'],
+    'lon': [[-122.30, -122.31], [-122.32], [-122.33, -122.34]],
+    'lat': [[47.60, 47.61], [47.62], [47.63, 47.64]],
+    'speed': [25, 30, 35],
+    'road': [0, 1, 5],
+    'nbhd': [[4, 28], [], [7]],
+    '2018': [100, -1, 2000]
+})
+COORDS = pack_coords(STREET_DATA['lon'], STREET_DATA['lat'])
+NBHD_DATA = [2, {'type': 'FeatureCollection', 'features': []},
+             ['344008', '344005'], ['West Woodland', 'Olympic Manor']]
+
+
+################
+# write_bundle #
+################
+
+def test_replace_write_bundle(tmp_path):
+    """Check that an existing bundle is replaced."""
+    bundle_path = tmp_path / 'bundle'
+    write_bundle(bundle_path, STREET_DATA, COORDS, NBHD_DATA)
+    write_bundle(bundle_path, STREET_DATA.iloc[:2], COORDS, NBHD_DATA)
+    street_data, _, _, _ = read_bundle(bundle_path)
+    assert len(street_data) == 2
+    assert not (tmp_path / 'bundle.tmp').exists()
+
+
+###############
+# read_bundle #
+###############
+
+def test_round_trip_read_bundle(tmp_path):
+    """Check that cleaned datasets are read back unchanged."""
+    bundle_path = tmp_path / 'bundle'
+    write_bundle(bundle_path, STREET_DATA, COORDS, NBHD_DATA)
+    street_data, coords, nbhd_data, nbhd_index = read_bundle(bundle_path)
+    expected = STREET_DATA.drop(columns=['lon', 'lat', 'nbhd', 'name'])
+    assert street_data.columns.to_list() == \
+        expected.columns.to_list() + ['name']
+    assert street_data[expected.columns].equals(expected)
+    assert street_data['name'].to_list() == STREET_DATA['name'].to_list()
+    for name in ['lon', 'lat', 'offsets']:
+        assert np.array_equal(coords[name], COORDS[name])
+    assert nbhd_data == NBHD_DATA
+    assert nbhd_index['rows'].tolist() == [0, 2, 0]
+    assert nbhd_index['offsets'][[4, 5, 7, 8, 28, 29]].tolist() == \
+        [0, 1, 1, 2, 2, 3]
+
+
+def test_mmap_read_bundle(tmp_path):
+    """Check that numeric columns and coordinates are memory-mapped."""
+    bundle_path = tmp_path / 'bundle'
+    write_bundle(bundle_path, STREET_DATA, COORDS, NBHD_DATA)
+    street_data, coords, _, nbhd_index = read_bundle(bundle_path)
+    values = street_data['speed'].to_numpy()
+    while not isinstance(values, np.memmap):
+        values = values.base
+    assert isinstance(coords['lon'], np.memmap)
+    assert isinstance(nbhd_index['rows'], np.memmap)
+    assert isinstance(nbhd_index['bits'], np.memmap)
+    assert street_data['name'].dtype == 'category'
+    assert 'nbhd' not in street_data
+
+
+def test_exception_read_bundle(tmp_path):
+    """Check that function throws an error if no bundle exists."""
+    with pytest.raises(FileNotFoundError):
+        read_bundle(tmp_path / 'bundle')
+
+
+def test_version_read_bundle(tmp_path):
+    """Check that function throws an error on version mismatch."""
+    bundle_path = tmp_path / 'bundle'
+    write_bundle(bundle_path, STREET_DATA, COORDS, NBHD_DATA)
+    with open(bundle_path / META_FILE) as json_file:
+        meta = json.load(json_file)
+    meta['version'] = BUNDLE_VERSION + 1
+    with open(bundle_path / META_FILE, 'w') as json_file:
+        json.dump(meta, json_file)
+    with pytest.raises(ValueError):
+        read_bundle(bundle_path)
+
+
+##########################
+# read_bundle_aggregates #
+##########################
+
+def test_round_trip_read_bundle_aggregates(tmp_path):
+    """Check that the cube is built, written, and memory-mapped."""
+    bundle_path = tmp_path / 'bundle'
+    write_bundle(bundle_path, STREET_DATA, COORDS, NBHD_DATA)
+    aggregates = read_bundle_aggregates(bundle_path)
+    assert sorted(aggregates) == sorted(AGGREGATE_NAMES)
+    assert isinstance(aggregates['count'], np.memmap)
+    assert aggregates['segments'].tolist() == [0, 0, 3]
+    assert aggregates['count'][2, -1] == 2
+    assert aggregates['count'][2, :-1].sum() == 0
+    assert aggregates['road'][2].tolist() == [1, 1, 0, 0, 0, 1]
+
+
+def test_exception_read_bundle_aggregates(tmp_path):
+    """Check that function throws an error if no bundle exists."""
+    with pytest.raises(FileNotFoundError):
+        read_bundle_aggregates(tmp_path / 'bundle')
+
+
+###################
+# read_bundle_lod #
+###################
+
+def test_round_trip_read_bundle_lod(tmp_path):
+    """Check that levels of detail are built, written, and memory-mapped."""
+    bundle_path = tmp_path / 'bundle'
+    write_bundle(bundle_path, STREET_DATA, COORDS, NBHD_DATA)
+    _, coords, _, _ = read_bundle(bundle_path)
+    lod = read_bundle_lod(bundle_path, coords)
+    assert len(lod) == len(LOD_TOLERANCES)
+    assert lod[0] is coords
+    for level in lod[1:]:
+        assert isinstance(level['lon'], np.memmap)
+        assert level['offsets'].tolist() == COORDS['offsets'].tolist()
+        assert level['lon'].tolist() == COORDS['lon'].tolist()
+
+
+def test_missing_read_bundle_lod(tmp_path):
+    """Check that only level 0 is read if no levels were written."""
+    lod = read_bundle_lod(tmp_path / 'bundle', COORDS)
+    assert len(lod) == 1
+    assert lod[0] is COORDS
+
+
+#####################
+# read_data_version #
+#####################
+
+def test_change_read_data_version(tmp_path):
+    """Check that data version changes only if the data changes."""
+    bundle_path = tmp_path / 'bundle'
+    write_bundle(bundle_path, STREET_DATA, COORDS, NBHD_DATA)
+    version = read_data_version(bundle_path)
+    write_bundle(bundle_path, STREET_DATA, COORDS, NBHD_DATA)
+    assert read_data_version(bundle_path) == version
+    write_bundle(bundle_path, STREET_DATA.iloc[:2], COORDS, NBHD_DATA)
+    assert read_data_version(bundle_path) != version
+
+
+def test_exception_read_data_version(tmp_path):
+    """Check that FileNotFoundError raised if no bundle exists."""
+    with pytest.raises(FileNotFoundError):
+        read_data_version(tmp_path / 'bundle')
+
+
+##############
+# read_table #
+##############
+
+def test_round_trip_read_table(tmp_path):
+    """Check that cleaned street data is read back unchanged."""
+    table_path = tmp_path / 'street_data.parquet'
+    write_table(table_path, STREET_DATA)
+    street_data = read_table(table_path)
+    assert street_data.columns.to_list() == STREET_DATA.columns.to_list()
+    for column in STREET_DATA.columns:
+        assert [list(value) if isinstance(value, np.ndarray) else value
+                for value in street_data[column]] == \
+            STREET_DATA[column].to_list()
+
+
+def test_columns_read_table(tmp_path):
+    """Check that only requested columns are read."""
+    table_path = tmp_path / 'street_data.parquet'
+    write_table(table_path, STREET_DATA)
+    street_data = read_table(table_path, columns=['speed', 'nbhd'])
+    assert street_data.columns.to_list() == ['speed', 'nbhd']
+    assert street_data['speed'].to_list() == [25, 30, 35]
+    assert 28 in street_data['nbhd'][0]
+
+
+def test_exception_read_table(tmp_path):
+    """Check that function throws an error if no file at table_path."""
+    with pytest.raises(FileNotFoundError):
+        read_table(tmp_path / 'street_data.parquet')
+
+
+######################
+# nbhd_data_to_frame #
+######################
+
+def test_round_trip_nbhd_data_to_frame():
+    """Check that neighborhood data is converted back unchanged."""
+    nbhd_data = [1, {'type': 'FeatureCollection',
+                     'features': [{'id': '344008', 'type': 'Feature'}]},
+                 ['344008'], ['West Woodland']]
+    data_frame = nbhd_data_to_frame(nbhd_data)
+    assert data_frame.columns.to_list() == ['region_id', 'name', 'feature']
+    assert frame_to_nbhd_data(data_frame) == nbhd_data
@@ -0,0 +1,220 @@
+"""Test module for the precomputed figure store."""
+import gzip
+import json
+from pathlib import Path
+import pickle
+
+import brotli
+import pandas as pd
+
+from neighborhoodtrafficflow.data.aggregates import build_aggregates
+from neighborhoodtrafficflow.data.geometry import pack_coords, build_lod
+from neighborhoodtrafficflow.data.neighborhood_index import build_nbhd_index
+from neighborhoodtrafficflow.figures.cache import figure_key
+from neighborhoodtrafficflow.figures.charts import \
+    traffic_flow_counts, speed_limits, road_types
+from neighborhoodtrafficflow.figures.store import \
+    STORE_VERSION, MANIFEST_FILE, NBHD_OUTPUTS, ROAD_MAP_OUTPUTS, \
+    gzip_compress, response_keys, build_figure, nbhd_outputs, \
+    road_map_outputs, outputs_response, build_response, response_file, \
+    write_store, open_store, read_response
+
+# Import neighborhood and street data
+CWD = Path(__file__).parent
+with open(CWD / '../data/cleaned/nbhd_data.pkl', 'rb') as pickle_file:
+    NBHD_DATA = pickle.load(pickle_file)
+STREET_DATA = pd.read_pickle(CWD / '../data/cleaned/street_data.pkl')
+COORDS = pack_coords(STREET_DATA['lon'], STREET_DATA['lat'])
+NBHD_INDEX = build_nbhd_index(STREET_DATA['nbhd'])
+AGGREGATES = build_aggregates(STREET_DATA, NBHD_INDEX, NBHD_DATA[0])
+LOD = build_lod(COORDS)
+
+# Example response keys
+KEYS = [figure_key('neighborhood', 92),
+        figure_key('road_map', 92, 'flow', 2010),
+        figure_key('road_map', 0, 'road')]
+
+
+def build(key):
+    """Build figure of key from example data."""
+    return build_figure(STREET_DATA, COORDS, NBHD_INDEX, key)
+
+
+#################
+# gzip_compress #
+#################
+
+def test_output_gzip_compress():
+    """Check that compressed data round trips and is reproducible."""
+    data = json.dumps({'data': list(range(1000))}).encode()
+    compressed = gzip_compress(data)
+    assert gzip.decompress(compressed) == data
+    assert compressed == gzip_compress(data)
+    assert compressed[4:8] == bytes(4)
+
+
+#################
+# response_keys #
+#################
+
+def test_response_keys():
+    """Check that every neighborhood, map type, and year is keyed."""
+    keys = response_keys(2)
+    assert len(keys) == 2 * (1 + 12 + 2)
+    assert len(set(keys)) == len(keys)
+    assert figure_key('neighborhood', 1) in keys
+    assert figure_key('road_map', 1, 'flow', 2007) in keys
+    assert figure_key('road_map', 1, 'road', 2007) in keys
+
+
+################
+# build_figure #
+################
+
+def test_road_map_build_figure():
+    """Check that road maps are built for their map type and year."""
+    figure = build(figure_key('road_map', 92, 'speed', 2010))
+    assert figure['layout']['yaxis']['title'] == 'Speed Limit (mph)'
+    figure = build(figure_key('road_map', 92, 'flow', 2010))
+    assert figure['layout']['yaxis']['title'].startswith('2010 ')
+
+
+################
+# nbhd_outputs #
+################
+
+def test_nbhd_outputs():
+    """Check that outputs match figures built one at a time."""
+    outputs = nbhd_outputs(STREET_DATA, NBHD_INDEX, 92)
+    assert sorted(outputs) == sorted(idx for idx, _ in NBHD_OUTPUTS)
+    for idx, chart in [('flowCountFigure', traffic_flow_counts),
+                       ('speedLimitFigure', speed_limits),
+                       ('roadTypeFigure', road_types)]:
+        assert str(outputs[idx]['figure']) == \
+            str(chart(STREET_DATA, 92, NBHD_INDEX))
+
+
+def test_aggregates_nbhd_outputs():
+    """Check that outputs read from the cube have the same charts."""
+    outputs = nbhd_outputs(STREET_DATA, NBHD_INDEX, 92)
+    cube_outputs = nbhd_outputs(STREET_DATA, NBHD_INDEX, 92, AGGREGATES)
+    for idx in ['speedLimitFigure', 'roadTypeFigure']:
+        assert str(cube_outputs[idx]['figure']) == str(outputs[idx]['figure'])
+    traces = cube_outputs['flowCountFigure']['figure']['data']
+    assert [trace['type'] for trace in traces] == ['box', 'box']
+    assert set(traces[0]['x']) == \
+        set(outputs['flowCountFigure']['figure']['data'][0]['x'])
+
+
+####################
+# road_map_outputs #
+####################
+
+def test_lod_road_map_outputs():
+    """Check that road map is drawn at the level of detail of its view."""
+    key = figure_key('road_map', 92, 'road')
+    outputs = road_map_outputs(STREET_DATA, COORDS, NBHD_INDEX, key, LOD)
+    assert sorted(outputs) == sorted(idx for idx, _ in ROAD_MAP_OUTPUTS)
+    view = outputs['roadMapLevel']['data']
+    assert view['neighborhood'] == 92
+    assert view['level'] > 0
+    full = road_map_outputs(STREET_DATA, COORDS, NBHD_INDEX, key, LOD, 0)
+    assert str(full['roadMapFigure']['figure']) == str(build(key))
+
+    def num_points(outputs):
+        return sum(len(trace['x']) for trace
+                   in outputs['roadMapFigure']['figure']['data'])
+    assert num_points(outputs) < num_points(full)
+
+
+####################
+# outputs_response #
+####################
+
+def test_outputs_response():
+    """Check that outputs are wrapped as multi-output response."""
+    outputs = {'roadMapTitle': {'children': 'Roads'}}
+    assert json.loads(outputs_response(outputs)) == \
+        {'response': outputs, 'multi': True}
+
+
+##################
+# build_response #
+##################
+
+def test_build_response():
+    """Check that neighborhood and road map keys build their responses."""
+    response = json.loads(build_response(
+        STREET_DATA, COORDS, NBHD_INDEX, figure_key('neighborhood', 92)))
+    assert response['multi']
+    assert len(response['response']) == len(NBHD_OUTPUTS)
+    key = figure_key('road_map', 92, 'road')
+    assert build_response(STREET_DATA, COORDS, NBHD_INDEX, key,
+                          lod=LOD) == outputs_response(road_map_outputs(
+                              STREET_DATA, COORDS, NBHD_INDEX, key, LOD))
+
+
+#################
+# response_file #
+#################
+
+def test_response_file():
+    """Check that response file names are readable and unique."""
+    assert response_file(figure_key('road_map', 92, 'flow', 2018)) == \
+        'road_map-92-flow-2018.json'
+    assert response_file(figure_key('road_map', 92, 'flow', 2018), 'br') \
+        == 'road_map-92-flow-2018.json.br'
+    assert len({response_file(key) for key in response_keys(3)}) == 3 * 15
+
+
+###############
+# write_store #
+###############
+
+def test_round_trip_write_store(tmp_path):
+    """Check that stored responses match figures built on the fly."""
+    store_path = tmp_path / 'figures'
+    write_store(store_path, STREET_DATA, COORDS, NBHD_INDEX, NBHD_DATA,
+                'v1', processes=2, keys=KEYS, aggregates=AGGREGATES,
+                lod=LOD)
+    assert not (tmp_path / 'figures.tmp').exists()
+    assert len(list(store_path.iterdir())) == 3 * len(KEYS) + 1
+    store = open_store(store_path, 'v1')
+    for key in KEYS:
+        response = read_response(store, key)
+        assert response == build_response(STREET_DATA, COORDS, NBHD_INDEX,
+                                          key, AGGREGATES, LOD)
+        assert gzip.decompress(read_response(store, key, 'gzip')) == \
+            response
+        assert brotli.decompress(read_response(store, key, 'br')) == \
+            response
+
+
+##############
+# open_store #
+##############
+
+def test_version_open_store(tmp_path):
+    """Check that stores of other data or incomplete stores are ignored."""
+    store_path = tmp_path / 'figures'
+    assert open_store(store_path, 'v1') is None
+    store_path.mkdir()
+    with open(store_path / MANIFEST_FILE, 'w+') as json_file:
+        json.dump({'version': STORE_VERSION, 'data_version': 'v1'},
+                  json_file)
+    assert open_store(store_path, 'v1') == store_path
+    assert open_store(store_path, 'v2') is None
+    with open(store_path / MANIFEST_FILE, 'w+') as json_file:
+        json.dump({'version': 1, 'data_version': 'v1'}, json_file)
+    assert open_store(store_path, 'v1') is None
+
+
+#################
+# read_response #
+#################
+
+def test_missing_read_response(tmp_path):
+    """Check that None returned if figure not in store."""
+    assert read_response(tmp_path, figure_key('speed_limits', 0)) is None
+    assert read_response(tmp_path, figure_key('speed_limits', 0),
+                         'gzip') is None
@@ -8,9 +8,16 @@ import pytest
 import numpy as np
 from shapely.geometry import Polygon
 
+from neighborhoodtrafficflow.data import street_data
+from neighborhoodtrafficflow.data.manifest import write_manifest
 from neighborhoodtrafficflow.data.street_data import \
-    get_polygons, get_neighborhood, get_flow_path, get_flow_data, \
-    get_street_data, add_flow_data
+    get_polygons, get_polygon_index, get_neighborhood, get_neighborhoods, \
+    get_flow_path, read_flow_data, get_coords, assign_neighborhoods, \
+    get_dataset_path, read_datasets, read_dataset, \
+    get_flow_data, reconcile_flow_keys, get_street_data, \
+    FLOW_NAMES, STREET_NAMES, \
+    get_crosswalk, \
+    add_flow_data, add_all_flow_data
 
 # File paths
 CWD = Path(__file__).parent
@@ -37,6 +44,20 @@ def test_output_length_get_polygons():
     assert isinstance(idx2poly[0], Polygon)
 
 
+#####################
+# get_polygon_index #
+#####################
+
+def test_output_get_polygon_index():
+    """Check length and bounds of index."""
+    idx2poly = get_polygons(SHP_PATH)
+    keys, bounds, prepared = get_polygon_index(idx2poly)
+    assert keys == list(idx2poly)
+    assert bounds.shape == (103, 4)
+    assert len(prepared) == 103
+    assert tuple(bounds[0]) == idx2poly[0].bounds
+
+
 ####################
 # get_neighborhood #
 ####################
@@ -74,6 +95,52 @@ def test_two_nbhds_neighborhood():
     assert nbhd_list[1] == 1
 
 
+def test_indexed_get_neighborhood():
+    """Check indexed output matches brute-force output."""
+    lon = [-122.36866107043400, -122.3821835817560]
+    lat = [47.66757206792280, 47.69606176398850]
+    idx2poly = get_polygons(SHP_PATH)
+    poly_index = get_polygon_index(idx2poly)
+    nbhd_list = get_neighborhood(lon, lat, idx2poly, poly_index)
+    assert nbhd_list == get_neighborhood(lon, lat, idx2poly)
+    assert nbhd_list == [0, 1]
+    assert get_neighborhood([0.0], [0.0], idx2poly, poly_index) == []
+
+
+#####################
+# get_neighborhoods #
+#####################
+
+def test_output_get_neighborhoods():
+    """Check bulk output matches per-segment output."""
+    lon_list = [[-122.36866107043400], [0.0],
+                [-122.36866107043400, -122.3821835817560]]
+    lat_list = [[47.66757206792280], [0.0],
+                [47.66757206792280, 47.69606176398850]]
+    idx2poly = get_polygons(SHP_PATH)
+    nbhd_list = get_neighborhoods(lon_list, lat_list, idx2poly)
+    assert nbhd_list == [[0], [], [0, 1]]
+    for lon, lat, nbhd in zip(lon_list, lat_list, nbhd_list):
+        assert nbhd == get_neighborhood(lon, lat, idx2poly)
+
+
+def test_empty_get_neighborhoods():
+    """Check output with no street segments."""
+    idx2poly = get_polygons(SHP_PATH)
+    assert get_neighborhoods([], [], idx2poly) == []
+
+
+def test_skip_nbhd_get_street_data():
+    """Check neighborhoods are skipped without polygons."""
+    key_list = []
+    nbhd_list = []
+    data_frame = gpd.read_file(get_flow_path(2007))
+    get_street_data(data_frame, 2007, None, key_list, [], [], [], [], [],
+                    nbhd_list)
+    assert len(key_list) > 0
+    assert nbhd_list == []
+
+
 #################
 # get_flow_path #
 #################
@@ -92,6 +159,72 @@ def test_output_value_get_flow_path():
     assert os.path.exists(path)
 
 
+##################
+# read_flow_data #
+##################
+
+def test_columns_read_flow_data():
+    """Check projected columns."""
+    assert list(read_flow_data(2018)) == \
+        ['COMPKEY', 'FLOWSEGID', 'geometry', 'AWDT', 'STNAME_ORD']
+    assert list(read_flow_data(2015)) == \
+        ['FLOWSEGID', 'geometry', 'COUNTAAWDT', 'FIRST_STNA']
+    assert list(read_flow_data(2007)) == \
+        ['COMPKEY', 'geometry', 'AAWDT', 'STNAME']
+
+
+##############
+# get_coords #
+##############
+
+def test_output_get_coords():
+    """Check coordinates of single and multi-part geometries."""
+    data_frame = read_flow_data(2007)
+    lon_list, lat_list = get_coords(data_frame['geometry'])
+    assert len(lon_list) == len(lat_list) == len(data_frame)
+    for geo, lon, lat in zip(data_frame['geometry'], lon_list, lat_list):
+        if geo.geom_type == 'LineString':
+            assert list(zip(lon, lat)) == list(geo.coords)
+        else:
+            assert lon is None and lat is None
+
+
+########################
+# assign_neighborhoods #
+########################
+
+def test_output_assign_neighborhoods():
+    """Check neighborhoods of dataset match get_neighborhood."""
+    idx2poly = get_polygons(SHP_PATH)
+    data_frame = assign_neighborhoods(read_dataset(2007), idx2poly)
+    for lon, lat, nbhd in zip(data_frame['lon'], data_frame['lat'],
+                              data_frame['nbhd']):
+        if lon is None:
+            assert nbhd == []
+        else:
+            assert nbhd == get_neighborhood(lon, lat, idx2poly)
+
+
+def test_output_get_dataset_path():
+    """Check raw dataset directories."""
+    assert get_dataset_path('street').name == 'Seattle_Streets'
+    assert get_dataset_path(2007) == get_flow_path(2007).parent
+    assert get_dataset_path('2007') == get_flow_path(2007).parent
+
+
+#################
+# read_datasets #
+#################
+
+def test_jobs_read_datasets():
+    """Check process pool output matches serial output."""
+    serial = read_datasets([2007, 2008])
+    parallel = read_datasets([2007, 2008], jobs=2)
+    for df_serial, df_parallel in zip(serial, parallel):
+        assert df_serial.equals(df_parallel)
+        assert list(df_serial)[-2:] == ['lon', 'lat']
+
+
 #################
 # get_flow_data #
 #################
@@ -156,12 +289,84 @@ def test_consistency_get_flow_data():
             assert key2flow[key] == flow
 
 
+def test_synthetic_keys_get_flow_data():
+    """Check synthetic COMPKEYs fill in missing keys."""
+    flow2key, key2flow, df_list, _ = get_flow_data()
+    assert key2flow['1000000.0'] in flow2key
+    assert flow2key[1000000] in key2flow
+    for i in range(12):
+        assert df_list[i]['COMPKEY'].notna().all()
+        assert df_list[i]['COMPKEY'].ne('None').all()
+
+
 def test_year_get_flow_data():
     """Check year list."""
     _, _, _, year_list = get_flow_data()
     assert year_list == list(np.arange(2018, 2006, -1))
 
 
+#######################
+# reconcile_flow_keys #
+#######################
+
+def flow_frames():
+    """Get small traffic flow DataFrames with missing and repeated keys."""
+    def frame(year, flows, keys):
+        return pd.DataFrame({'COMPKEY': keys, 'FLOWSEGID': flows,
+                             'geometry': None, FLOW_NAMES[year]: 1.0,
+                             STREET_NAMES[year]: 'A'})
+    df_list = [frame(2018, [1, 2, 604, 3], ['10,11', None, '60', '12']),
+               frame(2017, [1, 2, 604, 4, 5],
+                     ['10', None, '60,61', '11', None]),
+               frame(2016, [1.0, 6.0, np.nan], [None] * 3),
+               frame(2015, [6.0, np.nan, 7.0], [None] * 3),
+               frame(2014, [None] * 5, [10, 12, 99, 60, 11])]
+    return df_list, [2018, 2017, 2016, 2015, 2014]
+
+
+def test_flow2key_reconcile_flow_keys():
+    """Check COMPKEYs of first rows, FLOWSEGID 604, and synthetic keys."""
+    flow2key, _, _, _ = reconcile_flow_keys(*flow_frames())
+    assert flow2key == {1: '10,11', 2: '1000000.0', 604: '60,61',
+                        3: '12', 4: '11', 5: '1000001.0', 6: '1000002.0',
+                        1000000: '1000003.0', 7: '1000004.0'}
+
+
+def test_key2flow_reconcile_flow_keys():
+    """Check each COMPKEY maps to the first FLOWSEGID that has it."""
+    _, key2flow, _, _ = reconcile_flow_keys(*flow_frames())
+    assert key2flow == {'10': 1, '11': 1, '60': 604, '12': 3, '61': 604,
+                        '1000000.0': 2, '1000001.0': 5, '1000002.0': 6,
+                        '1000003.0': 1000000, '1000004.0': 7}
+
+
+def test_df_list_reconcile_flow_keys():
+    """Check filled COMPKEYs and FLOWSEGIDs of each year."""
+    _, _, df_list, year_list = reconcile_flow_keys(*flow_frames())
+    assert year_list == [2018, 2017, 2016, 2015, 2014]
+    assert [df['COMPKEY'].tolist() for df in df_list] == [
+        ['10,11', '1000000.0', '60', '12'],
+        ['10', '1000000.0', '60,61', '11', '1000001.0'],
+        ['10,11', '1000002.0', '1000003.0'],
+        ['1000002.0', '1000003.0', '1000004.0'],
+        ['10', '12', '99', '60', '11']]
+    assert [df['FLOWSEGID'].tolist() for df in df_list] == [
+        [1, 2, 604, 3], [1, 2, 604, 4, 5], [1, 6, 1000000],
+        [6, 1000000, 7], [1, 3, -1, 604, 1]]
+
+
+def test_empty_years_reconcile_flow_keys():
+    """Check years missing 2017-2018 or 2015-2016 DataFrames."""
+    df_list, _ = flow_frames()
+    flow2key, key2flow, df_list, _ = \
+        reconcile_flow_keys(df_list[-1:], [2014])
+    assert flow2key == {}
+    assert key2flow == {}
+    assert df_list[0]['FLOWSEGID'].tolist() == [-1] * 5
+    flow2key, _, _, _ = reconcile_flow_keys(flow_frames()[0][:1], [2018])
+    assert flow2key == {1: '10,11', 2: '1000000.0', 604: '60', 3: '12'}
+
+
 ###################
 # get_street_data #
 ###################
@@ -263,6 +468,31 @@ def test_output_range_get_street_data():
     assert max(road_list) <= 5
 
 
+def test_key_index_get_street_data():
+    """Check shared key index skips duplicate COMPKEYs."""
+    key_list = []
+    key_index = {}
+    data_frame = gpd.read_file(get_flow_path(2007))
+    for _ in range(2):
+        get_street_data(data_frame, 2007, None, key_list, [], [], [], [],
+                        [], [], key_index=key_index)
+    assert len(key_list) == len(set(key_list))
+    assert key_index == {key: row for row, key in enumerate(key_list)}
+
+
+#################
+# get_crosswalk #
+#################
+
+def test_output_get_crosswalk():
+    """Check exploded FLOWSEGID and COMPKEY pairs."""
+    flow2key = {1: '10,11', 2: '1000000.0'}
+    crosswalk = get_crosswalk(flow2key)
+    assert crosswalk['FLOWSEGID'].to_list() == [1, 1, 2]
+    assert crosswalk['COMPKEY'].to_list() == [10, 11, 1000000]
+    assert crosswalk['position'].to_list() == [0, 1, 0]
+
+
 #################
 # add_flow_data #
 #################
@@ -327,3 +557,179 @@ def test_output_add_flow_data():
     for year in range(2007, 2019):
         assert max(df_streets[str(year)].to_list()) > -1
         assert max(df_streets[str(year)].to_list()) > -1
+
+
+def test_all_years_add_all_flow_data():
+    """Check bulk flow data matches per-year flow data."""
+    flow2key, _, df_list, year_list = get_flow_data()
+    key_list = []
+    for i in range(len(df_list) - 1, -1, -1):
+        get_street_data(df_list[i], year_list[i], None, key_list, [], [],
+                        [], [], [], [])
+    df_year = pd.DataFrame({'key': key_list})
+    df_all = pd.DataFrame({'key': key_list})
+    for i in range(len(df_list) - 1, -1, -1):
+        add_flow_data(df_year, df_list[i], year_list[i], flow2key)
+    add_all_flow_data(df_all, df_list, year_list, flow2key)
+    assert df_all.equals(df_year)
+    assert list(df_all)[1:] == [str(year) for year in range(2007, 2019)]
+
+
+#################
+# load_datasets #
+#################
+
+@pytest.fixture
+def raw_datasets(tmp_path, monkeypatch):
+    """Point load_datasets at small raw files, recording reprocessing."""
+    for name in ['street', '2007', 'zillow']:
+        (tmp_path / name).mkdir()
+        (tmp_path / name / 'data.txt').write_text(name)
+    reprocessed = []
+
+    def read_datasets_stub(names, jobs):
+        reprocessed.extend(names)
+        return [pd.DataFrame({'name': [str(name)]}) for name in names]
+
+    monkeypatch.setattr(street_data, 'CACHE_PATH', tmp_path / 'cache')
+    monkeypatch.setattr(street_data, 'NBHD_SHP_PATH',
+                        tmp_path / 'zillow' / 'zillow.shp')
+    monkeypatch.setattr(street_data, 'get_dataset_path',
+                        lambda name: tmp_path / str(name))
+    monkeypatch.setattr(street_data, 'get_polygons', lambda path: {})
+    monkeypatch.setattr(street_data, 'assign_neighborhoods',
+                        lambda df, idx2poly: df)
+    monkeypatch.setattr(street_data, 'read_datasets', read_datasets_stub)
+    return tmp_path, reprocessed
+
+
+def build_datasets(force=False):
+    """Load datasets and write the manifest, as main does."""
+    df_list, manifest, changed = \
+        street_data.load_datasets(['street', 2007], force=force)
+    write_manifest(street_data.CACHE_PATH / 'manifest.json', manifest)
+    return df_list, changed
+
+
+def test_first_build_load_datasets(raw_datasets):
+    """Check all datasets are processed without a cache."""
+    _, reprocessed = raw_datasets
+    df_list, changed = build_datasets()
+    assert changed
+    assert reprocessed == ['street', 2007]
+    assert [df['name'][0] for df in df_list] == ['street', '2007']
+
+
+def test_unchanged_load_datasets(raw_datasets):
+    """Check unchanged datasets are loaded from the cache."""
+    _, reprocessed = raw_datasets
+    build_datasets()
+    reprocessed.clear()
+    df_list, changed = build_datasets()
+    assert not changed
+    assert reprocessed == []
+    assert [df['name'][0] for df in df_list] == ['street', '2007']
+
+
+def test_changed_dataset_load_datasets(raw_datasets):
+    """Check only the changed dataset is reprocessed."""
+    tmp_path, reprocessed = raw_datasets
+    build_datasets()
+    reprocessed.clear()
+    (tmp_path / '2007' / 'data.txt').write_text('changed')
+    _, changed = build_datasets()
+    assert changed
+    assert reprocessed == [2007]
+
+
+def test_changed_polygons_load_datasets(raw_datasets):
+    """Check a changed polygon hash marks every dataset stale."""
+    tmp_path, reprocessed = raw_datasets
+    build_datasets()
+    reprocessed.clear()
+    (tmp_path / 'zillow' / 'data.txt').write_text('changed')
+    _, changed = build_datasets()
+    assert changed
+    assert reprocessed == ['street', 2007]
+
+
+def test_changed_version_load_datasets(raw_datasets, monkeypatch):
+    """Check a new cache format version marks every dataset stale."""
+    _, reprocessed = raw_datasets
+    build_datasets()
+    reprocessed.clear()
+    monkeypatch.setattr(street_data, 'CACHE_VERSION',
+                        street_data.CACHE_VERSION + 1)
+    _, changed = build_datasets()
+    assert changed
+    assert reprocessed == ['street', 2007]
+
+
+def test_force_load_datasets(raw_datasets):
+    """Check force reprocesses every dataset."""
+    _, reprocessed = raw_datasets
+    build_datasets()
+    reprocessed.clear()
+    _, changed = build_datasets(force=True)
+    assert not changed
+    assert reprocessed == ['street', 2007]
+
+
+########
+# main #
+########
+
+class Rebuilt(Exception):
+    """Raised in place of rebuilding the cleaned street data."""
+
+
+@pytest.fixture
+def out_paths(tmp_path, monkeypatch):
+    """Point main at outputs in tmp_path, stopping before any rebuild."""
+    paths = [tmp_path / ('out%d' % i) for i in range(3)]
+    for path in paths:
+        path.write_text('')
+
+    def reconcile_flow_keys_stub(df_list, year_list):
+        raise Rebuilt
+
+    monkeypatch.setattr(street_data, 'OUT_PATH', paths[0])
+    monkeypatch.setattr(street_data, 'OUT_PATHS', paths)
+    monkeypatch.setattr(street_data, 'reconcile_flow_keys',
+                        reconcile_flow_keys_stub)
+    return paths
+
+
+def stub_load_datasets(monkeypatch, changed):
+    """Replace load_datasets with one reporting whether data changed."""
+    monkeypatch.setattr(street_data, 'load_datasets',
+                        lambda names, jobs, force: ([None] * len(names),
+                                                    {}, changed))
+
+
+def test_up_to_date_main(out_paths, monkeypatch):
+    """Check main skips the rebuild if nothing changed."""
+    stub_load_datasets(monkeypatch, False)
+    assert street_data.main() is None
+
+
+def test_missing_output_main(out_paths, monkeypatch):
+    """Check main rebuilds if any output is missing."""
+    stub_load_datasets(monkeypatch, False)
+    out_paths[-1].unlink()
+    with pytest.raises(Rebuilt):
+        street_data.main()
+
+
+def test_changed_main(out_paths, monkeypatch):
+    """Check main rebuilds if any dataset changed."""
+    stub_load_datasets(monkeypatch, True)
+    with pytest.raises(Rebuilt):
+        street_data.main()
+
+
+def test_force_main(out_paths, monkeypatch):
+    """Check main rebuilds if forced."""
+    stub_load_datasets(monkeypatch, False)
+    with pytest.raises(Rebuilt):
+        street_data.main(force=True)